@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class TelegramBlacklistCheckDTO:
+    # строка из запроса как есть
+    telegram: str
+    is_in_blacklist: bool
+
+    # совпавшая запись черного списка
+    matched_id: Optional[int] = None
+    matched_username: Optional[str] = None
+    matched_name: Optional[str] = None
@@ -5,10 +5,11 @@ from fastapi import APIRouter, Query
 from starlette import status
 from starlette.responses import JSONResponse
 
+from app.entities.cursor import FilterCursor
 from app.entities.sorted import SortedType
-from app.init_logic import api_service
+from app.init_logic import api_service, subscribers_history_service
 from app.api.v1.serializers import DoctorCreateBody, DoctorUpdateBody, DoctorsFilterBody, \
-    CheckTelegramInBlacklistRequest
+    CheckTelegramInBlacklistRequest, CheckTelegramsInBlacklistRequest
 
 router = APIRouter()
 
@@ -16,7 +17,7 @@ router = APIRouter()
 @router.get('/subscribers/count/')
 async def doctor_subscribers():
     """Возвращает общее количество подписичок"""
-    total_subscribers, count_text, last_updated_timestamp = api_service.get_all_subscribers_count()
+    total_subscribers, count_text, last_updated_timestamp = await api_service.get_all_subscribers_count()
 
     formatted_date = None
     if last_updated_timestamp:
@@ -34,7 +35,7 @@ async def filter_info():
     """
     Информация для отображения фильтров. Возвращает список доступных соцсетей для фильтрации по подписчикам
     """
-    messengers = api_service.get_filter_info()
+    messengers = await api_service.get_filter_info()
     data = list()
     for messenger in messengers:
         data.append({
@@ -65,7 +66,7 @@ async def info_by_ids(doctor_ids: str):
         )
 
     res_map = dict()
-    dtos = api_service.get_subscribers_by_doctor_ids(ids_list)
+    dtos = await api_service.get_subscribers_by_doctor_ids(ids_list)
     for dto in dtos:
         res_map[dto.doctor_id] = {
             "doctor_id": dto.doctor_id,
@@ -103,10 +104,11 @@ async def doctors_filter_with_ids(request: DoctorsFilterBody):
     try:
         min_subscribers = int(request.min_subscribers)
         max_subscribers = int(request.max_subscribers)
+        cursor = FilterCursor.decode(request.cursor, sort_enum) if request.cursor else None
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
-    doctors, filtered_doctors_count, subscribers_count = api_service.doctors_filter_with_doctors_ids(
+    doctors, filtered_doctors_count, subscribers_count, next_cursor = await api_service.doctors_filter_with_doctors_ids(
         request.social_media,
         sort_enum,
         min_subscribers,
@@ -114,6 +116,7 @@ async def doctors_filter_with_ids(request: DoctorsFilterBody):
         limit,
         request.current_page,
         request.doctor_ids,
+        cursor,
     )
 
     doctors_list = []
@@ -138,6 +141,7 @@ async def doctors_filter_with_ids(request: DoctorsFilterBody):
             "filtered_doctors_count": filtered_doctors_count,
             "filtered_doctors_subscribers_count": subscribers_count,
             "doctors": doctors_list,
+            "next_cursor": next_cursor,
         }
     )
 
@@ -150,6 +154,7 @@ async def doctors_filter(
         offset: str = Query(None, description="current_page поиска - default 0"),
         limit: str = Query(None, description="Лимит поиска для страницы - default 30"),
         sort: str = Query("desc", description="Сортировка по количеству подписчиков default desc"),
+        cursor: str = Query(None, description="Курсор следующей страницы из next_cursor, при нем offset не нужен"),
 ):
     """
     Возвращает докторов отфильтрованных по переданному значению количества подписчиков
@@ -160,9 +165,11 @@ async def doctors_filter(
     - max_subscribers: максимальное число подписчиков (включительно)
     - offset: current_page - текущая страница поиска
     - limit: лимит поиска
+    - cursor: курсор следующей страницы, страница начинается сразу после последнего доктора предыдущей
 
     :return
     - doctors_ids: айдишники докторов, которые подходят под условия фильтрации
+    - next_cursor: курсор следующей страницы, null если страниц больше нет
     """
     current_page = offset
 
@@ -204,16 +211,19 @@ async def doctors_filter(
         min_subscribers = int(min_subscribers)
         max_subscribers = int(max_subscribers)
         current_page = int(current_page)
+        limit = int(limit)
+        filter_cursor = FilterCursor.decode(cursor, sort_enum) if cursor else None
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
 
-    doctors, filtered_doctors_count, subscribers_count = api_service.doctors_filter(
+    doctors, filtered_doctors_count, subscribers_count, next_cursor = await api_service.doctors_filter(
         social_medias,
         sort_enum,
         min_subscribers,
         max_subscribers,
         current_page,
         limit,
+        filter_cursor,
     )
 
     doctors_list = []
@@ -238,6 +248,7 @@ async def doctors_filter(
             "filtered_doctors_count": filtered_doctors_count,
             "filtered_doctors_subscribers_count": subscribers_count,
             "doctors": doctors_list,
+            "next_cursor": next_cursor,
         }
     )
 
@@ -245,7 +256,11 @@ async def doctors_filter(
 @router.get('/subscribers/{doctor_id}/')
 async def doctor_subscribers(doctor_id: int):
     """Возвращает количество подписчиков у доктора"""
-    doctor = api_service.get_doctor_subscribers(doctor_id)
+    try:
+        doctor = await api_service.get_doctor_subscribers(doctor_id)
+    except Exception as e:
+        print('Ошибка при получении подписчиков доктора', e)
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=str(e))
 
     if not doctor:
         return JSONResponse(
@@ -294,6 +309,37 @@ async def doctor_subscribers(doctor_id: int):
     }
 
 
+@router.get('/subscribers/{doctor_id}/history/')
+async def doctor_subscribers_history(
+        doctor_id: int,
+        days: int = Query(90, description="За сколько последних дней вернуть историю - default 90"),
+):
+    """
+    История подписчиков доктора по соцсетям и прирост за 7/30/90 дней.
+    Точки дневные, для истории старше срока хранения дневных значений - недельные
+    """
+    try:
+        history = await subscribers_history_service.get_history(doctor_id, days)
+    except Exception as e:
+        print('Ошибка при получении истории подписчиков', e)
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
+
+    networks = {}
+    for network_history in history:
+        networks[network_history.network] = {
+            "points": [
+                {"date": point.day.strftime("%d.%m.%Y"), "subscribers": point.subscribers}
+                for point in network_history.points
+            ],
+            "growth": {f"{period}d": delta for period, delta in network_history.growth.items()},
+        }
+
+    return {
+        "doctor_id": doctor_id,
+        "networks": networks,
+    }
+
+
 @router.post('/doctors/create/')
 async def create_doctor(request: DoctorCreateBody):
     """Создает нового доктора в базе"""
@@ -349,6 +395,35 @@ async def check_telegram_in_blacklist(request: CheckTelegramInBlacklistRequest):
         content={"is_in_blacklist": is_in_blacklist}
     )
 
+
+@router.post('/doctors/check_telegram_in_blacklist/batch/')
+async def check_telegrams_in_blacklist(request: CheckTelegramsInBlacklistRequest):
+    """Проверяет на накрутки пачку тгшек за один запрос"""
+    try:
+        dtos = await api_service.check_telegram_blacklist_batch(request.telegrams)
+    except Exception as e:
+        print('Ошибка при поиске данных', e)
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content=str(e))
+
+    data = list()
+    for dto in dtos:
+        matched = None
+        if dto.is_in_blacklist:
+            matched = {
+                "id": dto.matched_id,
+                "telegram_username": dto.matched_username,
+                "telegram_name": dto.matched_name,
+            }
+        data.append({
+            "telegram": dto.telegram,
+            "is_in_blacklist": dto.is_in_blacklist,
+            "matched": matched,
+        })
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"results": data}
+    )
+
 # @router.post('/migrate_instagram/')
 # async def migrate_instagram(request: DoctorCreateBody):
 #     """Миграция инсты"""
@@ -12,6 +12,7 @@ class DoctorsFilterBody(BaseModel):
             "sort": "asc":
             "current_page": 1
             "doctor_ids": [1,2,3,5,67,]
+            "cursor": "WyJkZXNjIiwxMjAwLDQyXQ" - next_cursor из предыдущего ответа, вместо current_page
         }
         """
 
@@ -22,6 +23,7 @@ class DoctorsFilterBody(BaseModel):
     sort: Optional[str] = Field(default="desc")
     current_page: Optional[int] = Field(default=0, ge=0)
     doctor_ids: List[int] = Field(default_factory=list)
+    cursor: Optional[str] = Field(default=None)
 
 
 class DoctorCreateBody(BaseModel):
@@ -62,3 +64,12 @@ class CheckTelegramInBlacklistRequest(BaseModel):
     }
     """
     telegram: Optional[str] = None
+
+
+class CheckTelegramsInBlacklistRequest(BaseModel):
+    """
+    {
+        "telegrams": ["mysli_maxima", "readydoctor"]
+    }
+    """
+    telegrams: List[str] = Field(min_length=1, max_length=1000)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from app.entities.telegram_blacklist import TelegramBlacklistEntry
+
+TRIGRAM_SIZE = 3
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + TRIGRAM_SIZE] for i in range(len(text) - TRIGRAM_SIZE + 1)}
+
+
+class TelegramBlacklistIndex:
+    """
+    Триграммный индекс по активным записям telegram_blacklist.
+    Повторяет семантику ilike '%telegram%' по telegram_username и telegram_name:
+    запись совпадает, если любое из полей содержит строку без учета регистра.
+    Данные целиком перечитываются из базы в refresh
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self._entries: List[TelegramBlacklistEntry] = []
+        # тексты полей записей в нижнем регистре, индекс совпадает с _entries
+        self._texts: List[tuple[str, ...]] = []
+        # триграмма -> номера записей, в полях которых она встречается
+        self._postings: dict[str, set[int]] = {}
+        self._is_loaded = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._is_loaded
+
+    async def refresh(self):
+        self.load(await self.repository.get_active_telegram_blacklist())
+
+    def load(self, entries: List[TelegramBlacklistEntry]):
+        """Полностью пересобирает индекс, старый продолжает отвечать до замены"""
+        texts, postings = [], {}
+        for position, entry in enumerate(entries):
+            fields = tuple(field.lower() for field in (entry.telegram_username, entry.telegram_name)
+                           if field is not None)
+            texts.append(fields)
+            for field in fields:
+                for trigram in trigrams(field):
+                    postings.setdefault(trigram, set()).add(position)
+
+        self._entries, self._texts, self._postings = list(entries), texts, postings
+        self._is_loaded = True
+
+    def find(self, telegram: str) -> Optional[TelegramBlacklistEntry]:
+        """Первая (по порядку загрузки) запись, содержащая telegram, или None"""
+        needle = telegram.lower()
+        for position in self._candidates(needle):
+            if any(needle in field for field in self._texts[position]):
+                return self._entries[position]
+        return None
+
+    def find_many(self, telegrams: List[str]) -> dict[str, Optional[TelegramBlacklistEntry]]:
+        """
+        Проверка пачки строк. Длинные ищутся по триграммам без обхода записей,
+        короткие (меньше триграммы) проверяются все вместе за один проход по записям
+        """
+        result, short_needles = {}, {}
+        for telegram in telegrams:
+            needle = telegram.lower()
+            if len(needle) < TRIGRAM_SIZE:
+                short_needles.setdefault(needle, []).append(telegram)
+            elif telegram not in result:
+                result[telegram] = self.find(telegram)
+
+        pending = dict(short_needles)
+        for position, fields in enumerate(self._texts):
+            if not pending:
+                break
+            for needle in [needle for needle in pending if any(needle in field for field in fields)]:
+                for telegram in pending.pop(needle):
+                    result[telegram] = self._entries[position]
+        for originals in pending.values():
+            for telegram in originals:
+                result[telegram] = None
+
+        return result
+
+    def _candidates(self, needle: str) -> List[int]:
+        if len(needle) < TRIGRAM_SIZE:
+            # короткую строку триграммами не сузить - проверяем все записи
+            return list(range(len(self._entries)))
+
+        candidates = None
+        # начинаем с самых редких триграмм, чтобы пересечение быстрее схлопнулось
+        for posting in sorted((self._postings.get(trigram, set()) for trigram in trigrams(needle)), key=len):
+            candidates = set(posting) if candidates is None else candidates & posting
+            if not candidates:
+                return []
+        return sorted(candidates)
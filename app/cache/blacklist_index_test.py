@@ -0,0 +1,62 @@
+import random
+
+import pytest
+from app.cache.blacklist_index import TelegramBlacklistIndex
+from app.entities.telegram_blacklist import TelegramBlacklistEntry
+
+
+def make_entries(size: int, seed: int = 1) -> list[TelegramBlacklistEntry]:
+    rnd = random.Random(seed)
+    alphabet = "abcdeXYZ_1"
+
+    def word():
+        return rnd.choice([None, "", "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 12)))])
+
+    return [TelegramBlacklistEntry(id=i, telegram_username=word(), telegram_name=word()) for i in range(1, size + 1)]
+
+
+def brute_force(entries, telegram):
+    """Повторяет ilike '%telegram%' по обоим полям"""
+    needle = telegram.lower()
+    for entry in entries:
+        if any(field is not None and needle in field.lower() for field in (entry.telegram_username, entry.telegram_name)):
+            return entry
+    return None
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_find_matches_ilike_semantics(seed):
+    entries = make_entries(300, seed)
+    index = TelegramBlacklistIndex(repository=None)
+    index.load(entries)
+
+    rnd = random.Random(seed)
+    needles = ["", "a", "x_", "ABC", "bad_channel"]
+    needles += ["".join(rnd.choice("abcdexyz_1") for _ in range(rnd.randint(1, 6))) for _ in range(200)]
+    for needle in needles:
+        assert index.find(needle) == brute_force(entries, needle), needle
+
+
+def test_like_wildcards_are_literal():
+    index = TelegramBlacklistIndex(repository=None)
+    index.load([TelegramBlacklistEntry(id=1, telegram_username="mysli_maxima", telegram_name="Мысли Максима")])
+
+    assert index.find("MYSLI_MAX") is not None
+    assert index.find("мысли") is not None
+    assert index.find("mysliXmaxima") is None
+    assert index.find("%") is None
+
+
+def test_find_many_matches_find():
+    entries = make_entries(300, seed=5)
+    index = TelegramBlacklistIndex(repository=None)
+    index.load(entries)
+
+    rnd = random.Random(5)
+    telegrams = ["", "A", "a", "zz"] + ["".join(rnd.choice("abcdexyz_1") for _ in range(rnd.randint(1, 6)))
+                                        for _ in range(300)]
+    result = index.find_many(telegrams)
+
+    assert set(result) == set(telegrams)
+    for telegram in telegrams:
+        assert result[telegram] == brute_force(entries, telegram), telegram
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from cachetools import TLRUCache
+
+from app.entities.doctor_subs import DoctorSubs
+
+# негативная запись: доктора с таким doctor_id в базе нет
+NOT_FOUND = object()
+
+
+class DoctorRowsCache:
+    """
+    Ограниченный LRU кэш строк doctors по doctor_id, общий для профиля доктора и выдачи по списку id.
+    Неизвестные id тоже кэшируются, но на более короткое время. Промахи дочитываются из базы одним запросом
+    """
+
+    def __init__(self, repository, max_size: int, ttl_seconds: float, not_found_ttl_seconds: float):
+        self.repository = repository
+        self.ttl_seconds = ttl_seconds
+        self.not_found_ttl_seconds = not_found_ttl_seconds
+        self._cache = TLRUCache(maxsize=max_size, ttu=self._time_to_use)
+        # сбросы по doctor_id, пока его строка читается из базы: если сброс был во время чтения,
+        # прочитанную строку этого доктора не кэшируем. Записи живут только пока есть чтения в полете
+        self._loading: dict[int, int] = {}
+        self._invalidations: dict[int, int] = {}
+
+    def _time_to_use(self, _doctor_id: int, value, now: float) -> float:
+        if value is NOT_FOUND:
+            return now + self.not_found_ttl_seconds
+        return now + self.ttl_seconds
+
+    async def get(self, doctor_id: int) -> Optional[DoctorSubs]:
+        return (await self.get_many([doctor_id])).get(doctor_id)
+
+    async def get_many(self, doctor_ids: list[int]) -> dict[int, DoctorSubs]:
+        """Найденные доктора в порядке запрошенных id"""
+        doctor_ids = list(dict.fromkeys(doctor_ids))
+        doctors, missing = dict(), list()
+        for doctor_id in doctor_ids:
+            cached = self._cache.get(doctor_id)
+            if cached is None:
+                missing.append(doctor_id)
+            elif cached is not NOT_FOUND:
+                doctors[doctor_id] = cached
+
+        if not missing:
+            return {doctor_id: doctors[doctor_id] for doctor_id in doctor_ids if doctor_id in doctors}
+
+        invalidations = {doctor_id: self._invalidations.get(doctor_id, 0) for doctor_id in missing}
+        for doctor_id in missing:
+            self._loading[doctor_id] = self._loading.get(doctor_id, 0) + 1
+        try:
+            found = {
+                doctor.doctor_id: doctor for doctor in await self.repository.get_doctors_subscribers(missing)
+            }
+            for doctor_id in missing:
+                doctor = found.get(doctor_id)
+                if invalidations[doctor_id] == self._invalidations.get(doctor_id, 0):
+                    self._cache[doctor_id] = doctor or NOT_FOUND
+                if doctor:
+                    doctors[doctor_id] = doctor
+        finally:
+            for doctor_id in missing:
+                self._loading[doctor_id] -= 1
+                if not self._loading[doctor_id]:
+                    del self._loading[doctor_id]
+                    self._invalidations.pop(doctor_id, None)
+
+        return {doctor_id: doctors[doctor_id] for doctor_id in doctor_ids if doctor_id in doctors}
+
+    def invalidate(self, doctor_id: int):
+        if doctor_id in self._loading:
+            self._invalidations[doctor_id] = self._invalidations.get(doctor_id, 0) + 1
+        self._cache.pop(doctor_id, None)
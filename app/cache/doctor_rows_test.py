@@ -0,0 +1,75 @@
+import asyncio
+
+from app.cache.doctor_rows import DoctorRowsCache
+from app.entities.doctor_subs import DoctorSubs
+
+
+class Repository:
+    def __init__(self, doctor_ids):
+        self.doctor_ids = set(doctor_ids)
+        self.requests = []
+
+    async def get_doctors_subscribers(self, doctor_ids):
+        self.requests.append(list(doctor_ids))
+        await asyncio.sleep(0)
+        return [DoctorSubs(internal_id=doctor_id, doctor_id=doctor_id) for doctor_id in doctor_ids
+                if doctor_id in self.doctor_ids]
+
+
+def make_cache(repository):
+    return DoctorRowsCache(repository, max_size=100, ttl_seconds=60, not_found_ttl_seconds=60)
+
+
+def test_get_many_fetches_only_missing_ids_in_request_order():
+    async def scenario():
+        repository = Repository([1, 2, 3])
+        cache = make_cache(repository)
+        await cache.get(2)
+        doctors = await cache.get_many([3, 2, 404, 1, 3])
+        return list(doctors), repository.requests
+
+    doctor_ids, requests = asyncio.run(scenario())
+    assert doctor_ids == [3, 2, 1]
+    assert requests == [[2], [3, 404, 1]]
+
+
+def test_not_found_is_cached():
+    async def scenario():
+        repository = Repository([])
+        cache = make_cache(repository)
+        return await cache.get(404), await cache.get(404), repository.requests
+
+    first, second, requests = asyncio.run(scenario())
+    assert first is None and second is None
+    assert requests == [[404]]
+
+
+def test_invalidate_during_fetch_is_not_cached():
+    async def scenario():
+        repository = Repository([1])
+        cache = make_cache(repository)
+        task = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        cache.invalidate(1)
+        await task
+        await cache.get(1)
+        return repository.requests
+
+    assert asyncio.run(scenario()) == [[1], [1]]
+
+
+def test_invalidate_of_other_doctor_does_not_block_caching():
+    async def scenario():
+        repository = Repository([1, 2])
+        cache = make_cache(repository)
+        task = asyncio.create_task(cache.get(1))
+        await asyncio.sleep(0)
+        cache.invalidate(2)
+        await task
+        await cache.get(1)
+        return repository.requests, cache._loading, cache._invalidations
+
+    requests, loading, invalidations = asyncio.run(scenario())
+    # сброс другого доктора не мешает закэшировать первого, служебные записи не копятся
+    assert requests == [[1]]
+    assert loading == {} and invalidations == {}
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StaleWhileRevalidateCache(Generic[T]):
+    """
+    Кэш одного значения в памяти процесса.
+    Пока ttl не истек - отдает значение как есть, после - отдает устаревшее и обновляет его одной фоновой задачей.
+    Если обновление упало (например, база недоступна), продолжает отдавать последнее удачное значение
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[T]], ttl_seconds: float, retry_seconds: float = 5):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        # пауза перед повтором после неудачного обновления, чтобы не долбить недоступную базу
+        self.retry_seconds = retry_seconds
+
+        self._value: Optional[T] = None
+        self._has_value = False
+        self._loaded_at: Optional[float] = None
+        # увеличивается при invalidate, чтобы обновление, начатое до сброса, не считалось свежим
+        self._generation = 0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+        self._load_lock = asyncio.Lock()
+
+    async def get(self) -> T:
+        if not self._has_value:
+            # первая загрузка: параллельные запросы ждут один поход в базу
+            async with self._load_lock:
+                if not self._has_value:
+                    await self._load()
+            return self._value
+
+        if self._is_expired():
+            self._schedule_refresh()
+        return self._value
+
+    def invalidate(self):
+        """Помечает значение устаревшим, следующий get отдаст его и запустит обновление"""
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_expired(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl_seconds
+
+    def _schedule_refresh(self):
+        if time.monotonic() < self._retry_at:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    async def _refresh(self):
+        try:
+            await self._load()
+        except Exception as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            print("Ошибка при обновлении кэша, отдаем последнее значение", e)
+
+    async def _load(self):
+        generation = self._generation
+        value = await self.loader()
+        self._value = value
+        self._has_value = True
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from app.cache.stale_while_revalidate import StaleWhileRevalidateCache
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            raise ConnectionError("база недоступна")
+        return self.calls
+
+
+def test_concurrent_first_get_loads_once():
+    async def scenario():
+        loader = Loader()
+        cache = StaleWhileRevalidateCache(loader, ttl_seconds=60)
+        values = await asyncio.gather(*(cache.get() for _ in range(10)))
+        return values, loader.calls
+
+    values, calls = asyncio.run(scenario())
+    assert values == [1] * 10
+    assert calls == 1
+
+
+def test_invalidate_serves_stale_and_refreshes_in_background():
+    async def scenario():
+        loader = Loader()
+        cache = StaleWhileRevalidateCache(loader, ttl_seconds=60)
+        await cache.get()
+        cache.invalidate()
+        stale = await asyncio.gather(*(cache.get() for _ in range(5)))
+        await cache._refresh_task
+        return stale, await cache.get(), loader.calls
+
+    stale, fresh, calls = asyncio.run(scenario())
+    assert stale == [1] * 5
+    assert fresh == 2
+    assert calls == 2
+
+
+def test_keeps_last_good_value_when_refresh_fails():
+    async def scenario():
+        loader = Loader()
+        cache = StaleWhileRevalidateCache(loader, ttl_seconds=0, retry_seconds=60)
+        await cache.get()
+        loader.fail = True
+        await cache.get()
+        await cache._refresh_task
+        # после неудачи повтор откладывается на retry_seconds
+        values = [await cache.get() for _ in range(3)]
+        return values, loader.calls
+
+    values, calls = asyncio.run(scenario())
+    assert values == [1, 1, 1]
+    assert calls == 2
+
+
+def test_first_load_error_is_raised():
+    async def scenario():
+        loader = Loader()
+        loader.fail = True
+        await StaleWhileRevalidateCache(loader, ttl_seconds=60).get()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
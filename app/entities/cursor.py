@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+
+from pydantic import BaseModel
+
+from app.entities.doctor_subs import DoctorSubs
+from app.entities.messengers import SOCIAL_NETWORK_FIELDS
+from app.entities.sorted import SortedType
+from app.exception.domain_error import InvalidCursor
+
+
+def sort_subscribers(doctor: DoctorSubs, social_networks: list[str]) -> int:
+    """
+    Значение, по которому сортируется выдача фильтра:
+    одна соцсеть - ее подписчики, иначе - общий охват по всем соцсетям
+    """
+    networks = set(social_networks)
+    if len(networks) == 1:
+        return getattr(doctor, SOCIAL_NETWORK_FIELDS[networks.pop()])
+    return sum(getattr(doctor, field) for field in SOCIAL_NETWORK_FIELDS.values())
+
+
+class FilterCursor(BaseModel):
+    """Позиция в выдаче фильтра - значение сортировки и doctor_id последнего доктора на странице"""
+    sort: SortedType
+    subscribers: int
+    doctor_id: int
+
+    @classmethod
+    def after(cls, doctor: DoctorSubs, social_networks: list[str], sort_enum: SortedType) -> "FilterCursor":
+        return cls(sort=sort_enum, subscribers=sort_subscribers(doctor, social_networks), doctor_id=doctor.doctor_id)
+
+    def encode(self) -> str:
+        raw = json.dumps([self.sort.value, self.subscribers, self.doctor_id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, token: str, sort_enum: SortedType) -> "FilterCursor":
+        """Разбирает курсор, сортировка в курсоре должна совпадать с текущей"""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            sort, subscribers, doctor_id = json.loads(raw)
+            cursor = cls(sort=SortedType(sort), subscribers=int(subscribers), doctor_id=int(doctor_id))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+            raise InvalidCursor(token, str(e))
+
+        if cursor.sort != sort_enum:
+            raise InvalidCursor(token, "курсор получен для другой сортировки")
+        return cursor
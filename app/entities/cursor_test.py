@@ -0,0 +1,38 @@
+import pytest
+from app.entities.cursor import FilterCursor, sort_subscribers
+from app.entities.doctor_subs import DoctorSubs
+from app.entities.sorted import SortedType
+from app.exception.domain_error import InvalidCursor
+
+
+def test_cursor_round_trip():
+    cursor = FilterCursor(sort=SortedType.DESC, subscribers=120_500, doctor_id=42)
+
+    assert FilterCursor.decode(cursor.encode(), SortedType.DESC) == cursor
+
+
+@pytest.mark.parametrize("token", ["", "not-a-cursor", "WyJkZXNjIl0", "eyJhIjoxfQ"])
+def test_cursor_decode_garbage(token):
+    with pytest.raises(InvalidCursor):
+        FilterCursor.decode(token, SortedType.DESC)
+
+
+def test_cursor_decode_other_sort():
+    token = FilterCursor(sort=SortedType.ASC, subscribers=1, doctor_id=1).encode()
+
+    with pytest.raises(InvalidCursor):
+        FilterCursor.decode(token, SortedType.DESC)
+
+
+@pytest.mark.parametrize("social_networks, expected", [
+    ([], 1111),
+    (["tg"], 10),
+    (["vk"], 1000),
+    (["tg", "inst"], 1111),
+    (["tg", "inst", "youtube", "vk"], 1111),
+])
+def test_sort_subscribers(social_networks, expected):
+    doctor = DoctorSubs(internal_id=0, doctor_id=1, inst_subs_count=1, tg_subs_count=10, youtube_subs_count=100,
+                        vk_subs_count=1000)
+
+    assert sort_subscribers(doctor, social_networks) == expected
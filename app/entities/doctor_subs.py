@@ -54,6 +54,8 @@ def subs_short(count) -> str:
 class DoctorSubs(BaseModel):
     internal_id: int
     doctor_id: int
+    # показывает ли сайт доктора, от этого зависит частота обновления подписчиков
+    is_active: bool = True
     # время последнего обновления подписчиков
     inst_last_updated_timestamp: Optional[datetime.datetime] = None
     # количество подписчиков
@@ -76,6 +78,8 @@ class DoctorSubs(BaseModel):
     youtube_subs_count: int = 0
     # название аккаунта
     youtube_channel_name: str = ""
+    # id канала, в который резолвится название аккаунта
+    youtube_channel_id: str = ""
 
     # время последнего обновления подписчиков
     vk_last_updated_timestamp: Optional[datetime.datetime] = None
@@ -94,12 +98,13 @@ class DoctorSubsByIDs(BaseModel):
     vk_subs_count: int = 0
 
 
-class UpdatedSubsQueue(BaseModel):
-    # id в базе
-    _id: int
-    # id доктора в базе subscribers
-    id_in_subscribers: int
-    # doctor_id доктора в базе subscribers
-    last_updated_id: int
-    # последнее время обновление
-    last_updated_at: Optional[datetime.datetime] = None
+class DoctorSubsSnapshot(BaseModel):
+    """Строка doctors для колоночной модели фильтрации. None - подписчики еще не получены"""
+    doctor_id: int
+    is_active: bool = False
+    inst_subs_count: Optional[int] = None
+    tg_subs_count: Optional[int] = None
+    youtube_subs_count: Optional[int] = None
+    vk_subs_count: Optional[int] = None
+    # самое свежее из *_last_updated
+    last_updated_timestamp: Optional[datetime.datetime] = None
@@ -10,6 +10,15 @@ class SocialNetworkType(str, Enum):
     YOUTUBE = "youtube"
 
 
+# колонки с количеством подписчиков в таблице doctors
+SOCIAL_NETWORK_FIELDS = {
+    SocialNetworkType.INSTAGRAM: "inst_subs_count",
+    SocialNetworkType.TELEGRAM: "tg_subs_count",
+    SocialNetworkType.YOUTUBE: "youtube_subs_count",
+    SocialNetworkType.VK: "vk_subs_count",
+}
+
+
 class Messenger(BaseModel):
     name: str
     slug: SocialNetworkType
\ No newline at end of file
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from enum import Enum
+
+from pydantic import BaseModel
+
+
+class NotFoundReason(str, Enum):
+    """Почему не удалось получить подписчиков доктора"""
+    # вместо имени канала сохранена ссылка
+    INVALID_LINK = "invalid_link"
+    # соцсеть вернула 0 подписчиков или ничего
+    ZERO_SUBSCRIBERS = "zero_subscribers"
+    # канала с таким именем нет
+    USERNAME_NOT_OCCUPIED = "username_not_occupied"
+
+
+class Notification(BaseModel):
+    """Уведомление из outbox, ожидающее отправки"""
+    id: int
+    # метод SaleBotClient, которым отправляется уведомление
+    kind: str
+    # аргументы метода
+    payload: dict
+    attempts: int = 0
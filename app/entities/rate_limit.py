@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import datetime
+from pydantic import BaseModel
+
+
+class RateLimitBucket(BaseModel):
+    """Состояние token bucket внешнего API"""
+    bucket: str
+    capacity: float
+    refill_per_second: float
+    # доступно токенов прямо сейчас, с учетом пополнения
+    tokens: float
+    updated_at: datetime.datetime
+
+
+class RateLimitReservation(BaseModel):
+    """Результат попытки взять токены из ведра"""
+    granted: bool
+    # сколько токенов осталось (или доступно, если не хватило)
+    remaining: float
+    # сколько ждать, пока накопится нужное количество токенов, 0 - если выдали
+    wait_seconds: float = 0
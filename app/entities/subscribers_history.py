@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import datetime
+from typing import Dict, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+# за сколько дней считаем прирост подписчиков
+GROWTH_PERIODS_DAYS = (7, 30, 90)
+
+
+class HistoryPoint(BaseModel):
+    """Количество подписчиков на конец дня (или недели для старой истории)"""
+    day: datetime.date
+    subscribers: int
+
+
+class NetworkHistory(BaseModel):
+    """История подписчиков доктора в одной соцсети"""
+    network: str
+    points: List[HistoryPoint]
+    # период в днях -> прирост за период, None - истории за весь период еще нет
+    growth: Dict[int, Optional[int]]
+
+
+def growth_deltas(
+        points: List[HistoryPoint], today: datetime.date, periods: Sequence[int] = GROWTH_PERIODS_DAYS
+) -> Dict[int, Optional[int]]:
+    """
+    Прирост подписчиков за каждый период: последнее значение минус значение на день,
+    отстоящий от today на период (берется последняя точка не позже этого дня). points отсортированы по дню
+    """
+    if not points:
+        return {period: None for period in periods}
+
+    latest = points[-1].subscribers
+    deltas = {}
+    for period in periods:
+        since = today - datetime.timedelta(days=period)
+        base = None
+        for point in points:
+            if point.day > since:
+                break
+            base = point.subscribers
+        deltas[period] = latest - base if base is not None else None
+    return deltas
@@ -0,0 +1,23 @@
+import datetime
+
+from app.entities.subscribers_history import HistoryPoint, growth_deltas
+
+TODAY = datetime.date(2025, 6, 30)
+
+
+def _point(days_ago: int, subscribers: int) -> HistoryPoint:
+    return HistoryPoint(day=TODAY - datetime.timedelta(days=days_ago), subscribers=subscribers)
+
+
+def test_growth_deltas_use_last_point_before_period_start():
+    points = [_point(100, 500), _point(40, 800), _point(29, 850), _point(8, 900), _point(0, 1000)]
+
+    # за 7 дней база - точка 8 дней назад, за 30 - 40 дней назад (29 дней назад уже внутри периода)
+    assert growth_deltas(points, TODAY) == {7: 100, 30: 200, 90: 500}
+
+
+def test_growth_deltas_without_enough_history():
+    points = [_point(10, 900), _point(0, 1000)]
+
+    assert growth_deltas(points, TODAY) == {7: 100, 30: None, 90: None}
+    assert growth_deltas([], TODAY) == {7: None, 30: None, 90: None}
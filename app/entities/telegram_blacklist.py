@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel
+
+
+class TelegramBlacklistEntry(BaseModel):
+    """Активная запись черного списка телеграм каналов"""
+    id: int
+    telegram_username: Optional[str] = None
+    telegram_name: Optional[str] = None
@@ -0,0 +1,13 @@
+from __future__ import annotations
+
+from typing import Optional
+from pydantic import BaseModel
+
+
+class TelegramPeer(BaseModel):
+    """Пир телеграма из кэша: по id и access_hash к каналу можно обращаться без резолва username"""
+    peer_id: int
+    access_hash: Optional[int] = None
+    # user, bot, group, channel, supergroup
+    type: str
+    username: Optional[str] = None
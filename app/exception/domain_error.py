@@ -71,4 +71,25 @@ class DoctorNotFound(Exception):
         super().__init__(self.message)
 
     def __str__(self):
-        return self.message
\ No newline at end of file
+        return self.message
+
+
+class InvalidCursor(ValueError):
+    """Исключение, возникающее когда не удалось разобрать курсор пагинации"""
+
+    def __init__(self, cursor: str, reason: str = None):
+        """
+        :param cursor: Курсор, пришедший от клиента
+        :param reason: Причина (необязательно)
+        """
+        self.cursor = cursor
+        self.reason = reason
+
+        self.message = f"Невалидный курсор пагинации '{cursor}'"
+        if reason:
+            self.message += f". Причина: {reason}"
+
+        super().__init__(self.message)
+
+    def __str__(self):
+        return self.message
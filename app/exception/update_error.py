@@ -16,3 +16,24 @@ class UsernameNotOccupiedError(Exception):
 
     def __str__(self):
         return f"Не найден человек с username: {self.username}"
+
+
+class RateLimitExceededError(Exception):
+    """Исключение, возникающее когда в ведре лимитов внешнего API не хватает токенов"""
+
+    def __init__(self, bucket: str, wait_seconds: float):
+        self.bucket = bucket
+        self.wait_seconds = wait_seconds
+
+    def __str__(self):
+        return f"Исчерпан лимит запросов {self.bucket}, токены появятся через {int(self.wait_seconds)} секунд"
+
+
+class InvalidTokenError(Exception):
+    """Исключение, возникающее когда внешний API отклонил токен доступа: протух или отозван"""
+
+    def __init__(self, network: str):
+        self.network = network
+
+    def __str__(self):
+        return f"Токен доступа к {self.network} недействителен"
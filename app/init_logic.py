@@ -1,34 +1,90 @@
 # инициализация клиентов
+from clients.postgres import Database
 from clients.telegram import TelegramClient
 from clients.instagram import InstagramGraphApiClient
 from clients.notifications.salebot import SaleBotClient
 from clients.youtube import YouTubeClient
 from clients.vk import VkClient
+from clients.rate_limiter import RateLimiter
+from clients.http import HttpClient
 
 # инициализация репозиториев
+import datetime
+from config.config import app_config
 from app.storage.api import ApiRepository
+from app.storage.doctors_read_model import DoctorsReadModel
+from app.cache.stale_while_revalidate import StaleWhileRevalidateCache
+from app.cache.doctor_rows import DoctorRowsCache
+from app.cache.blacklist_index import TelegramBlacklistIndex
 from app.storage.update_subscribers import UpdateSubscribersRepository
 from app.storage.instagram_settings import InstagramSettingsRepository
+from app.storage.rate_limits import RateLimitsRepository
+from app.storage.telegram_peers import TelegramPeersRepository
+from app.storage.notifications import NotificationsRepository
+from app.storage.subscribers_history import SubscribersHistoryRepository
 
 # инициализация сервисов
 from app.services.api import ApiService
 from app.services.update_subscribers import UpdateSubscribersService
+from app.services.notifications import NotificationOutbox
+from app.services.subscribers_history import SubscribersHistoryService
 
 # инициализация клиентов
-telegram_client = TelegramClient()
-instagram_client = InstagramGraphApiClient()
-notification_client = SaleBotClient()
-youtube_client = YouTubeClient()
-vk_client = VkClient()
+database = Database()
+# общий HTTP клиент внешних API с пулами соединений по хостам
+http_client = HttpClient(app_config.http)
+# лимиты запросов к внешним API общие для всех клиентов и хранятся в базе
+rate_limiter = RateLimiter(
+    repository=RateLimitsRepository(database),
+    limits=app_config.rate_limits.by_network(),
+    max_wait_seconds=app_config.rate_limits.max_wait_seconds,
+)
+# пиры телеграм каналов тоже в базе, общие для всех реплик
+telegram_client = TelegramClient(rate_limiter, TelegramPeersRepository(database))
+instagram_client = InstagramGraphApiClient(rate_limiter, http_client)
+salebot_client = SaleBotClient(http_client)
+youtube_client = YouTubeClient(rate_limiter)
+vk_client = VkClient(rate_limiter, http_client)
 # ____________________________________________
 
 # инициализация репозиториев
-update_subs_repo = UpdateSubscribersRepository()
-api_repo = ApiRepository()
-instagram_settings_repo = InstagramSettingsRepository()
+update_subs_repo = UpdateSubscribersRepository(
+    database,
+    flush_max_size=app_config.refresh_queue.write_buffer_max_size,
+    flush_max_age_seconds=app_config.refresh_queue.write_buffer_max_age_seconds,
+)
+api_repo = ApiRepository(database)
+instagram_settings_repo = InstagramSettingsRepository(database)
+doctors_read_model = DoctorsReadModel(
+    repository=api_repo,
+    full_reload_interval=datetime.timedelta(seconds=app_config.read_model.full_reload_interval_seconds),
+)
+subscribers_count_cache = StaleWhileRevalidateCache(
+    loader=api_repo.get_all_subscribers_count,
+    ttl_seconds=app_config.cache.subscribers_count_ttl_seconds,
+)
+filter_info_cache = StaleWhileRevalidateCache(
+    loader=api_repo.get_filter_info,
+    ttl_seconds=app_config.cache.filter_info_ttl_seconds,
+)
+doctor_rows_cache = DoctorRowsCache(
+    repository=api_repo,
+    max_size=app_config.cache.doctor_rows_max_size,
+    ttl_seconds=app_config.cache.doctor_rows_ttl_seconds,
+    not_found_ttl_seconds=app_config.cache.doctor_not_found_ttl_seconds,
+)
+blacklist_index = TelegramBlacklistIndex(repository=api_repo)
 # ____________________________________________
 
 # инициализация сервисов
+# уведомления уходят в salebot фоновой задачей через outbox, сервисы их не ждут
+notification_client = NotificationOutbox(
+    repository=NotificationsRepository(database),
+    salebot_client=salebot_client,
+    rate_limiter=rate_limiter,
+    config=app_config.notifications,
+)
+
 update_subs_service = UpdateSubscribersService(
     repository=update_subs_repo,
     instagram_repo=instagram_settings_repo,
@@ -36,12 +92,27 @@ update_subs_service = UpdateSubscribersService(
     telegram_client=telegram_client,
     youtube_client=youtube_client,
     vk_client=vk_client,
-    notification_client=notification_client
+    notification_client=notification_client,
+    queue_config=app_config.refresh_queue,
 )
 
 api_service = ApiService(
     repository=api_repo,
+    read_model=doctors_read_model,
+    subscribers_count_cache=subscribers_count_cache,
+    filter_info_cache=filter_info_cache,
+    doctor_rows_cache=doctor_rows_cache,
+    blacklist_index=blacklist_index,
     tg_client=telegram_client,
-    notification_client=notification_client
+    notification_client=notification_client,
+    refresh_tiers=app_config.refresh_queue.tiers,
 )
+
+subscribers_history_service = SubscribersHistoryService(
+    repository=SubscribersHistoryRepository(database),
+    config=app_config.history,
+)
+
+# сброс кэшей API после записи новых счетчиков подписчиков
+update_subs_repo.add_update_listener(api_service.on_subscribers_updated)
 # ____________________________________________
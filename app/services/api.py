@@ -1,27 +1,65 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional
 
+from app.entities.cursor import FilterCursor
 from app.entities.sorted import SortedType
 from clients.telegram import TelegramClient
 
-from app.entities.doctor_subs import DoctorSubs, subs_short, subs_text, DoctorSubsByIDs, subs_by_digits
+from app.entities.doctor_subs import DoctorSubs, subs_short, subs_text, subs_by_digits
 from app.entities.messengers import Messenger
 from app.exception.domain_error import DoctorNotFound
 from app.api.dto.doctor_subs import DoctorSubsDTO, DoctorSubsFilterDTO, DoctorSubsByIDsDTO
+from app.api.dto.telegram_blacklist import TelegramBlacklistCheckDTO
+from app.storage.doctors_read_model import DoctorsReadModel
+from app.cache.stale_while_revalidate import StaleWhileRevalidateCache
+from app.cache.doctor_rows import DoctorRowsCache
+from app.cache.blacklist_index import TelegramBlacklistIndex
+from config.config import RefreshTiersConfig
+
+
+def page_offset(current_page: int, limit: int, cursor: Optional[FilterCursor] = None) -> int:
+    # при курсоре страница отсчитывается от него
+    if current_page <= 0 or cursor is not None:
+        current_page = 1
+    return (current_page - 1) * limit
+
+
+def next_cursor(doctor_subs: list[DoctorSubs], social_media: list[str], sort_enum: SortedType, limit: int) -> str | None:
+    """Курсор следующей страницы, если текущая заполнена целиком"""
+    if not doctor_subs or len(doctor_subs) < limit:
+        return None
+    return FilterCursor.after(doctor_subs[-1], social_media, sort_enum).encode()
 
 
 class ApiService(object):
 
-    def __init__(self, repository, tg_client: TelegramClient, notification_client):
+    def __init__(
+            self,
+            repository,
+            read_model: DoctorsReadModel,
+            subscribers_count_cache: StaleWhileRevalidateCache,
+            filter_info_cache: StaleWhileRevalidateCache,
+            doctor_rows_cache: DoctorRowsCache,
+            blacklist_index: TelegramBlacklistIndex,
+            tg_client: TelegramClient,
+            notification_client,
+            refresh_tiers: RefreshTiersConfig = RefreshTiersConfig(),
+    ):
         self.repository = repository
+        self.read_model = read_model
+        self.subscribers_count_cache = subscribers_count_cache
+        self.filter_info_cache = filter_info_cache
+        self.doctor_rows_cache = doctor_rows_cache
+        self.blacklist_index = blacklist_index
         self.tg_client = tg_client
         self.notification_client = notification_client
+        self.refresh_tiers = refresh_tiers
 
-    def get_doctor_subscribers(self, doctor_id: int) -> DoctorSubsDTO | None:
-        try:
-            doctor: DoctorSubs = self.repository.get_doctor_subscribers(doctor_id)
-        except DoctorNotFound:
+    async def get_doctor_subscribers(self, doctor_id: int) -> DoctorSubsDTO | None:
+        # ошибки базы пробрасываем: недоступная база - не повод отвечать "доктор не найден"
+        doctor: Optional[DoctorSubs] = await self.doctor_rows_cache.get(doctor_id)
+        if doctor is None:
             return None
 
         return DoctorSubsDTO(
@@ -48,14 +86,25 @@ class ApiService(object):
             vk_text=subs_text(doctor.vk_subs_count),
         )
 
-    def get_all_subscribers_count(self):
-        subs_count, last_updated = self.repository.get_all_subscribers_count()
+    def on_subscribers_updated(self, doctor_id: int):
+        """Вызывается после записи новых счетчиков подписчиков доктора"""
+        self.subscribers_count_cache.invalidate()
+        self.doctor_rows_cache.invalidate(doctor_id)
+
+    async def get_all_subscribers_count(self):
+        try:
+            subs_count, last_updated = await self.subscribers_count_cache.get()
+        except Exception:
+            subs_count, last_updated = 0, None
         return subs_by_digits(subs_count), subs_text(subs_count), last_updated
 
-    def get_subscribers_by_doctor_ids(self, doctor_ids: list[int]) -> list[DoctorSubsByIDsDTO]:
+    async def get_subscribers_by_doctor_ids(self, doctor_ids: list[int]) -> list[DoctorSubsByIDsDTO]:
         result = []
-        doctors: list[DoctorSubsByIDs] = self.repository.get_subscribers_by_doctor_ids(doctor_ids)
-        for doctor in doctors:
+        try:
+            doctors: dict[int, DoctorSubs] = await self.doctor_rows_cache.get_many(doctor_ids)
+        except Exception:
+            return result
+        for doctor in doctors.values():
             result.append(DoctorSubsByIDsDTO(
                 doctor_id=doctor.doctor_id,
                 inst_subs_count=subs_short(doctor.inst_subs_count),
@@ -79,18 +128,23 @@ class ApiService(object):
             vk_channel_name: str,
     ) -> None:
         try:
-            self.repository.create_doctor_subscriber(
+            await self.repository.create_doctor_subscriber(
                 doctor_id, instagram_channel_name,
                 telegram_channel_name, youtube_channel_name,
                 vk_channel_name
             )
+            self.read_model.mark_stale()
+            self.doctor_rows_cache.invalidate(doctor_id)
         except Exception as e:
-            self.notification_client.send_error_message(str(e), "service_create_doctor")
+            await self.notification_client.send_error_message(str(e), "service_create_doctor")
 
-    def get_filter_info(self) -> List[Messenger]:
-        return self.repository.get_filter_info()
+    async def get_filter_info(self) -> List[Messenger]:
+        try:
+            return await self.filter_info_cache.get()
+        except Exception:
+            return []
 
-    def doctors_filter_with_doctors_ids(
+    async def doctors_filter_with_doctors_ids(
             self,
             social_media: list[str],
             sort_enum: SortedType,
@@ -98,16 +152,19 @@ class ApiService(object):
             max_subscribers: int,
             limit: int,
             current_page: int,
-            doctor_ids: list[int]
+            doctor_ids: list[int],
+            cursor: Optional[FilterCursor] = None,
     ):
         doctors_dto, doctor_subs = list(), list()
-        doctor_subs: list[DoctorSubs] = self.repository.doctors_filter_with_doctors_ids(
-            social_media, sort_enum, min_subscribers, max_subscribers, limit, current_page, doctor_ids
-        )
-
-        doctors_count, subs_count = self.repository.filtered_doctors_count_with_doctors_ids(
-            social_media, min_subscribers, max_subscribers, doctor_ids
-        )
+        if self.read_model.is_loaded:
+            doctor_subs, doctors_count, subs_count = self.read_model.filter(
+                social_media, sort_enum, min_subscribers, max_subscribers,
+                page_offset(current_page, limit, cursor), limit, doctor_ids, cursor
+            )
+        else:
+            doctor_subs, doctors_count, subs_count = await self.repository.doctors_filter_page(
+                social_media, sort_enum, min_subscribers, max_subscribers, current_page, limit, cursor, doctor_ids
+            )
 
         for doctor_sub in doctor_subs:
             doctors_dto.append(
@@ -124,9 +181,9 @@ class ApiService(object):
                 )
             )
 
-        return doctors_dto, doctors_count, subs_by_digits(subs_count)
+        return doctors_dto, doctors_count, subs_by_digits(subs_count), next_cursor(doctor_subs, social_media, sort_enum, limit)
 
-    def doctors_filter(
+    async def doctors_filter(
             self,
             social_media: list[str],
             sort_enum: SortedType,
@@ -134,13 +191,18 @@ class ApiService(object):
             max_subscribers: int,
             current_page: int,
             limit: int,
+            cursor: Optional[FilterCursor] = None,
     ):
         doctors_dto, doctor_subs = list(), list()
-        doctor_subs: list[DoctorSubs] = self.repository.doctors_filter(social_media, sort_enum, min_subscribers,
-                                                                       max_subscribers, current_page, limit)
-        doctors_count, subs_count = self.repository.filtered_doctors_count(
-            social_media, min_subscribers, max_subscribers
-        )
+        if self.read_model.is_loaded:
+            doctor_subs, doctors_count, subs_count = self.read_model.filter(
+                social_media, sort_enum, min_subscribers, max_subscribers,
+                page_offset(current_page, limit, cursor), limit, cursor=cursor
+            )
+        else:
+            doctor_subs, doctors_count, subs_count = await self.repository.doctors_filter_page(
+                social_media, sort_enum, min_subscribers, max_subscribers, current_page, limit, cursor
+            )
 
         for doctor_sub in doctor_subs:
             doctors_dto.append(
@@ -157,7 +219,7 @@ class ApiService(object):
                 )
             )
 
-        return doctors_dto, doctors_count, subs_by_digits(subs_count)
+        return doctors_dto, doctors_count, subs_by_digits(subs_count), next_cursor(doctor_subs, social_media, sort_enum, limit)
 
     async def update_doctor(
             self, doctor_id: int,
@@ -168,25 +230,57 @@ class ApiService(object):
         """Обновление данных о докторе по его ID, если ID нет, то просто создаем доктора"""
         if instagram_channel_name or telegram_channel_name:
             try:
-                self.repository.update_doctor(doctor_id, instagram_channel_name, telegram_channel_name)
+                await self.repository.update_doctor(doctor_id, instagram_channel_name, telegram_channel_name)
+                self.doctor_rows_cache.invalidate(doctor_id)
                 return True
             except DoctorNotFound:
-                self.repository.create_doctor_subscriber(doctor_id, instagram_channel_name, telegram_channel_name, "")
+                await self.repository.create_doctor_subscriber(doctor_id, instagram_channel_name, telegram_channel_name, "")
+                self.read_model.mark_stale()
+                self.doctor_rows_cache.invalidate(doctor_id)
                 return False
             except Exception as e:
-                self.notification_client.send_error_message(str(e), "service_update_doctor")
+                await self.notification_client.send_error_message(str(e), "service_update_doctor")
                 return False
         elif is_active is not None:
             try:
-                self.repository.update_doctor_is_active(doctor_id=doctor_id, is_active=is_active)
+                await self.repository.update_doctor_is_active(
+                    doctor_id=doctor_id,
+                    is_active=is_active,
+                    inactive_refresh_seconds=self.refresh_tiers.inactive_seconds,
+                )
+                self.read_model.mark_stale()
+                self.subscribers_count_cache.invalidate()
+                self.doctor_rows_cache.invalidate(doctor_id)
                 return True
             except Exception as e:
-                self.notification_client.send_error_message(str(e), "service_update_doctor")
+                await self.notification_client.send_error_message(str(e), "service_update_doctor")
                 return False
         return None
 
     async def check_telegram_blacklist(self, telegram: str) -> bool:
-        return self.repository.check_telegram_blacklist(telegram)
+        if self.blacklist_index.is_loaded:
+            return self.blacklist_index.find(telegram) is not None
+        return await self.repository.check_telegram_blacklist(telegram)
+
+    async def check_telegram_blacklist_batch(self, telegrams: list[str]) -> list[TelegramBlacklistCheckDTO]:
+        """Вердикт по каждой строке в порядке запроса вместе с совпавшей записью черного списка"""
+        if self.blacklist_index.is_loaded:
+            matches = self.blacklist_index.find_many(telegrams)
+        else:
+            matches = await self.repository.check_telegram_blacklist_batch(telegrams)
+
+        result = []
+        for telegram in telegrams:
+            entry = matches.get(telegram)
+            result.append(TelegramBlacklistCheckDTO(
+                telegram=telegram,
+                is_in_blacklist=entry is not None,
+                matched_id=entry.id if entry else None,
+                matched_username=entry.telegram_username if entry else None,
+                matched_name=entry.telegram_name if entry else None,
+            ))
+
+        return result
 
     # def migrate_instagram(self, doctor_id: int, instagram_channel_name: str) -> bool:
     #     """Обновление данных о докторе по его ID, если ID нет, то просто создаем доктора"""
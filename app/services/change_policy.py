@@ -0,0 +1,26 @@
+import datetime
+import math
+from typing import Optional
+
+from config.config import ChangePolicyConfig
+
+
+def is_significant_change(
+        old_count: int,
+        new_count: int,
+        last_updated: Optional[datetime.datetime],
+        now: datetime.datetime,
+        policy: ChangePolicyConfig,
+) -> bool:
+    """
+    Стоит ли записывать новое количество подписчиков. Мелкие колебания не пишем, чтобы не переписывать
+    строку доктора и не сбрасывать кэши: изменение должно быть не меньше min_absolute и не меньше
+    min_relative от записанного значения. Давно не записанное значение пишется в любом случае
+    """
+    if not old_count or last_updated is None:
+        return True
+    if (now - last_updated).total_seconds() >= policy.max_age_seconds:
+        return True
+
+    threshold = max(policy.min_absolute, math.ceil(policy.min_relative * old_count))
+    return abs(new_count - old_count) >= max(threshold, 1)
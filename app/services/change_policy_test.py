@@ -0,0 +1,33 @@
+import datetime
+
+import pytest
+
+from app.services.change_policy import is_significant_change
+from config.config import ChangePolicyConfig
+
+NOW = datetime.datetime(2025, 6, 30, 12, 0)
+HOUR_AGO = NOW - datetime.timedelta(hours=1)
+POLICY = ChangePolicyConfig(min_absolute=5, min_relative=0.01, max_age_seconds=86400)
+
+
+@pytest.mark.parametrize("old_count, new_count, expected", [
+    # не изменилось
+    (1000, 1000, False),
+    # порог 5 подписчиков
+    (100, 104, False),
+    (100, 95, True),
+    # порог 1% больше абсолютного
+    (10_000, 10_099, False),
+    (10_000, 9_900, True),
+    # раньше подписчиков не было
+    (0, 3, True),
+])
+def test_significant_change_thresholds(old_count, new_count, expected):
+    assert is_significant_change(old_count, new_count, HOUR_AGO, NOW, POLICY) is expected
+
+
+def test_old_value_is_written_even_without_change():
+    two_days_ago = NOW - datetime.timedelta(days=2)
+
+    assert is_significant_change(1000, 1000, two_days_ago, NOW, POLICY) is True
+    assert is_significant_change(1000, 1000, None, NOW, POLICY) is True
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from typing import Dict, List, Tuple
+
+from app.entities.notification import Notification, NotFoundReason
+from app.exception.update_error import RateLimitExceededError
+from config.config import NotificationsConfig
+
+RATE_LIMIT_NETWORK = "salebot"
+RATE_LIMIT_CREDENTIAL = "default"
+
+
+class NotificationOutbox(object):
+    """
+    Заменяет SaleBotClient для сервисов: уведомление кладется в очередь в памяти и метод сразу возвращается.
+    Фоновая задача пачками переносит очередь в таблицу notifications_outbox и доставляет уведомления
+    через SaleBotClient с повторами и ограничением скорости, так что ни циклы обновления,
+    ни запросы к API не ждут salebot и не падают из-за него.
+
+    Предупреждения о не найденных докторах отдельно не отправляются: они схлопываются по
+    (доктор, соцсеть, причина) в таблице not_found_warnings, и раз в интервал по каждой соцсети уходит
+    одна сводка. Про одного и того же доктора сводка напоминает не чаще окна подавления
+    """
+
+    def __init__(self, repository, salebot_client, rate_limiter, config: NotificationsConfig):
+        self.repository = repository
+        self.salebot_client = salebot_client
+        self.rate_limiter = rate_limiter
+        self.config = config
+        self._queue: asyncio.Queue[Tuple[str, dict]] = asyncio.Queue(maxsize=config.queue_max_size)
+        self._dropped = 0
+        self._last_cleanup = None
+        self._last_digest = None
+        # (доктор, соцсеть, причина) -> канал, повторы в пределах одного переноса схлопываются
+        self._not_found: Dict[Tuple[int, str, str], str] = {}
+
+    def _enqueue(self, kind: str, payload: dict):
+        try:
+            self._queue.put_nowait((kind, payload))
+        except asyncio.QueueFull:
+            # salebot или база долго недоступны - не копим память бесконечно
+            self._dropped += 1
+
+    async def send_error_message(self, error_text: str, error_place: str):
+        """Уведомление об ошибке, отправится в фоне"""
+        self._enqueue("send_error_message", {"error_text": error_text, "error_place": error_place})
+
+    async def send_warning_not_found_doctor(
+            self,
+            doctor_id: int,
+            social_media: str,
+            channel_name: str,
+            reason: NotFoundReason = NotFoundReason.ZERO_SUBSCRIBERS,
+    ):
+        """Не удалось получить количество подписчиков доктора, попадет в сводку по соцсети"""
+        self._not_found[(doctor_id, social_media, NotFoundReason(reason).value)] = channel_name
+
+    async def flush(self):
+        """Переносит накопленные в памяти уведомления в outbox пачками"""
+        while not self._queue.empty():
+            batch: List[Tuple[str, dict]] = []
+            while not self._queue.empty() and len(batch) < self.config.batch_size:
+                batch.append(self._queue.get_nowait())
+            await self.repository.add_notifications(batch)
+
+        if self._not_found:
+            warnings, self._not_found = self._not_found, {}
+            await self.repository.add_not_found_warnings([
+                (doctor_id, social_media, reason, channel_name)
+                for (doctor_id, social_media, reason), channel_name in warnings.items()
+            ])
+
+        if self._dropped:
+            dropped, self._dropped = self._dropped, 0
+            await self.repository.add_notifications([(
+                "send_error_message",
+                {"error_text": f"Очередь уведомлений переполнена, потеряно {dropped}", "error_place": "notifications"},
+            )])
+
+    async def _deliver(self, notification: Notification):
+        send = getattr(self.salebot_client, notification.kind)
+        await send(**notification.payload)
+
+    async def send_pending(self) -> int:
+        """
+        Отправляет уведомления из outbox, пока они есть и позволяет лимит salebot.
+        Возвращает количество отправленных
+        """
+        await self.flush()
+        await self._add_digests()
+
+        sent_count = 0
+        while True:
+            notifications = await self.repository.claim_pending(self.config.batch_size, self.config.lease_seconds)
+            if not notifications:
+                break
+
+            sent_ids = []
+            for index, notification in enumerate(notifications):
+                try:
+                    await self.rate_limiter.acquire(RATE_LIMIT_NETWORK, RATE_LIMIT_CREDENTIAL)
+                except RateLimitExceededError:
+                    # лимит кончился - остальное отправит следующий запуск
+                    await self.repository.mark_sent(sent_ids)
+                    await self.repository.release([n.id for n in notifications[index:]])
+                    return sent_count + len(sent_ids)
+
+                try:
+                    await self._deliver(notification)
+                    sent_ids.append(notification.id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    await self.repository.mark_failed(
+                        notification.id, str(e),
+                        self.config.retry_base_seconds, self.config.retry_max_seconds, self.config.max_attempts,
+                    )
+
+            await self.repository.mark_sent(sent_ids)
+            sent_count += len(sent_ids)
+
+        await self._cleanup()
+        return sent_count
+
+    async def _add_digests(self):
+        if self._last_digest is not None \
+                and time.monotonic() - self._last_digest < self.config.not_found_digest_interval_seconds:
+            return
+        await self.repository.add_not_found_digests(self.config.not_found_suppression_seconds)
+        self._last_digest = time.monotonic()
+
+    async def _cleanup(self):
+        # отправленные и забытые предупреждения чистим не чаще раза в час
+        if self._last_cleanup is not None and time.monotonic() - self._last_cleanup < 3600:
+            return
+        await self.repository.delete_sent(self.config.keep_sent_seconds)
+        await self.repository.delete_stale_not_found_warnings(self.config.not_found_forget_seconds)
+        self._last_cleanup = time.monotonic()
@@ -0,0 +1,107 @@
+import asyncio
+
+from app.entities.notification import Notification, NotFoundReason
+from app.exception.update_error import RateLimitExceededError
+from app.services.notifications import NotificationOutbox
+from config.config import NotificationsConfig
+
+
+class FakeRepository:
+    def __init__(self):
+        self.rows = []
+        self.sent = []
+        self.released = []
+        self.failed = []
+        self.warnings = []
+
+    async def add_notifications(self, notifications):
+        for kind, payload in notifications:
+            self.rows.append(Notification(id=len(self.rows) + 1, kind=kind, payload=payload, attempts=0))
+
+    async def claim_pending(self, limit, lease_seconds):
+        claimed, self.rows = self.rows[:limit], self.rows[limit:]
+        return claimed
+
+    async def mark_sent(self, notification_ids):
+        self.sent.extend(notification_ids)
+
+    async def mark_failed(self, notification_id, error, *args):
+        self.failed.append(notification_id)
+
+    async def release(self, notification_ids):
+        self.released.extend(notification_ids)
+
+    async def delete_sent(self, older_than_seconds):
+        return 0
+
+    async def add_not_found_warnings(self, warnings):
+        self.warnings.extend(warnings)
+
+    async def add_not_found_digests(self, suppression_seconds):
+        return 0
+
+    async def delete_stale_not_found_warnings(self, older_than_seconds):
+        return 0
+
+
+class FakeSaleBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_error_message(self, error_text, error_place):
+        if error_place == "broken":
+            raise Exception("salebot недоступен")
+        self.messages.append(error_place)
+
+
+class FakeRateLimiter:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    async def acquire(self, network, credential):
+        if self.tokens == 0:
+            raise RateLimitExceededError(f"{network}:{credential}", 1)
+        self.tokens -= 1
+
+
+def test_send_pending_releases_notifications_over_rate_limit():
+    repository = FakeRepository()
+    salebot = FakeSaleBot()
+    outbox = NotificationOutbox(repository, salebot, FakeRateLimiter(tokens=2), NotificationsConfig())
+
+    async def run():
+        for place in ("first", "broken", "third"):
+            await outbox.send_error_message("ошибка", place)
+        return await outbox.send_pending()
+
+    sent_count = asyncio.run(run())
+
+    # первое ушло, второе упало и будет повторено, на третье не хватило лимита - вернулось в очередь
+    assert sent_count == 1
+    assert salebot.messages == ["first"]
+    assert repository.sent == [1]
+    assert repository.failed == [2]
+    assert repository.released == [3]
+
+
+def test_not_found_warnings_are_collapsed_instead_of_sent():
+    repository = FakeRepository()
+    salebot = FakeSaleBot()
+    outbox = NotificationOutbox(repository, salebot, FakeRateLimiter(tokens=10), NotificationsConfig())
+
+    async def run():
+        for _ in range(3):
+            await outbox.send_warning_not_found_doctor(doctor_id=1, social_media="vk", channel_name="club1")
+        await outbox.send_warning_not_found_doctor(
+            doctor_id=1, social_media="vk", channel_name="https://vk.com/club1", reason=NotFoundReason.INVALID_LINK
+        )
+        return await outbox.send_pending()
+
+    sent_count = asyncio.run(run())
+
+    # отдельных уведомлений нет, повторы схлопнулись по (доктор, соцсеть, причина)
+    assert sent_count == 0
+    assert sorted(repository.warnings) == [
+        (1, "vk", "invalid_link", "https://vk.com/club1"),
+        (1, "vk", "zero_subscribers", "club1"),
+    ]
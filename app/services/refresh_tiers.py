@@ -0,0 +1,23 @@
+from config.config import RefreshTiersConfig
+
+ACTIVE_LARGE = "active_large"
+ACTIVE_SMALL = "active_small"
+INACTIVE = "inactive"
+
+
+def refresh_tier(is_active: bool, subscribers: int, tiers: RefreshTiersConfig) -> str:
+    """Уровень обновления канала: сайт показывает только активных докторов, крупные каналы меняются быстрее"""
+    if not is_active:
+        return INACTIVE
+    if (subscribers or 0) >= tiers.large_min_subscribers:
+        return ACTIVE_LARGE
+    return ACTIVE_SMALL
+
+
+def refresh_interval_seconds(is_active: bool, subscribers: int, tiers: RefreshTiersConfig) -> int:
+    """Через сколько секунд канал снова должен попасть в обновление"""
+    return {
+        ACTIVE_LARGE: tiers.active_large_seconds,
+        ACTIVE_SMALL: tiers.active_small_seconds,
+        INACTIVE: tiers.inactive_seconds,
+    }[refresh_tier(is_active, subscribers, tiers)]
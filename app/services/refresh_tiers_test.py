@@ -0,0 +1,21 @@
+import pytest
+
+from app.services.refresh_tiers import refresh_interval_seconds
+from config.config import RefreshTiersConfig
+
+TIERS = RefreshTiersConfig(
+    large_min_subscribers=10_000, active_large_seconds=1, active_small_seconds=2, inactive_seconds=3
+)
+
+
+@pytest.mark.parametrize("is_active, subscribers, expected", [
+    (True, 10_000, 1),
+    (True, 500_000, 1),
+    (True, 9_999, 2),
+    (True, 0, 2),
+    # неактивный доктор обновляется реже независимо от размера канала
+    (False, 500_000, 3),
+    (False, 0, 3),
+])
+def test_refresh_interval_by_tier(is_active, subscribers, expected):
+    assert refresh_interval_seconds(is_active, subscribers, TIERS) == expected
@@ -0,0 +1,56 @@
+import datetime
+from typing import List
+
+from app.entities.subscribers_history import NetworkHistory, growth_deltas, GROWTH_PERIODS_DAYS
+from config.config import HistoryConfig
+
+
+class SubscribersHistoryService(object):
+    """
+    История подписчиков. Сырые точки пишет репозиторий обновления подписчиков вместе с самой цифрой,
+    здесь они сворачиваются в дневные и недельные значения, и графики с приростом строятся только по ним
+    """
+
+    def __init__(self, repository, config: HistoryConfig):
+        self.repository = repository
+        self.config = config
+
+    async def rollup(self):
+        """Фоновая свертка: партиции наперед, сырые точки в дни, дни в недели, чистка старого"""
+        today = datetime.date.today()
+        await self.repository.ensure_partitions(today, self.config.partitions_ahead_months)
+
+        await self.repository.rollup_daily()
+        await self.repository.rollup_weekly()
+
+        # сырые точки и старые дни удаляются только после свертки, в этом же запуске
+        await self.repository.drop_partitions_before(today - datetime.timedelta(days=self.config.raw_retention_days))
+        await self.repository.delete_daily_before(today - datetime.timedelta(days=self.config.daily_retention_days))
+
+    async def get_history(self, doctor_id: int, days: int) -> List[NetworkHistory]:
+        """
+        История доктора за days дней по соцсетям: дневные точки, а старше срока хранения дней - недельные.
+        Прирост считается по дневным точкам
+        """
+        today = datetime.date.today()
+        days = max(1, min(days, self.config.max_series_days))
+        since = today - datetime.timedelta(days=days)
+        daily_since = today - datetime.timedelta(days=self.config.daily_retention_days)
+
+        # для прироста нужны дневные точки за самый длинный период, даже если график короче
+        growth_since = today - datetime.timedelta(days=max(GROWTH_PERIODS_DAYS))
+        daily = await self.repository.get_daily(doctor_id, max(min(since, growth_since), daily_since))
+        weekly = {}
+        if since < daily_since:
+            weekly = await self.repository.get_weekly(doctor_id, since, daily_since)
+
+        history = []
+        for network in sorted(set(daily) | set(weekly)):
+            daily_points = daily.get(network, [])
+            points = weekly.get(network, []) + [point for point in daily_points if point.day >= since]
+            history.append(NetworkHistory(
+                network=network,
+                points=points,
+                growth=growth_deltas(daily_points, today),
+            ))
+        return history
@@ -1,17 +1,41 @@
 import asyncio
+import datetime
 import os
-from datetime import datetime, timedelta
 import logging
+from typing import Awaitable, Callable, List, Optional
 
 from dotenv import load_dotenv
-from app.exception.update_error import FloodWaitError, UsernameNotOccupiedError
+from app.exception.update_error import FloodWaitError, UsernameNotOccupiedError, RateLimitExceededError, \
+    InvalidTokenError
 
 from app.entities.doctor_subs import DoctorSubs
 from app.entities.instagram_settings import InstagramSettings
+from app.entities.messengers import SocialNetworkType
+from app.entities.notification import NotFoundReason
+from app.services.change_policy import is_significant_change
+from app.services.refresh_tiers import refresh_interval_seconds
+from clients.instagram import GRAPH_RATE_LIMITED
+from config.config import RefreshQueueConfig
 
 logger = logging.getLogger(__name__)
 load_dotenv()
 
+# поле DoctorSubs с каналом и название соцсети для уведомлений при превалидации
+PREVALIDATION_FIELDS = {
+    SocialNetworkType.INSTAGRAM: ("instagram_channel_name", "INSTAGRAM"),
+    SocialNetworkType.TELEGRAM: ("telegram_channel_name", "Telegram"),
+    SocialNetworkType.YOUTUBE: ("youtube_channel_name", "YOUTUBE"),
+    SocialNetworkType.VK: ("vk_channel_name", "vk"),
+}
+
+# поля DoctorSubs с записанным количеством подписчиков и временем записи
+COUNT_FIELDS = {
+    SocialNetworkType.INSTAGRAM: ("inst_subs_count", "inst_last_updated_timestamp"),
+    SocialNetworkType.TELEGRAM: ("tg_subs_count", "tg_last_updated_timestamp"),
+    SocialNetworkType.YOUTUBE: ("youtube_subs_count", "youtube_last_updated_timestamp"),
+    SocialNetworkType.VK: ("vk_subs_count", "vk_last_updated_timestamp"),
+}
+
 
 class UpdateSubscribersService(object):
     def __init__(
@@ -22,59 +46,159 @@ class UpdateSubscribersService(object):
             telegram_client,
             youtube_client,
             vk_client,
-            notification_client
+            notification_client,
+            queue_config: RefreshQueueConfig,
     ):
         self.repo = repository
+        self.queue_config = queue_config
         self.instagram_repo = instagram_repo
         self.notification_client = notification_client
         self.instagram_client = instagram_client
         self.telegram_client = telegram_client
         self.youtube_client = youtube_client
         self.vk_client = vk_client
+        # самый долгий flood wait телеграма за текущую пачку, секунды
+        self._tg_flood_wait_seconds = 0
 
-    def _refresh_instagram_request_limits(self, settings: InstagramSettings):
+    async def _complete(
+            self, channel: DoctorSubs, network: SocialNetworkType, outcome: str, subs_count: Optional[int] = None
+    ):
+        """
+        Канал обработан, следующая проверка - через интервал его уровня: по активности доктора
+        и размеру канала (только что полученному или записанному раньше)
         """
-        Автоматически сбрасывает счетчик запросов, если прошел час с последнего запроса.
+        if subs_count is None:
+            subs_count = getattr(channel, COUNT_FIELDS[network][0])
+        self.repo.buffer_complete_refresh(
+            channel.doctor_id, network, outcome,
+            refresh_interval_seconds(channel.is_active, subs_count, self.queue_config.tiers),
+        )
+
+    async def _fail(self, channel: DoctorSubs, network: SocialNetworkType, outcome: str):
+        """Попытка не удалась, канал вернется в работу с нарастающей задержкой"""
+        await self.repo.fail_refresh(
+            channel.doctor_id, network, outcome,
+            self.queue_config.retry_base_seconds, self.queue_config.refresh_interval_seconds
+        )
+
+    async def _release(self, channel: DoctorSubs, network: SocialNetworkType):
+        """Запрос не был сделан из-за лимитов, канал возвращается в очередь без штрафа"""
+        await self.repo.release_refresh(channel.doctor_id, network)
+
+    async def _store_count(self, channel: DoctorSubs, network: SocialNetworkType, subs_count: int) -> str:
+        """
+        Записывает полученное количество подписчиков, если оно заметно изменилось или давно не записывалось,
+        и закрывает строку в очереди. Незначительное изменение не пишется, но проверка канала отмечается в очереди
+        """
+        count_field, updated_field = COUNT_FIELDS[network]
+        if not is_significant_change(
+                getattr(channel, count_field),
+                subs_count,
+                getattr(channel, updated_field),
+                datetime.datetime.now(),
+                self.queue_config.change_policy(network),
+        ):
+            await self._complete(channel, network, "unchanged", subs_count)
+            return "unchanged"
+
+        # счетчик и закрытие строки уходят в буфер и пишутся пачкой в конце
+        self.repo.buffer_subscribers(network, channel.doctor_id, subs_count)
+        await self._complete(channel, network, "updated", subs_count)
+        return "updated"
+
+    async def _prevalidate_channels(
+            self, channels: list[DoctorSubs], network: SocialNetworkType, channel_field: str, social_media: str
+    ) -> list[DoctorSubs]:
+        """Отсеивает каналы, по которым нет смысла делать запрос, и сразу закрывает их в очереди"""
+        prevalidated_channels = []
+        for channel in channels:
+            channel_name = getattr(channel, channel_field)
+            if not channel_name:
+                await self._complete(channel, network, "no_channel")
+                continue
 
-        Args:
-            settings (InstagramSettings): Текущие настройки лимитов API
+            if "http" in channel_name:
+                await self.notification_client.send_warning_not_found_doctor(
+                    doctor_id=channel.doctor_id,
+                    social_media=social_media,
+                    channel_name=channel_name,
+                    reason=NotFoundReason.INVALID_LINK,
+                )
+                await self._complete(channel, network, "invalid")
+                continue
 
-        На момент 03.07.2025 Instagram Graph API имеет лимит:
-        - 200 запросов в час на 1 access token
-        - Окно сброса: ровно через 1 час после первого запроса
-        """
+            prevalidated_channels.append(channel)
 
-        reset_time = settings.last_updated_time + timedelta(hours=1)
-        current_time = datetime.now()
-        if current_time >= reset_time:
-            self.instagram_repo.clear_filled_capacity()
+        return prevalidated_channels
 
-    def _get_instagram_token_info(self) -> InstagramSettings:
-        """Получение информации о токене инстаграм"""
-        settings: InstagramSettings = self.instagram_repo.get_instagram_settings()
+    async def _apply_count(self, channel: DoctorSubs, network: SocialNetworkType, subs_count: int) -> str:
+        """
+        Разбирает полученное из соцсети количество подписчиков канала и закрывает его строку в очереди:
+        -1 - ошибка запроса, 0 - доктор не найден в соцсети, иначе подписчики записываются
+        """
+        channel_field, social_media = PREVALIDATION_FIELDS[network]
+        channel_name = getattr(channel, channel_field)
+        source = f"_batched_update_{network.value}_subscribers"
+        try:
+            if subs_count == -1:
+                await self.notification_client.send_error_message(
+                    f"Ошибка получения подписчиков из {social_media} doctorID: {channel.doctor_id}, "
+                    f"username: {str(channel_name)}",
+                    source
+                )
+                await self._fail(channel, network, "error")
+                return "error"
+
+            # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
+            if subs_count == 0 or not subs_count:
+                await self.notification_client.send_warning_not_found_doctor(
+                    doctor_id=channel.doctor_id,
+                    social_media=social_media,
+                    channel_name=channel_name,
+                    reason=NotFoundReason.ZERO_SUBSCRIBERS,
+                )
+                await self._complete(channel, network, "not_found")
+                return "not_found"
 
-        # Обновляем счетчик запрос. Делать это до запроса в целом не критично,
-        # тк мы спокойно можем позволить себе пропустить 1 итерацию обновления
-        self._refresh_instagram_request_limits(settings)
+            # обновляем подписчиков доктора после проверки на 0 и закрываем строку в очереди
+            return await self._store_count(channel, network, subs_count)
 
-        # Если достигли лимит часа, то идем спать 196 <= 200 <= 201
-        if settings.filled_capacity <= settings.req_capacity <= settings.filled_capacity + 5:
-            self.notification_client.send_error_message(
-                "Достигнут лимит запросов к инсте", "_get_instagram_token_info"
+        except Exception as ex:
+            await self._fail(channel, network, "error")
+            await self.notification_client.send_error_message(
+                str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel_name)}", source
             )
-            settings.long_access_token = ""
-            return settings
+            return "error"
+
+    async def _fail_chunk(self, channels: List[DoctorSubs], network: SocialNetworkType, ex: Exception) -> List[str]:
+        """Запрос пачки каналов упал целиком - каждый канал уходит на повтор, уведомление одно"""
+        for channel in channels:
+            await self._fail(channel, network, "error")
+        await self.notification_client.send_error_message(
+            str(ex) + f"doctorIDs: {[channel.doctor_id for channel in channels]}",
+            f"_batched_update_{network.value}_subscribers"
+        )
+        return ["error"] * len(channels)
+
+    async def _release_chunk(self, channels: List[DoctorSubs], network: SocialNetworkType) -> List[str]:
+        """Пачка уперлась в лимиты соцсети и возвращается в очередь без штрафа"""
+        for channel in channels:
+            await self._release(channel, network)
+        return ["rate_limited"] * len(channels)
+
+    async def _get_instagram_token_info(self) -> InstagramSettings:
+        """Получение информации о токене инстаграм"""
+        settings: InstagramSettings = await self.instagram_repo.get_instagram_settings()
 
         # если у нас есть активный токен, возвращаем его
         if settings.is_active:
             return settings
 
         # получаем новый токен
-        long_lived_token = self.instagram_client.authenticate(settings.short_access_token)
+        long_lived_token = await self.instagram_client.authenticate(settings.short_access_token)
         if long_lived_token == "":
-            self.instagram_repo.turn_of_token()
-            self.instagram_repo.increment_filled_capacity()
-            self.notification_client.send_error_message(
+            await self.instagram_repo.turn_of_token()
+            await self.notification_client.send_error_message(
                 "Не удалось получить токен INSTAGRAM или он не валиден. Надо срочно что-то сделать",
                 "_get_instagram_token_info"
             )
@@ -82,316 +206,310 @@ class UpdateSubscribersService(object):
             return settings
 
         # сохраняем новый токен
-        self.instagram_repo.update_token_info(long_lived_token)
+        await self.instagram_repo.update_token_info(long_lived_token)
         settings.long_access_token = long_lived_token
         return settings
 
-    def _get_instagram_channels(self) -> list[DoctorSubs]:
-        # получаем последнего обновленного доктора
-        result = self.repo.get_last_updated_instagram_doctor()
-        if len(result) == 0:
-            return []
-        # пока у нас обновляется только 1 строчка
-        last_updated_doctor = result[0]
+    async def _run_batch(
+            self,
+            network: SocialNetworkType,
+            update_channels: Callable[[List[DoctorSubs]], Awaitable[List[str]]],
+            limit: Optional[int] = None,
+    ) -> bool:
+        """
+        Берет из очереди пачку каналов соцсети (не больше limit, если он задан) и обновляет ее частями
+        по chunk_size каналов на запрос к API, не больше concurrency запросов разом.
+        После первого упора в лимиты соцсети новые запросы не начинаются, непройденные каналы возвращаются в очередь.
+        Возвращает False, когда очередь соцсети пуста или кончились лимиты запросов к соцсети
+        """
+        workers = self.queue_config.workers(network)
+        batch_size = workers.batch_size if limit is None else min(workers.batch_size, limit)
+        if batch_size < 1:
+            return False
 
-        # Получаем каналы с офсетом
-        instagram_channels = self.repo.get_instagram_channels_with_offset(last_updated_doctor.id_in_subscribers)
-        # если мы всех обошли, то начинаем с id = 1, то есть offset = 0
-        if len(instagram_channels) == 0:
-            instagram_channels = self.repo.get_instagram_channels_with_offset(offset=0)
+        channels = await self.repo.claim_refresh_batch(network, batch_size, self.queue_config.lease_seconds)
+        if not channels:
+            return False
 
+        channel_field, social_media = PREVALIDATION_FIELDS[network]
         # делаем превалидацию данных, чтобы не делать лишний запросов
-        prevalidated_channels = []
-        for channel in instagram_channels:
-            if "http" in channel.instagram_channel_name:
-                self.notification_client.send_warning_not_found_doctor(
-                    doctor_id=channel.doctor_id,
-                    social_media="INSTAGRAM",
-                    channel_name=channel.instagram_channel_name
-                )
-                continue
+        channels = await self._prevalidate_channels(channels, network, channel_field, social_media)
+        chunks = [channels[i:i + workers.chunk_size] for i in range(0, len(channels), workers.chunk_size)]
 
-            prevalidated_channels.append(channel)
+        semaphore = asyncio.Semaphore(workers.concurrency)
+        limited = asyncio.Event()
+        flush_errors = []
 
-        return prevalidated_channels
+        async def flush(write: Callable[[], Awaitable[None]]):
+            # записи неудавшегося сброса остаются в буфере, о сбое сообщаем один раз за пачку
+            try:
+                await write()
+            except Exception as ex:
+                print(f"Ошибка записи буфера подписчиков {network.value}: {ex}")
+                flush_errors.append(ex)
+
+        async def run(chunk: List[DoctorSubs]):
+            async with semaphore:
+                # соцсеть уже попросила подождать - не дергаем ее, каналы дождутся следующего захода
+                if limited.is_set():
+                    for channel in chunk:
+                        await self._release(channel, network)
+                    return
+                outcomes = await update_channels(chunk)
+                if "flood_wait" in outcomes or "rate_limited" in outcomes:
+                    limited.set()
+            # буфер сбрасывается только здесь, между частями, чтобы его ошибка не считалась ошибкой канала
+            await flush(self.repo.flush_if_needed)
+
+        await asyncio.gather(*(run(chunk) for chunk in chunks))
+        # счетчики и закрытие строк пачки - одной транзакцией
+        await flush(self.repo.flush)
+        if flush_errors:
+            await self.notification_client.send_error_message(
+                f"Не удалось записать подписчиков и закрыть строки очереди, попыток: {len(flush_errors)}. "
+                f"Последняя ошибка: {flush_errors[-1]}",
+                f"_batched_update_{network.value}_subscribers"
+            )
+        # упираемся в лимиты соцсети - остальное доделает следующий заход
+        return not limited.is_set()
+
+    async def _update_inst_channels(self, channels: List[DoctorSubs], settings: InstagramSettings) -> List[str]:
+        """Подписчики пачки каналов одним batch запросом к Graph API, ответы раскладываются по докторам"""
+        try:
+            # получаем подписчиков у докторов
+            subs_counts = await self.instagram_client.get_profiles_subscribers(
+                [channel.instagram_channel_name for channel in channels], settings.long_access_token
+            )
+        except RateLimitExceededError:
+            return await self._release_chunk(channels, SocialNetworkType.INSTAGRAM)
+        except InvalidTokenError:
+            # Graph API явно ответил, что токен протух - выключаем его до ручной починки
+            await self.notification_client.send_error_message(
+                "ПРОТУХ ТОКЕН ДЛЯ ИНСТАГРАМ, надо срочно его починить",
+                "_batched_update_inst_subscribers"
+            )
+            await self.instagram_repo.turn_of_token()
+            for channel in channels:
+                await self._fail(channel, SocialNetworkType.INSTAGRAM, "error")
+            return ["error"] * len(channels)
+        except Exception as ex:
+            return await self._fail_chunk(channels, SocialNetworkType.INSTAGRAM, ex)
+
+        outcomes = []
+        for channel, subs_count in zip(channels, subs_counts):
+            if subs_count == GRAPH_RATE_LIMITED:
+                # профиль не проверен, а не потерян - вернется в очередь без штрафа
+                await self._release(channel, SocialNetworkType.INSTAGRAM)
+                outcomes.append("rate_limited")
+                continue
+            outcomes.append(await self._apply_count(channel, SocialNetworkType.INSTAGRAM, subs_count))
+        return outcomes
 
     async def _batched_update_inst_subscribers(self):
-        # получение информации о токене инстаграмма, если его нет, то надо делать датафикс и обновлять руками
-        settings = self._get_instagram_token_info()
-        if settings.long_access_token == "":
-            return
-
-        instagram_channels = self._get_instagram_channels()
-
-        for channel in instagram_channels:
-            try:
-                # получаем подписчиков у доктора
-                subs_count = self.instagram_client.get_profile_subscribers(
-                    channel.instagram_channel_name, settings.long_access_token
+        while True:
+            # Проверяем остаток часового лимита перед каждой пачкой и берем не больше каналов, чем осталось запросов.
+            # Если исчерпали лимит запросов, то идем спать до следующего цикла
+            remaining_requests = int(await self.instagram_client.remaining_requests())
+            if remaining_requests < 1:
+                await self.notification_client.send_error_message(
+                    "Достигнут лимит запросов к инсте", "_batched_update_inst_subscribers"
                 )
-                # комитим id последнего доктора
-                self.repo.commit_update_instagram_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                if subs_count == -1:
-                    self.notification_client.send_error_message(
-                        "ПРОТУХ ТОКЕН ДЛЯ ИНСТАГРАМ, надо срочно его починить или там другая ошибка",
-                        "_batched_update_inst_subscribers"
-                    )
-                    self.instagram_repo.turn_of_token()
-
-                # Обновляем лимит запросов к инстаграм
-                self.instagram_repo.increment_filled_capacity(settings.filled_capacity)
-
-                # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
-                if subs_count == 0 or not subs_count:
-                    self.notification_client.send_warning_not_found_doctor(
-                        doctor_id=channel.doctor_id,
-                        social_media="INSTAGRAM",
-                        channel_name=channel.instagram_channel_name
-                    )
-                    continue
-
-                # обновляем подписчиков доктора после коммита в очереди и проверки на 0
-                self.repo.update_instagram_subscribers(doctor_id=channel.doctor_id, subscribers=subs_count)
+                return
 
-            except Exception as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_instagram_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                self.notification_client.send_error_message(
-                    str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel.instagram_channel_name)}",
-                    "_batched_update_inst_subscribers"
-                )
-                continue
+            # получение информации о токене инстаграмма, если его нет, то надо делать датафикс и обновлять руками.
+            settings = await self._get_instagram_token_info()
+            if settings.long_access_token == "":
+                return
+
+            if not await self._run_batch(
+                    SocialNetworkType.INSTAGRAM,
+                    lambda channels: self._update_inst_channels(channels, settings),
+                    limit=remaining_requests,
+            ):
+                return
 
     async def _subscribe_to_channel(self, channel: DoctorSubs) -> DoctorSubs:
         # если бот не подписан на ТГ канал, то подписываемся
         if not channel.tg_has_subscribed:
             has_subscribed = await self.telegram_client.subscribe_to_channel(channel.telegram_channel_name)
             if not has_subscribed:
-                self.notification_client.send_error_message(
+                await self.notification_client.send_error_message(
                     f"Ошибка при подписке на канал пользователя {channel.telegram_channel_name}",
                     "_batched_update_tg_subscribers"
                 )
             else:
-                self.repo.update_tg_has_subscribed(doctor_id=channel.doctor_id)
+                await self.repo.update_tg_has_subscribed(doctor_id=channel.doctor_id)
                 channel.tg_has_subscribed = True
 
         return channel
 
-    def _get_telegram_channels(self) -> list[DoctorSubs]:
-        # получаем последнего обновленного доктора
-        result = self.repo.get_last_updated_doctor()
-        if len(result) == 0:
-            return []
-        # пока у нас обновляется только 1 строчка
-        last_updated_doctor = result[0]
-
-        # Получаем каналы с офсетом
-        telegram_channels = self.repo.get_telegram_channels_with_offset(last_updated_doctor.id_in_subscribers)
-        # если мы всех обошли, то начинаем с id = 1, то есть offset = 0
-        if len(telegram_channels) == 0:
-            telegram_channels = self.repo.get_telegram_channels_with_offset(offset=0)
-        return telegram_channels
-
-    async def _batched_update_tg_subscribers(self):
-        telegram_channels = self._get_telegram_channels()
-
-        for channel in telegram_channels:
-            try:
-                # Подписываемся на канал при необходимости
-                channel: DoctorSubs = await self._subscribe_to_channel(channel)
-                # получаем подписчиков у доктора
-                subs_count = await self.telegram_client.get_chat_subscribers(
-                    chat_id=channel.telegram_channel_name, has_subscribed=channel.tg_has_subscribed
-                )
-                # комитим id последнего доктора
-                self.repo.commit_update_subscribers(subscribers_id=channel.internal_id, doctor_id=channel.doctor_id)
-                # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
-                if subs_count == 0 or not subs_count:
-                    self.notification_client.send_warning_not_found_doctor(
-                        doctor_id=channel.doctor_id,
-                        social_media="Telegram",
-                        channel_name=channel.telegram_channel_name,
-                    )
-                    continue
-
-                # обновляем подписчиков доктора
-                self.repo.update_telegram_subscribers(doctor_id=channel.doctor_id, subscribers=subs_count)
-
-            except FloodWaitError as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_subscribers(subscribers_id=channel.internal_id, doctor_id=channel.doctor_id)
-                self.notification_client.send_error_message(
-                    str(ex), "_batched_update_tg_subscribers"
-                )
-                await asyncio.sleep(ex.duration_in_seconds)
-
-            except UsernameNotOccupiedError as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_subscribers(subscribers_id=channel.internal_id, doctor_id=channel.doctor_id)
-                self.notification_client.send_warning_not_found_doctor(
+    async def _update_tg_channel(self, channel: DoctorSubs) -> str:
+        try:
+            # Подписываемся на канал при необходимости
+            channel: DoctorSubs = await self._subscribe_to_channel(channel)
+            # получаем подписчиков у доктора
+            subs_count = await self.telegram_client.get_chat_subscribers(
+                chat_id=channel.telegram_channel_name, has_subscribed=channel.tg_has_subscribed
+            )
+            # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
+            if subs_count == 0 or not subs_count:
+                await self.notification_client.send_warning_not_found_doctor(
                     doctor_id=channel.doctor_id,
                     social_media="Telegram",
                     channel_name=channel.telegram_channel_name,
+                    reason=NotFoundReason.ZERO_SUBSCRIBERS,
                 )
-                continue
-            except Exception as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_subscribers(subscribers_id=channel.internal_id, doctor_id=channel.doctor_id)
-                self.notification_client.send_error_message(
-                    str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel.telegram_channel_name)}",
-                    "_batched_update_tg_subscribers"
-                )
-                continue
-
-    async def _get_youtube_channels(self) -> list[DoctorSubs]:
-        # получаем последнего обновленного доктора
-        result = self.repo.get_last_updated_youtube_doctor()
-        if len(result) == 0:
-            return []
-        # пока у нас обновляется только 1 строчка
-        last_updated_doctor = result[0]
-
-        # Получаем каналы с офсетом
-        instagram_channels = self.repo.get_youtube_channels_with_offset(last_updated_doctor.id_in_subscribers)
-        # если мы всех обошли, то начинаем с id = 1, то есть offset = 0
-        if len(instagram_channels) == 0:
-            instagram_channels = self.repo.get_youtube_channels_with_offset(offset=0)
+                await self._complete(channel, SocialNetworkType.TELEGRAM, "not_found")
+                return "not_found"
+
+            # обновляем подписчиков доктора
+            return await self._store_count(channel, SocialNetworkType.TELEGRAM, subs_count)
+
+        except FloodWaitError as ex:
+            # клиент уже увел ведро лимитов в минус на время ожидания, канал вернется в очередь
+            await self._release(channel, SocialNetworkType.TELEGRAM)
+            self._tg_flood_wait_seconds = max(self._tg_flood_wait_seconds, ex.duration_in_seconds)
+            return "flood_wait"
+
+        except RateLimitExceededError:
+            await self._release(channel, SocialNetworkType.TELEGRAM)
+            return "rate_limited"
+
+        except UsernameNotOccupiedError as ex:
+            await self._complete(channel, SocialNetworkType.TELEGRAM, "not_found")
+            await self.notification_client.send_warning_not_found_doctor(
+                doctor_id=channel.doctor_id,
+                social_media="Telegram",
+                channel_name=channel.telegram_channel_name,
+                reason=NotFoundReason.USERNAME_NOT_OCCUPIED,
+            )
+            return "not_found"
+        except Exception as ex:
+            await self._fail(channel, SocialNetworkType.TELEGRAM, "error")
+            await self.notification_client.send_error_message(
+                str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel.telegram_channel_name)}",
+                "_batched_update_tg_subscribers"
+            )
+            return "error"
 
-        # делаем превалидацию данных, чтобы не делать лишний запросов
-        prevalidated_channels = []
-        for channel in instagram_channels:
-            if "http" in channel.youtube_channel_name:
-                self.notification_client.send_warning_not_found_doctor(
-                    doctor_id=channel.doctor_id,
-                    social_media="YOUTUBE",
-                    channel_name=channel.youtube_channel_name
-                )
+    async def _update_tg_channels(self, channels: List[DoctorSubs]) -> List[str]:
+        """
+        Подписчики пачки каналов одним запросом channels.getChannels без подписки на каналы.
+        Каналы, по которым количества в ответе нет, запрашиваются по одному полным запросом
+        """
+        try:
+            subs_counts = await self.telegram_client.get_chats_subscribers(
+                [channel.telegram_channel_name for channel in channels]
+            )
+        except FloodWaitError as ex:
+            self._tg_flood_wait_seconds = max(self._tg_flood_wait_seconds, ex.duration_in_seconds)
+            await self._release_chunk(channels, SocialNetworkType.TELEGRAM)
+            return ["flood_wait"] * len(channels)
+        except RateLimitExceededError:
+            return await self._release_chunk(channels, SocialNetworkType.TELEGRAM)
+        except Exception as ex:
+            return await self._fail_chunk(channels, SocialNetworkType.TELEGRAM, ex)
+
+        outcomes = []
+        fallback_channels = []
+        for channel in channels:
+            subs_count = subs_counts.get(channel.telegram_channel_name)
+            if subs_count is None:
+                fallback_channels.append(channel)
                 continue
+            outcomes.append(await self._apply_count(channel, SocialNetworkType.TELEGRAM, subs_count))
+
+        for index, channel in enumerate(fallback_channels):
+            outcome = await self._update_tg_channel(channel)
+            outcomes.append(outcome)
+            # уперлись в лимиты - оставшиеся каналы дождутся следующего захода
+            if outcome in ("flood_wait", "rate_limited"):
+                for rest_channel in fallback_channels[index + 1:]:
+                    await self._release(rest_channel, SocialNetworkType.TELEGRAM)
+                break
+        return outcomes
 
-            prevalidated_channels.append(channel)
-
-        return prevalidated_channels
-
-    async def _batched_update_youtube_subscribers(self):
-        await asyncio.sleep(60 * 5)
-        youtube_channels = await self._get_youtube_channels()
-
-        for channel in youtube_channels:
-            try:
-                # получаем подписчиков у доктора
-                subs_count = self.youtube_client.get_subscribers_count(channel.youtube_channel_name)
-                # комитим id последнего доктора
-                self.repo.commit_update_youtube_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                if subs_count == -1:
-                    self.notification_client.send_error_message(
-                        "Ошибка получения подписчиков из ЮТУБА",
-                        "_batched_update_youtube_subscribers"
-                    )
-
-                # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
-                if subs_count == 0 or not subs_count:
-                    self.notification_client.send_warning_not_found_doctor(
-                        doctor_id=channel.doctor_id,
-                        social_media="YOUTUBE",
-                        channel_name=channel.youtube_channel_name
-                    )
-                    continue
-
-                # обновляем подписчиков доктора после коммита в очереди и проверки на 0
-                self.repo.update_youtube_subscribers(doctor_id=channel.doctor_id, subscribers=subs_count)
-
-            except Exception as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_youtube_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                self.notification_client.send_error_message(
-                    str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel.youtube_channel_name)}",
-                    "_batched_update_youtube_subscribers"
-                )
+    async def _batched_update_tg_subscribers(self):
+        while True:
+            if await self._run_batch(SocialNetworkType.TELEGRAM, self._update_tg_channels):
                 continue
 
-    async def _get_vk_channels(self) -> list[DoctorSubs]:
-        # получаем последнего обновленного доктора
-        result = self.repo.get_last_updated_vk_doctor()
-        if len(result) == 0:
-            return []
-        # пока у нас обновляется только 1 строчка
-        last_updated_doctor = result[0]
-
-        # Получаем каналы с офсетом
-        vk_channels = self.repo.get_vk_channels_with_offset(last_updated_doctor.id_in_subscribers)
-        # если мы всех обошли, то начинаем с id = 1, то есть offset = 0
-        if len(vk_channels) == 0:
-            vk_channels = self.repo.get_vk_channels_with_offset(offset=0)
+            flood_wait_seconds, self._tg_flood_wait_seconds = self._tg_flood_wait_seconds, 0
+            # очередь пуста или лимиты кончились без flood wait
+            if not flood_wait_seconds:
+                return
 
-        # делаем превалидацию данных, чтобы не делать лишний запросов
-        prevalidated_channels = []
-        for channel in vk_channels:
-            if "http" in channel.vk_channel_name:
-                self.notification_client.send_warning_not_found_doctor(
-                    doctor_id=channel.doctor_id,
-                    social_media="vk",
-                    channel_name=channel.vk_channel_name
-                )
+            # одно уведомление и одно ожидание на всю пачку, сколько бы воркеров ни получили flood wait
+            await self.notification_client.send_error_message(
+                str(FloodWaitError(duration_in_seconds=flood_wait_seconds)), "_batched_update_tg_subscribers"
+            )
+            # долгое ожидание не держим в цикле обновления, каналы возьмет следующий цикл
+            if flood_wait_seconds > self.queue_config.flood_wait_max_sleep_seconds:
+                return
+            await asyncio.sleep(flood_wait_seconds)
+
+    async def _resolve_youtube_channel_ids(self, channels: List[DoctorSubs]):
+        """Handle без сохраненного id канала резолвится один раз, id сохраняется рядом с названием канала"""
+        for channel in channels:
+            if channel.youtube_channel_id:
                 continue
+            channel_id = await self.youtube_client.resolve_channel_id(channel.youtube_channel_name)
+            if channel_id:
+                await self.repo.update_youtube_channel_id(doctor_id=channel.doctor_id, channel_id=channel_id)
+                channel.youtube_channel_id = channel_id
+
+    async def _update_youtube_channels(self, channels: List[DoctorSubs]) -> List[str]:
+        """Подписчики пачки каналов одним запросом channels.list по id каналов"""
+        try:
+            await self._resolve_youtube_channel_ids(channels)
+            # получаем подписчиков у докторов
+            subs_counts = await self.youtube_client.get_subscribers_counts(
+                [channel.youtube_channel_id for channel in channels if channel.youtube_channel_id]
+            )
+        except RateLimitExceededError:
+            return await self._release_chunk(channels, SocialNetworkType.YOUTUBE)
+        except Exception as ex:
+            return await self._fail_chunk(channels, SocialNetworkType.YOUTUBE, ex)
+
+        outcomes = []
+        for channel in channels:
+            # канала нет в ответе - handle не нашелся, канал удален или подписчики скрыты
+            subs_count = subs_counts.get(channel.youtube_channel_id, 0)
+            outcomes.append(await self._apply_count(channel, SocialNetworkType.YOUTUBE, subs_count))
+        return outcomes
 
-            prevalidated_channels.append(channel)
+    async def _batched_update_youtube_subscribers(self):
+        await asyncio.sleep(60 * 5)
+        while await self._run_batch(SocialNetworkType.YOUTUBE, self._update_youtube_channels):
+            pass
+
+    async def _update_vk_channels(self, channels: List[DoctorSubs]) -> List[str]:
+        """Подписчики пачки пабликов одним запросом groups.getById"""
+        try:
+            # получаем подписчиков у докторов
+            subs_counts = await self.vk_client.get_subscribers_counts(
+                [channel.vk_channel_name for channel in channels]
+            )
+        except RateLimitExceededError:
+            return await self._release_chunk(channels, SocialNetworkType.VK)
+        except Exception as ex:
+            return await self._fail_chunk(channels, SocialNetworkType.VK, ex)
+
+        # весь запрос упал - одно уведомление на пачку вместо уведомления на каждого доктора
+        if all(subs_count == -1 for subs_count in subs_counts):
+            return await self._fail_chunk(
+                channels, SocialNetworkType.VK, Exception("Ошибка получения подписчиков из ВК")
+            )
 
-        return prevalidated_channels
+        outcomes = []
+        for channel, subs_count in zip(channels, subs_counts):
+            outcomes.append(await self._apply_count(channel, SocialNetworkType.VK, subs_count))
+        return outcomes
 
     async def _batched_update_vk_subscribers(self):
         await asyncio.sleep(60 * 5)
-        vk_channels = await self._get_vk_channels()
-
-        for channel in vk_channels:
-            try:
-                # получаем подписчиков у доктора
-                subs_count = self.vk_client.get_subscribers_count(channel.vk_channel_name)
-                # комитим id последнего доктора
-                self.repo.commit_update_vk_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                if subs_count == -1:
-                    self.notification_client.send_error_message(
-                        "Ошибка получения подписчиков из ВК",
-                        "_batched_update_vk_subscribers"
-                    )
-
-                # если подписчиков 0, то считаем, что не смогли найти доктора в соцсети, при этом не коммитим данные
-                if subs_count == 0 or not subs_count:
-                    self.notification_client.send_warning_not_found_doctor(
-                        doctor_id=channel.doctor_id,
-                        social_media="ВК",
-                        channel_name=channel.vk_channel_name
-                    )
-                    continue
-
-                # обновляем подписчиков доктора после коммита в очереди и проверки на 0
-                self.repo.update_vk_subscribers(doctor_id=channel.doctor_id, subscribers=subs_count)
-
-            except Exception as ex:
-                # комитим id последнего доктора
-                self.repo.commit_update_vk_subscribers(
-                    subscribers_id=channel.internal_id,
-                    doctor_id=channel.doctor_id
-                )
-                self.notification_client.send_error_message(
-                    str(ex) + f"doctorID: {channel.doctor_id}, username: {str(channel.vk_channel_name)}",
-                    "_batched_update_vk_subscribers"
-                )
-                continue
+        while await self._run_batch(SocialNetworkType.VK, self._update_vk_channels):
+            pass
 
     async def update_subscribers(self):
         """ Обновляет количество подписчиков """
@@ -1,26 +1,63 @@
 import datetime
 from typing import List, Optional
 
+from app.entities.cursor import FilterCursor
 from app.entities.sorted import SortedType
 from clients.postgres import Database
-from app.entities.doctor_subs import DoctorSubs, DoctorSubsByIDs
+from app.entities.doctor_subs import DoctorSubs, DoctorSubsSnapshot
 from app.entities.messengers import Messenger, SocialNetworkType
+from app.entities.telegram_blacklist import TelegramBlacklistEntry
 from app.exception.domain_error import DoctorNotFound
-
-SOCIAL_NETWORK_FIELDS = {
-    SocialNetworkType.INSTAGRAM: "inst_subs_count",
-    SocialNetworkType.TELEGRAM: "tg_subs_count",
-    SocialNetworkType.YOUTUBE: "youtube_subs_count",
-    SocialNetworkType.VK: "vk_subs_count",
-}
+from app.storage.filter_queries import filter_fields, filter_page_query
+
+
+def substring_pattern(text: str) -> str:
+    """Шаблон ilike '%text%', спецсимволы like из ввода ищутся буквально"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+# Приводит строки subscribers_refresh_queue доктора к его каналам: новые и измененные каналы
+# встают в очередь сразу, по удаленным каналам строки убираются
+SYNC_REFRESH_QUEUE_QUERY = """
+    with channels as (
+        select d.doctor_id, channel.network, channel.name
+        from doctors d
+        cross join lateral (
+            values ('inst', case when d.manual_inst_upgrade then null else d.instagram_channel_name end),
+                   ('tg', d.telegram_channel_name),
+                   ('youtube', d.youtube_channel_name),
+                   ('vk', d.vk_channel_name)
+        ) as channel(network, name)
+        where d.doctor_id = %(doctor_id)s
+    ),
+    removed as (
+        delete from subscribers_refresh_queue q
+        using channels c
+        where q.doctor_id = c.doctor_id
+          and q.network = c.network
+          and coalesce(c.name, '') = ''
+    )
+    insert into subscribers_refresh_queue (doctor_id, network, next_due_at, channel_name)
+    select doctor_id, network, now(), name
+    from channels
+    where coalesce(name, '') != ''
+    on conflict (doctor_id, network) do update
+        set next_due_at  = now(),
+            attempts     = 0,
+            channel_name = excluded.channel_name
+        -- тот же канал остается на своем месте в очереди
+        where subscribers_refresh_queue.channel_name is distinct from excluded.channel_name
+"""
 
 
 class ApiRepository:
 
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Database):
+        self.db = db
 
-    def get_doctor_subscribers(self, doctor_id: int) -> DoctorSubs:
+    async def get_doctors_subscribers(self, doctor_ids: list[int]) -> list[DoctorSubs]:
+        """Строки докторов по списку doctor_id, неизвестных id в ответе просто нет"""
         query = f"""
             select id, 
                 doctor_id, 
@@ -37,12 +74,16 @@ class ApiRepository:
                 vk_last_updated,
                 vk_subs_count
             from doctors 
-            where doctor_id = %s;
+            where doctor_id = ANY(%s);
         """
-        result = self.db.select(query, (doctor_id,), True)
-
         try:
-            doctor = DoctorSubs(
+            results = await self.db.select(query, (doctor_ids,))
+        except Exception as e:
+            print("Ошибка при получении врачей по ids", e)
+            raise
+
+        return [
+            DoctorSubs(
                 internal_id=result[0],
                 doctor_id=result[1],
                 instagram_channel_name=result[2] or "",
@@ -57,62 +98,29 @@ class ApiRepository:
                 vk_channel_name=result[11] or "",
                 vk_last_updated_timestamp=result[12],
                 vk_subs_count=result[13] or 0,
-            )
-        except Exception as e:
-            raise DoctorNotFound(doctor_id=doctor_id)
-
-        return doctor
-
-    def get_subscribers_by_doctor_ids(self, doctor_ids: list[int]) -> list[DoctorSubsByIDs]:
-        query = f"""
-            select
-                doctor_id, 
-                inst_subs_count,
-                tg_subs_count,
-                youtube_subs_count,
-                vk_subs_count
-            from doctors 
-            where doctor_id = ANY(%s);
-        """
-        doctors = list()
-
-        try:
-            result = self.db.select(query, (doctor_ids,))
+            ) for result in results
+        ]
 
-            for r in result:
-                doctors.append(DoctorSubsByIDs(
-                    doctor_id=r[0],
-                    inst_subs_count=r[1] or 0,
-                    tg_subs_count=r[2] or 0,
-                    youtube_subs_count=r[3] or 0,
-                    vk_subs_count=r[4] or 0,
-                ))
-
-        except Exception as e:
-            print("Ошибка при получении врачей по ids", e)
-
-        return doctors
-
-    def get_all_subscribers_count(self) -> (int, Optional[datetime.datetime]):
+    async def get_all_subscribers_count(self) -> (int, Optional[datetime.datetime]):
         query = f""" 
             select 
-                coalesce(sum(tg_subs_count), 0) + coalesce(sum(inst_subs_count),0) + coalesce(sum(youtube_subs_count), 0) + coalesce(sum(vk_subs_count), 0) AS total_subscribers,
+                coalesce(sum(total_subs_count), 0) AS total_subscribers,
                 least(min(tg_last_updated), min(inst_last_updated), min(youtube_last_updated), min(vk_last_updated)) AS last_updated_timestamp
             from doctors 
             where is_active is true
         """
 
         try:
-            result = self.db.select(query)[0]
+            result = (await self.db.select(query))[0]
             total_subscribers = result[0]
             last_updated_timestamp = result[1]
 
             return total_subscribers, last_updated_timestamp
         except Exception as e:
             print("Ошибка получения количества подписчиков", e)
-            return 0, None
+            raise
 
-    def create_doctor_subscriber(
+    async def create_doctor_subscriber(
             self, doctor_id: int,
             instagram_channel_name: str,
             telegram_channel_name: str,
@@ -133,21 +141,24 @@ class ApiRepository:
         """
 
         try:
-            self.db.execute(
-                query,
-                (doctor_id, instagram_channel_name, telegram_channel_name, youtube_channel_name, vk_channel_name)
-            )
+            async with self.db.connection() as conn:
+                await conn.execute(
+                    query,
+                    (doctor_id, instagram_channel_name, telegram_channel_name, youtube_channel_name, vk_channel_name)
+                )
+                # каналы нового доктора сразу ставим в очередь обновления подписчиков
+                await conn.execute(SYNC_REFRESH_QUEUE_QUERY, {"doctor_id": doctor_id})
         except Exception as e:
             print("Ошибка при создании доктора в таблице", e)
 
-    def get_filter_info(self) -> List[Messenger]:
+    async def get_filter_info(self) -> List[Messenger]:
         query = f"""
             select name, slug from social_media where enabled is true;
         """
 
         medias = list()
         try:
-            results = self.db.select(query)
+            results = await self.db.select(query)
             for result in results:
                 medias.append(
                     Messenger(
@@ -157,336 +168,109 @@ class ApiRepository:
                 )
         except Exception as e:
             print("Ошибка при получении информации о фильтрах для соц.cетей", e)
+            raise
 
         return medias
 
-    def filtered_doctors_count_with_doctors_ids(
-            self,
-            social_networks: list[SocialNetworkType],
-            min_subscribers: int,
-            max_subscribers: int,
-            doctors_ids: list[int],
-    ):
-        """
-        Функция считает сколько врачей попадает под выборку для подсчета страниц,
-        какой охват имеют отфильтрованные врачи
-        """
-        base_query = f""" 
-        select 
-            count(*) as doctors_count, 
-            coalesce(sum(tg_subs_count), 0) + coalesce(sum(inst_subs_count), 0) + coalesce(sum(youtube_subs_count), 0) + coalesce(sum(vk_subs_count), 0) AS total_subscribers
-        from doctors
-        where doctor_id = any(%s::bigint[])
-        """
-
-        params = ()
-        query = ""
-
-        # Все либо никаких специальностей
-        if not social_networks or len(social_networks) or len(social_networks) == len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in SOCIAL_NETWORK_FIELDS.values():
-                counter += 1
-                if counter == len(SOCIAL_NETWORK_FIELDS.keys()):
-                    coalesce_query += f"coalesce({social_network}, 0) "
-                    continue
-                coalesce_query += f"coalesce({social_network}, 0) + "
-
-            query = base_query + f"and {coalesce_query} between %s and %s"
-
-        if social_networks and len(social_networks) != len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in social_networks:
-                counter += 1
-                if counter == len(social_networks):
-                    coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0)"
-                    continue
-                coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0) + "
-
-            query = base_query + f"and {coalesce_query} between %s and %s "
-
-        if len(query) != 0:
-            params = (doctors_ids, min_subscribers, max_subscribers)
-
-        try:
-            result = self.db.select(query, params)[0]
-        except Exception as e:
-            print("Ошибка при подсчете докторов для фильтрации", e)
-            return 0, 0
-        try:
-            doctors_count = int(result[0])
-        except Exception as e:
-            doctors_count = 0
-
-        try:
-            subscribers_count = int(result[1])
-        except Exception as e:
-            subscribers_count = 0
-
-        return doctors_count, subscribers_count
-
-    def filtered_doctors_count(
-            self,
-            social_networks: list[SocialNetworkType],
-            min_subscribers: int,
-            max_subscribers: int,
-    ):
-        """
-        Функция считает сколько врачей попадает под выборку для подсчета страниц,
-        какой охват имеют отфильтрованные врачи
-        """
-        base_query = f""" 
-        select 
-            count(*) as doctors_count, 
-            coalesce(sum(tg_subs_count), 0) + coalesce(sum(inst_subs_count), 0) + coalesce(sum(youtube_subs_count), 0) + coalesce(sum(vk_subs_count), 0) AS total_subscribers
-        from doctors
-        where is_active is true
-        """
-
-        params = ()
-        query = ""
-
-        # Все либо никаких специальностей
-        if not social_networks or len(social_networks) == len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in SOCIAL_NETWORK_FIELDS.values():
-                counter += 1
-                if counter == len(SOCIAL_NETWORK_FIELDS.keys()):
-                    coalesce_query += f"coalesce({social_network}, 0) "
-                    continue
-                coalesce_query += f"coalesce({social_network}, 0) + "
-
-            query = base_query + f"and {coalesce_query} between %s and %s"
-
-        if social_networks and len(social_networks) != len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in social_networks:
-                counter += 1
-                if counter == len(social_networks):
-                    coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0)"
-                    continue
-                coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0) + "
-
-            query = base_query + f"and {coalesce_query} between %s and %s "
-
-        if len(query) != 0:
-            params = (min_subscribers, max_subscribers)
-
-        try:
-            result = self.db.select(query, params)[0]
-        except Exception as e:
-            print("Ошибка при подсчете докторов для фильтрации", e)
-            return 0, 0
-
-        try:
-            doctors_count = int(result[0])
-        except Exception as e:
-            doctors_count = 0
-
-        try:
-            subscribers_count = int(result[1])
-        except Exception as e:
-            subscribers_count = 0
-
-        return doctors_count, subscribers_count
-
-    def doctors_filter_with_doctors_ids(
+    async def doctors_filter_page(
             self,
             social_networks: list[SocialNetworkType],
             sort_enum: SortedType,
             min_subscribers: int,
             max_subscribers: int,
-            limit: int,
             current_page: int,
-            doctors_ids: list[int],
-    ):
-        if len(doctors_ids) == 0:
-            return 0, 0
-
-        if current_page <= 0:
+            limit: int,
+            cursor: Optional[FilterCursor] = None,
+            doctors_ids: Optional[list[int]] = None,
+    ) -> (List[DoctorSubs], int, int):
+        """
+        Фильтрация докторов одним запросом: страница, количество подходящих докторов и их охват.
+        Если переданы doctors_ids, то фильтрует только среди них
+        """
+        # при курсоре страница отсчитывается от него
+        if current_page <= 0 or cursor is not None:
             current_page = 1
 
         offset = (current_page - 1) * limit
-
         doctors = []
-        params = doctors_ids
-        query = ""
-
-        base_query = f"""
-                   select 
-                       doctor_id,
-                       coalesce(tg_subs_count, 0),
-                       coalesce(inst_subs_count, 0),
-                       coalesce(youtube_subs_count, 0),
-                       coalesce(vk_subs_count, 0),
-                       coalesce(inst_subs_count, 0) + coalesce(tg_subs_count, 0) + coalesce(youtube_subs_count, 0) + coalesce(vk_subs_count, 0) AS total_subscribers
-                   from doctors
-                   where doctor_id = any(%s::bigint[]) and is_active is true
-               """
-
-        # Все либо никаких специальностей
-        if not social_networks or len(social_networks) == len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in SOCIAL_NETWORK_FIELDS.values():
-                counter += 1
-                if counter == len(SOCIAL_NETWORK_FIELDS.keys()):
-                    coalesce_query += f"coalesce({social_network}, 0) "
-                    continue
-                coalesce_query += f"coalesce({social_network}, 0) + "
-
-            query = base_query + f"""
-                and {coalesce_query} between %s and %s 
-                order by total_subscribers {sort_enum} 
-            """
-
-        if social_networks and len(social_networks) == 1:
-            query = base_query + f"""
-                and {SOCIAL_NETWORK_FIELDS[social_networks[0]]} between %s and %s
-                order by {SOCIAL_NETWORK_FIELDS[social_networks[0]]} {sort_enum}
-            """
-
-        if social_networks and len(social_networks) != len(SOCIAL_NETWORK_FIELDS.keys()) and len(social_networks) != 1:
-            coalesce_query = ""
-            counter = 0
-            for social_network in social_networks:
-                counter += 1
-                if counter == len(social_networks):
-                    coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0)"
-                    continue
-                coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0) + "
-
-            query = base_query + f"""
-                and {coalesce_query} between %s and %s 
-                order by total_subscribers {sort_enum} 
-            """
-
-        if len(query) != 0:
-            query += """
-                offset %s 
-                limit %s
-            """
-            params = (doctors_ids, min_subscribers, max_subscribers, offset, limit)
 
         try:
-            results = self.db.select(
-                query, params
-            )
-            for result in results:
-                doctors.append(
-                    DoctorSubs(
-                        internal_id=0,
-                        doctor_id=result[0],
-                        tg_subs_count=int(result[1]),
-                        inst_subs_count=int(result[2]),
-                        youtube_subs_count=int(result[3]),
-                        vk_subs_count=int(result[4]),
-                    )
-                )
+            query = filter_page_query(filter_fields(social_networks), sort_enum, doctors_ids is not None, cursor is not None)
+        except KeyError as e:
+            print("Ошибка при фильтрации каналов докторов, неизвестная соцсеть", e)
+            return doctors, 0, 0
+
+        params = []
+        if doctors_ids is not None:
+            params.append(doctors_ids)
+        params.extend((min_subscribers, max_subscribers))
+        if cursor is not None:
+            params.extend((cursor.subscribers, cursor.doctor_id))
+        params.extend((offset, limit))
 
+        try:
+            results = await self.db.select(query, params, prepare=True)
         except Exception as e:
             print("Ошибка при фильтрации каналов докторов", e)
+            return doctors, 0, 0
+
+        doctors_count, subscribers_count = int(results[0][0]), int(results[0][1])
+        for result in results:
+            # пустая страница - одна строка с итогами без доктора
+            if result[2] is None:
+                continue
+            doctors.append(
+                DoctorSubs(
+                    internal_id=0,
+                    doctor_id=result[2],
+                    tg_subs_count=result[3],
+                    inst_subs_count=result[4],
+                    youtube_subs_count=result[5],
+                    vk_subs_count=result[6],
+                )
+            )
 
-        return doctors
-
-    def doctors_filter(
-            self,
-            social_networks: list[SocialNetworkType],
-            sort_enum: SortedType,
-            min_subscribers: int,
-            max_subscribers: int,
-            current_page: int,
-            limit: int,
-    ):
-        if current_page <= 0:
-            current_page = 1
-
-        offset = (current_page - 1) * limit
-        doctors = []
-        params = ()
-        query = ""
+        return doctors, doctors_count, subscribers_count
 
-        base_query = f"""
+    async def get_doctors_snapshot(
+            self, updated_since: Optional[datetime.datetime] = None
+    ) -> List[DoctorSubsSnapshot]:
+        """
+        Счетчики подписчиков для колоночной модели фильтрации.
+        Если передан updated_since, то возвращает только строки, обновленные после него
+        """
+        query = """
             select 
                 doctor_id,
-                tg_subs_count,
+                is_active,
                 inst_subs_count,
+                tg_subs_count,
                 youtube_subs_count,
                 vk_subs_count,
-                coalesce(inst_subs_count, 0) + coalesce(tg_subs_count, 0) + coalesce(youtube_subs_count, 0) + coalesce(vk_subs_count, 0) AS total_subscribers
+                greatest(inst_last_updated, tg_last_updated, youtube_last_updated, vk_last_updated) as last_updated
             from doctors
-            where is_active is true 
         """
-
-        # Все либо никаких специальностей
-        if not social_networks or len(social_networks) == len(SOCIAL_NETWORK_FIELDS.keys()):
-            coalesce_query = ""
-            counter = 0
-            for social_network in SOCIAL_NETWORK_FIELDS.values():
-                counter += 1
-                if counter == len(SOCIAL_NETWORK_FIELDS.keys()):
-                    coalesce_query += f"coalesce({social_network}, 0) "
-                    continue
-                coalesce_query += f"coalesce({social_network}, 0) + "
-
-            query = base_query + f"""
-                and {coalesce_query} between %s and %s
-                order by total_subscribers {sort_enum} 
-            """
-
-        if social_networks and len(social_networks) == 1:
-            query = base_query + f"""
-                and {SOCIAL_NETWORK_FIELDS[social_networks[0]]} between %s and %s
-                order by {SOCIAL_NETWORK_FIELDS[social_networks[0]]} {sort_enum}
-            """
-
-        if social_networks and len(social_networks) != len(SOCIAL_NETWORK_FIELDS.keys()) and len(social_networks) != 1:
-            coalesce_query = ""
-            counter = 0
-            for social_network in social_networks:
-                counter += 1
-                if counter == len(social_networks):
-                    coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0)"
-                    continue
-                coalesce_query += f"coalesce({SOCIAL_NETWORK_FIELDS[social_network]}, 0) + "
-
-            query = base_query + f"""
-                and {coalesce_query} between %s and %s
-                order by total_subscribers {sort_enum} 
-            """
-
-        if len(query) != 0:
+        params = ()
+        if updated_since is not None:
             query += """
-                offset %s 
+            where greatest(inst_last_updated, tg_last_updated, youtube_last_updated, vk_last_updated) > %s
             """
-            params = (min_subscribers, max_subscribers, offset)
-
-        try:
-            results = self.db.select(
-                query, params
-            )
-            for result in results:
-                doctors.append(
-                    DoctorSubs(
-                        internal_id=0,
-                        doctor_id=result[0],
-                        tg_subs_count=result[1] or 0,
-                        inst_subs_count=result[2] or 0,
-                        youtube_subs_count=result[3] or 0,
-                        vk_subs_count=result[4] or 0,
-                    )
-                )
-
-        except Exception as e:
-            print("Ошибка при фильтрации каналов докторов", e)
-
-        return doctors
-
-    def update_doctor(
+            params = (updated_since,)
+
+        results = await self.db.select(query, params)
+        return [
+            DoctorSubsSnapshot(
+                doctor_id=row[0],
+                is_active=bool(row[1]),
+                inst_subs_count=row[2],
+                tg_subs_count=row[3],
+                youtube_subs_count=row[4],
+                vk_subs_count=row[5],
+                last_updated_timestamp=row[6],
+            ) for row in results
+        ]
+
+    async def update_doctor(
             self,
             doctor_id: int,
             instagram_channel_name: str, telegram_channel_name: str
@@ -500,46 +284,111 @@ class ApiRepository:
         """
 
         try:
-            rows_count = self.db.execute_with_result(
-                query, (instagram_channel_name, telegram_channel_name, doctor_id))
-            if rows_count == 0:
-                raise DoctorNotFound(doctor_id=doctor_id)
+            async with self.db.connection() as conn:
+                cursor = await conn.execute(query, (instagram_channel_name, telegram_channel_name, doctor_id))
+                if cursor.rowcount == 0:
+                    raise DoctorNotFound(doctor_id=doctor_id)
+                # сменившиеся каналы обновляем вне очереди
+                await conn.execute(SYNC_REFRESH_QUEUE_QUERY, {"doctor_id": doctor_id})
         except DoctorNotFound as e:
             raise e
         except Exception as e:
             print("Ошибка при создании доктора в таблице", e)
 
-    def update_doctor_is_active(self, doctor_id: int, is_active: bool):
+    async def update_doctor_is_active(self, doctor_id: int, is_active: bool, inactive_refresh_seconds: int):
+        """
+        Меняет активность доктора и перестраивает его строки в очереди обновления подписчиков:
+        ставший активным доктор обновляется сразу, ставший неактивным - не раньше интервала неактивных
+        """
+        select_query = """
+        select is_active
+        from doctors
+        where doctor_id = %s
+        for update;
+        """
         query = f"""
         update doctors
         set 
             is_active = %s
         where doctor_id = %s;
         """
+        reschedule_query = """
+        update subscribers_refresh_queue
+        set next_due_at = case
+                              when %(is_active)s then least(next_due_at, now())
+                              else greatest(
+                                      next_due_at,
+                                      coalesce(last_attempt_at, now()) + %(inactive)s * interval '1 second'
+                                   )
+                          end
+        where doctor_id = %(doctor_id)s;
+        """
 
         try:
-            rows_count = self.db.execute_with_result(query, (is_active, doctor_id))
-            if rows_count == 0:
-                raise DoctorNotFound(doctor_id=doctor_id)
+            async with self.db.connection() as conn:
+                cursor = await conn.execute(select_query, (doctor_id,))
+                row = await cursor.fetchone()
+                if row is None:
+                    raise DoctorNotFound(doctor_id=doctor_id)
+                await conn.execute(query, (is_active, doctor_id))
+                if bool(row[0]) != is_active:
+                    await conn.execute(reschedule_query, {
+                        "is_active": is_active, "inactive": inactive_refresh_seconds, "doctor_id": doctor_id,
+                    })
         except DoctorNotFound as e:
             raise e
         except Exception as e:
             print("Ошибка при создании доктора в таблице", e)
 
-    def check_telegram_blacklist(self, telegram: str) -> bool:
-        query = f"""
+    async def check_telegram_blacklist(self, telegram: str) -> bool:
+        """Запасной путь, пока индекс черного списка не загружен. Поиск по подстроке идет по триграммным индексам"""
+        query = """
             select exists(
                 select 1 from telegram_blacklist
                 where is_active is true 
-                and (telegram_username ilike '%{telegram}%' OR telegram_name ilike '%{telegram}%')
+                and (telegram_username ilike %(pattern)s or telegram_name ilike %(pattern)s)
             )
         """
         try:
-            results = self.db.select(query)
+            results = await self.db.select(query, {"pattern": substring_pattern(telegram)})
             return results[0][0]
         except Exception as e:
             print("Ошибка при поиске канала в чс", e)
 
+    async def check_telegram_blacklist_batch(self, telegrams: List[str]) -> dict[str, Optional[TelegramBlacklistEntry]]:
+        """Запасной путь для пачки: первая по id совпавшая запись для каждой строки, одним запросом"""
+        query = """
+            select handles.telegram, matched.id, matched.telegram_username, matched.telegram_name
+            from unnest(%s::text[], %s::text[]) as handles(telegram, pattern)
+            left join lateral (
+                select id, telegram_username, telegram_name
+                from telegram_blacklist
+                where is_active is true 
+                and (telegram_username ilike handles.pattern or telegram_name ilike handles.pattern)
+                order by id
+                limit 1
+            ) matched on true
+        """
+        telegrams = list(dict.fromkeys(telegrams))
+        results = await self.db.select(query, (telegrams, [substring_pattern(telegram) for telegram in telegrams]))
+        return {
+            row[0]: TelegramBlacklistEntry(id=row[1], telegram_username=row[2], telegram_name=row[3])
+            if row[1] is not None else None
+            for row in results
+        }
+
+    async def get_active_telegram_blacklist(self) -> List[TelegramBlacklistEntry]:
+        query = """
+            select id, telegram_username, telegram_name
+            from telegram_blacklist
+            where is_active is true
+            order by id;
+        """
+        results = await self.db.select(query)
+        return [
+            TelegramBlacklistEntry(id=row[0], telegram_username=row[1], telegram_name=row[2]) for row in results
+        ]
+
     # def migrate_instagram(self, doctor_id: int, instagram_channel_name: str):
     #     query = f"""
     #     update doctors
@@ -549,7 +398,7 @@ class ApiRepository:
     #     """
     #
     #     try:
-    #         rows_count = self.db.execute_with_result(query, (instagram_channel_name, doctor_id))
+    #         rows_count = await self.db.execute_with_result(query, (instagram_channel_name, doctor_id))
     #         if rows_count == 0:
     #             raise DoctorNotFound(doctor_id=doctor_id)
     #     except DoctorNotFound as e:
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from app.entities.cursor import FilterCursor
+from app.entities.doctor_subs import DoctorSubs, DoctorSubsSnapshot
+from app.entities.messengers import SOCIAL_NETWORK_FIELDS
+from app.entities.sorted import SortedType
+
+# порядок строк в матрице подписчиков
+FIELDS = list(SOCIAL_NETWORK_FIELDS.values())
+
+# строки, обновленные транзакцией, которая закоммитилась позже уже прочитанных, подхватываем с запасом
+INCREMENTAL_OVERLAP = datetime.timedelta(minutes=1)
+
+
+class DoctorsReadModel:
+    """
+    Колоночная копия счетчиков подписчиков из таблицы doctors.
+    Фильтрация, сортировка и подсчет охвата делаются векторно в numpy без похода в базу.
+    Обновляется инкрементально по *_last_updated, целиком - раз в full_reload_interval или после mark_stale
+    """
+
+    def __init__(self, repository, full_reload_interval: datetime.timedelta):
+        self.repository = repository
+        self.full_reload_interval = full_reload_interval
+
+        self._doctor_ids = np.empty(0, dtype=np.int64)
+        self._is_active = np.empty(0, dtype=bool)
+        # подписчики по соцсетям в порядке FIELDS, NULL хранится как 0 и отмечается в _has_counts
+        self._counts = np.empty((len(FIELDS), 0), dtype=np.int64)
+        self._has_counts = np.empty((len(FIELDS), 0), dtype=bool)
+        self._total = np.empty(0, dtype=np.int64)
+        # doctor_id -> номер строки в массивах
+        self._positions: dict[int, int] = {}
+
+        self._last_updated_at: Optional[datetime.datetime] = None
+        self._full_reloaded_at: Optional[datetime.datetime] = None
+        self._is_stale = True
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._full_reloaded_at is not None
+
+    def mark_stale(self):
+        """Следующий refresh перечитает таблицу целиком (новые доктора, смена is_active)"""
+        self._is_stale = True
+
+    async def refresh(self):
+        now = datetime.datetime.now()
+        need_full_reload = (
+                self._is_stale
+                or self._full_reloaded_at is None
+                or now - self._full_reloaded_at >= self.full_reload_interval
+        )
+        if need_full_reload:
+            # сбрасываем флаг до запроса, чтобы mark_stale во время загрузки вызвал еще одну перезагрузку
+            self._is_stale = False
+            try:
+                rows = await self.repository.get_doctors_snapshot()
+            except Exception:
+                self._is_stale = True
+                raise
+            self.load(rows)
+            self._full_reloaded_at = now
+            return
+
+        updated_since = None
+        if self._last_updated_at is not None:
+            updated_since = self._last_updated_at - INCREMENTAL_OVERLAP
+        rows = await self.repository.get_doctors_snapshot(updated_since)
+        self.apply_changes(rows)
+
+    def load(self, rows: List[DoctorSubsSnapshot]):
+        """Полностью заменяет данные модели"""
+        size = len(rows)
+        self._doctor_ids = np.fromiter((row.doctor_id for row in rows), dtype=np.int64, count=size)
+        self._is_active = np.fromiter((row.is_active for row in rows), dtype=bool, count=size)
+        self._counts = np.zeros((len(FIELDS), size), dtype=np.int64)
+        self._has_counts = np.zeros((len(FIELDS), size), dtype=bool)
+        for position, row in enumerate(rows):
+            self._set_counts(position, row)
+        self._total = self._counts.sum(axis=0)
+        self._positions = {doctor_id: position for position, doctor_id in enumerate(self._doctor_ids.tolist())}
+        self._last_updated_at = max(
+            (row.last_updated_timestamp for row in rows if row.last_updated_timestamp), default=None
+        )
+
+    def apply_changes(self, rows: List[DoctorSubsSnapshot]):
+        """Применяет измененные строки: существующие обновляет на месте, новые дописывает в конец"""
+        if not rows:
+            return
+
+        new_rows = []
+        for row in rows:
+            position = self._positions.get(row.doctor_id)
+            if position is None:
+                new_rows.append(row)
+                continue
+            self._is_active[position] = row.is_active
+            self._set_counts(position, row)
+
+        if new_rows:
+            start = self._doctor_ids.size
+            self._doctor_ids = np.concatenate(
+                (self._doctor_ids, np.fromiter((row.doctor_id for row in new_rows), dtype=np.int64))
+            )
+            self._is_active = np.concatenate(
+                (self._is_active, np.fromiter((row.is_active for row in new_rows), dtype=bool))
+            )
+            self._counts = np.concatenate((self._counts, np.zeros((len(FIELDS), len(new_rows)), dtype=np.int64)), axis=1)
+            self._has_counts = np.concatenate(
+                (self._has_counts, np.zeros((len(FIELDS), len(new_rows)), dtype=bool)), axis=1
+            )
+            for offset, row in enumerate(new_rows):
+                self._positions[row.doctor_id] = start + offset
+                self._set_counts(start + offset, row)
+
+        self._total = self._counts.sum(axis=0)
+        last_updated = max((row.last_updated_timestamp for row in rows if row.last_updated_timestamp), default=None)
+        if last_updated and (self._last_updated_at is None or last_updated > self._last_updated_at):
+            self._last_updated_at = last_updated
+
+    def _set_counts(self, position: int, row: DoctorSubsSnapshot):
+        for field_index, field in enumerate(FIELDS):
+            value = getattr(row, field)
+            self._counts[field_index, position] = value or 0
+            self._has_counts[field_index, position] = value is not None
+
+    def filter(
+            self,
+            social_networks: list[str],
+            sort_enum: SortedType,
+            min_subscribers: int,
+            max_subscribers: int,
+            offset: int,
+            limit: int,
+            doctor_ids: Optional[list[int]] = None,
+            cursor: Optional[FilterCursor] = None,
+    ) -> (List[DoctorSubs], int, int):
+        """
+        Фильтрует активных докторов по сумме подписчиков в выбранных соцсетях.
+        Возвращает страницу докторов, количество подходящих докторов и их суммарный охват.
+        Если передан cursor, страница начинается сразу после него, offset при этом отсчитывается от курсора
+        """
+        try:
+            field_indexes = sorted({FIELDS.index(SOCIAL_NETWORK_FIELDS[network]) for network in social_networks})
+        except KeyError:
+            return [], 0, 0
+
+        mask = self._is_active.copy()
+        if doctor_ids is not None:
+            mask &= np.isin(self._doctor_ids, np.asarray(doctor_ids, dtype=np.int64))
+
+        # Все либо никаких соцсетей - фильтруем и сортируем по общему охвату,
+        # одна соцсеть - по ней, несколько - фильтр по их сумме, сортировка по общему охвату
+        if not field_indexes or len(field_indexes) == len(FIELDS):
+            values = self._total
+            sort_values = self._total
+        elif len(field_indexes) == 1:
+            values = self._counts[field_indexes[0]]
+            sort_values = values
+            mask &= self._has_counts[field_indexes[0]]
+        else:
+            values = self._counts[field_indexes].sum(axis=0)
+            sort_values = self._total
+
+        mask &= (values >= min_subscribers) & (values <= max_subscribers)
+        positions = np.flatnonzero(mask)
+
+        doctors_count = int(positions.size)
+        subscribers_count = int(self._total[positions].sum())
+
+        if cursor is not None:
+            seek_values, seek_ids = sort_values[positions], self._doctor_ids[positions]
+            if sort_enum == SortedType.DESC:
+                after_cursor = (seek_values < cursor.subscribers) | (
+                        (seek_values == cursor.subscribers) & (seek_ids < cursor.doctor_id))
+            else:
+                after_cursor = (seek_values > cursor.subscribers) | (
+                        (seek_values == cursor.subscribers) & (seek_ids > cursor.doctor_id))
+            positions = positions[after_cursor]
+
+        page_end = min(offset + limit, positions.size)
+        if offset >= page_end:
+            return [], doctors_count, subscribers_count
+
+        keys = sort_values[positions]
+        if sort_enum == SortedType.DESC:
+            keys = -keys
+
+        # частичная сортировка: оставляем только page_end лучших, граничные равные значения берем все
+        if page_end < positions.size:
+            kth = np.partition(keys, page_end - 1)[page_end - 1]
+            candidates = keys <= kth
+            positions, keys = positions[candidates], keys[candidates]
+
+        ids = self._doctor_ids[positions]
+        if sort_enum == SortedType.DESC:
+            ids = -ids
+        order = np.lexsort((ids, keys))
+        page = positions[order][offset:page_end]
+
+        return [self._to_doctor_subs(position) for position in page.tolist()], doctors_count, subscribers_count
+
+    def _to_doctor_subs(self, position: int) -> DoctorSubs:
+        counts = {field: int(self._counts[field_index, position]) for field_index, field in enumerate(FIELDS)}
+        return DoctorSubs(internal_id=0, doctor_id=int(self._doctor_ids[position]), **counts)
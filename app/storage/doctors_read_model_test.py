@@ -0,0 +1,132 @@
+import datetime
+import random
+
+import pytest
+from app.entities.cursor import FilterCursor
+from app.entities.doctor_subs import DoctorSubsSnapshot
+from app.entities.sorted import SortedType
+from app.storage.doctors_read_model import DoctorsReadModel, FIELDS
+
+NETWORK_FIELDS = {"inst": "inst_subs_count", "tg": "tg_subs_count", "youtube": "youtube_subs_count", "vk": "vk_subs_count"}
+
+
+def make_rows(size: int, seed: int = 1) -> list[DoctorSubsSnapshot]:
+    rnd = random.Random(seed)
+    rows = []
+    for doctor_id in range(1, size + 1):
+        counts = {field: rnd.choice([None, rnd.randint(0, 50), rnd.randint(0, 5000)]) for field in FIELDS}
+        rows.append(DoctorSubsSnapshot(doctor_id=doctor_id, is_active=rnd.random() > 0.2, **counts))
+    return rows
+
+
+def brute_force(rows, social_networks, sort_enum, min_subs, max_subs, offset, limit, doctor_ids=None):
+    """Повторяет семантику SQL фильтра построчно"""
+    fields = sorted({NETWORK_FIELDS[network] for network in social_networks})
+    matched = []
+    for row in rows:
+        if not row.is_active or (doctor_ids is not None and row.doctor_id not in doctor_ids):
+            continue
+        total = sum(getattr(row, field) or 0 for field in FIELDS)
+        if not fields or len(fields) == len(FIELDS):
+            value, sort_value = total, total
+        elif len(fields) == 1:
+            value = getattr(row, fields[0])
+            if value is None:
+                continue
+            sort_value = value
+        else:
+            value, sort_value = sum(getattr(row, field) or 0 for field in fields), total
+        if min_subs <= value <= max_subs:
+            matched.append((sort_value, row.doctor_id, total))
+
+    matched.sort(reverse=sort_enum == SortedType.DESC)
+    page = [doctor_id for _, doctor_id, _ in matched[offset:offset + limit]]
+    return page, len(matched), sum(total for _, _, total in matched)
+
+
+@pytest.mark.parametrize("social_networks", [[], ["tg"], ["vk"], ["tg", "inst"], ["youtube", "vk", "inst"],
+                                             ["tg", "inst", "youtube", "vk"]])
+@pytest.mark.parametrize("sort_enum", [SortedType.ASC, SortedType.DESC])
+@pytest.mark.parametrize("offset, limit", [(0, 30), (30, 30), (5, 1), (0, 1000)])
+def test_filter_matches_sql_semantics(social_networks, sort_enum, offset, limit):
+    rows = make_rows(300)
+    model = DoctorsReadModel(repository=None, full_reload_interval=datetime.timedelta(minutes=10))
+    model.load(rows)
+
+    doctors, doctors_count, subs_count = model.filter(social_networks, sort_enum, 10, 4000, offset, limit)
+
+    expected_page, expected_count, expected_subs = brute_force(
+        rows, social_networks, sort_enum, 10, 4000, offset, limit
+    )
+    assert [doctor.doctor_id for doctor in doctors] == expected_page
+    assert doctors_count == expected_count
+    assert subs_count == expected_subs
+
+
+def test_filter_with_doctor_ids():
+    rows = make_rows(100)
+    model = DoctorsReadModel(repository=None, full_reload_interval=datetime.timedelta(minutes=10))
+    model.load(rows)
+    doctor_ids = [3, 5, 8, 13, 21, 34, 55, 89, 1000]
+
+    doctors, doctors_count, subs_count = model.filter(["tg", "inst"], SortedType.DESC, 0, 100_000, 0, 30, doctor_ids)
+
+    expected_page, expected_count, expected_subs = brute_force(
+        rows, ["tg", "inst"], SortedType.DESC, 0, 100_000, 0, 30, set(doctor_ids)
+    )
+    assert [doctor.doctor_id for doctor in doctors] == expected_page
+    assert (doctors_count, subs_count) == (expected_count, expected_subs)
+
+
+def test_unknown_social_network_returns_empty_result():
+    model = DoctorsReadModel(repository=None, full_reload_interval=datetime.timedelta(minutes=10))
+    model.load(make_rows(10))
+
+    assert model.filter(["facebook"], SortedType.DESC, 0, 100, 0, 30) == ([], 0, 0)
+
+
+def test_apply_changes_updates_and_appends_rows():
+    rows = make_rows(50)
+    model = DoctorsReadModel(repository=None, full_reload_interval=datetime.timedelta(minutes=10))
+    model.load(rows)
+
+    now = datetime.datetime.now()
+    changed = [
+        DoctorSubsSnapshot(doctor_id=7, is_active=True, tg_subs_count=999_999, last_updated_timestamp=now),
+        DoctorSubsSnapshot(doctor_id=1000, is_active=True, inst_subs_count=888_888, last_updated_timestamp=now),
+    ]
+    model.apply_changes(changed)
+
+    merged = {row.doctor_id: row for row in rows}
+    merged.update({row.doctor_id: row for row in changed})
+    merged_rows = list(merged.values())
+
+    doctors, doctors_count, subs_count = model.filter([], SortedType.DESC, 0, 10_000_000, 0, 3)
+    expected_page, expected_count, expected_subs = brute_force(
+        merged_rows, [], SortedType.DESC, 0, 10_000_000, 0, 3
+    )
+    assert [doctor.doctor_id for doctor in doctors] == expected_page
+    assert doctors[0].tg_subs_count == 999_999
+    assert (doctors_count, subs_count) == (expected_count, expected_subs)
+
+
+@pytest.mark.parametrize("social_networks", [[], ["tg"], ["tg", "youtube"]])
+@pytest.mark.parametrize("sort_enum", [SortedType.ASC, SortedType.DESC])
+def test_cursor_pages_match_offset_pages(social_networks, sort_enum):
+    rows = make_rows(200, seed=7)
+    model = DoctorsReadModel(repository=None, full_reload_interval=datetime.timedelta(minutes=10))
+    model.load(rows)
+
+    _, expected_count, _ = brute_force(rows, social_networks, sort_enum, 0, 4000, 0, 0)
+    expected_ids, _, _ = brute_force(rows, social_networks, sort_enum, 0, 4000, 0, expected_count)
+
+    cursor, seen_ids = None, []
+    while True:
+        doctors, doctors_count, _ = model.filter(social_networks, sort_enum, 0, 4000, 0, 17, cursor=cursor)
+        assert doctors_count == expected_count
+        if not doctors:
+            break
+        seen_ids.extend(doctor.doctor_id for doctor in doctors)
+        cursor = FilterCursor.after(doctors[-1], social_networks, sort_enum)
+
+    assert seen_ids == expected_ids
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+from app.entities.messengers import SOCIAL_NETWORK_FIELDS
+from app.entities.sorted import SortedType
+
+# общий охват хранится в doctors.total_subs_count, по нему и по каждой соцсети есть индексы
+TOTAL_FIELD = "total_subs_count"
+
+
+def filter_fields(social_networks: list[str]) -> tuple[str, ...]:
+    """
+    Нормализованный набор колонок для фильтра: порядок соцсетей и повторы не важны,
+    все соцсети равносильны их отсутствию. Неизвестная соцсеть - KeyError
+    """
+    fields = {SOCIAL_NETWORK_FIELDS[social_network] for social_network in social_networks}
+    if len(fields) == len(SOCIAL_NETWORK_FIELDS):
+        return ()
+    return tuple(field for field in SOCIAL_NETWORK_FIELDS.values() if field in fields)
+
+
+def filter_expressions(fields: tuple[str, ...]) -> (str, str):
+    """
+    Выражения для фильтрации и сортировки по подписчикам.
+    Никаких колонок - общий охват, одна - ее подписчики, несколько - фильтр по их сумме,
+    сортировка по общему охвату
+    """
+    if not fields:
+        return TOTAL_FIELD, TOTAL_FIELD
+    if len(fields) == 1:
+        return fields[0], fields[0]
+    return " + ".join(f"coalesce({field}, 0)" for field in fields), TOTAL_FIELD
+
+
+@lru_cache(maxsize=None)
+def filter_page_query(fields: tuple[str, ...], sort_enum: SortedType, with_doctors_ids: bool, with_cursor: bool) -> str:
+    """
+    Запрос страницы фильтра вместе с количеством подходящих докторов и их охватом.
+    Вариантов конечное число (наборы соцсетей x сортировка x фильтр по id x курсор),
+    каждый собирается один раз, а текст запроса стабилен - его можно готовить на соединении.
+    Параметры: [doctors_ids], min, max, [cursor.subscribers, cursor.doctor_id], offset, limit
+    """
+    known_fields = set(SOCIAL_NETWORK_FIELDS.values())
+    if not set(fields) <= known_fields:
+        raise KeyError(f"неизвестные колонки фильтра {set(fields) - known_fields}")
+
+    filter_expr, sort_expr = filter_expressions(fields)
+    direction = "desc" if sort_enum == SortedType.DESC else "asc"
+
+    ids_query = "and doctor_id = any(%s::bigint[])" if with_doctors_ids else ""
+
+    seek_query = ""
+    if with_cursor:
+        operator = "<" if sort_enum == SortedType.DESC else ">"
+        seek_query = f"where (sort_value, doctor_id) {operator} (%s, %s)"
+
+    return f"""
+        with filtered as (
+            select
+                doctor_id,
+                coalesce(tg_subs_count, 0) as tg_subs_count,
+                coalesce(inst_subs_count, 0) as inst_subs_count,
+                coalesce(youtube_subs_count, 0) as youtube_subs_count,
+                coalesce(vk_subs_count, 0) as vk_subs_count,
+                total_subs_count,
+                {sort_expr} as sort_value
+            from doctors
+            where is_active is true
+                {ids_query}
+                and {filter_expr} between %s and %s
+        ),
+        totals as (
+            select count(*) as doctors_count, coalesce(sum(total_subs_count), 0) as total_subscribers
+            from filtered
+        )
+        select
+            totals.doctors_count,
+            totals.total_subscribers,
+            page.doctor_id,
+            page.tg_subs_count,
+            page.inst_subs_count,
+            page.youtube_subs_count,
+            page.vk_subs_count
+        from totals
+        left join lateral (
+            select * from filtered
+            {seek_query}
+            order by sort_value {direction}, doctor_id {direction}
+            offset %s
+            limit %s
+        ) page on true
+    """
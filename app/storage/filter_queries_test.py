@@ -0,0 +1,24 @@
+import pytest
+from app.entities.sorted import SortedType
+from app.storage.filter_queries import filter_fields, filter_page_query
+
+
+def test_filter_fields_are_normalized():
+    assert filter_fields(["tg", "inst"]) == filter_fields(["inst", "tg", "tg"]) == ("inst_subs_count", "tg_subs_count")
+    assert filter_fields([]) == filter_fields(["tg", "inst", "youtube", "vk"]) == ()
+
+
+def test_unknown_social_network_is_rejected():
+    with pytest.raises(KeyError):
+        filter_fields(["facebook"])
+    with pytest.raises(KeyError):
+        filter_page_query(("inst_subs_count; drop table doctors",), SortedType.DESC, False, False)
+
+
+def test_query_is_built_once_per_variant():
+    query = filter_page_query(filter_fields(["vk", "tg"]), SortedType.ASC, True, True)
+
+    assert filter_page_query(filter_fields(["tg", "vk"]), SortedType.ASC, True, True) is query
+    assert query.count("%s") == 7
+    assert "coalesce(tg_subs_count, 0) + coalesce(vk_subs_count, 0) between" in query
+    assert "order by sort_value asc, doctor_id asc" in query
@@ -1,20 +1,16 @@
-from datetime import datetime
 from clients.postgres import Database
 from app.entities.instagram_settings import InstagramSettings
 
 
 class InstagramSettingsRepository:
 
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Database):
+        self.db = db
 
-    def get_instagram_settings(self) -> InstagramSettings:
+    async def get_instagram_settings(self) -> InstagramSettings:
         """Получает настройки для получения инстаграм"""
         query = """
                 select 
-                    req_capacity,
-                    filled_capacity,
-                    last_updated_time,
                     long_access_token,
                     short_access_token,
                     is_active
@@ -23,20 +19,17 @@ class InstagramSettingsRepository:
                 """
 
         try:
-            result = self.db.select(query, fetch_one=True)
+            result = await self.db.select(query, fetch_one=True)
             return InstagramSettings(
-                req_capacity=result[0] or 0,
-                filled_capacity=result[1] or 0,
-                last_updated_time=result[2] or datetime.now(),
-                long_access_token=result[3] or "",
-                short_access_token=result[4] or "",
-                is_active=result[5] or False,
+                long_access_token=result[0] or "",
+                short_access_token=result[1] or "",
+                is_active=result[2] or False,
             )
         except Exception as e:
             print(f"Error fetching Instagram Settings: {str(e)}")
             raise
 
-    def update_token_info(self, long_lived_token: str):
+    async def update_token_info(self, long_lived_token: str):
         """Обновляет информацию о долгом токене, включает работу инстаграм"""
         query = """
                 update instagram_api_settings
@@ -45,10 +38,9 @@ class InstagramSettingsRepository:
                     is_active = true
                 where id = 1
                 """
-        self.db.execute(query, (long_lived_token,))
-        self.db.commit()
+        await self.db.execute(query, (long_lived_token,))
 
-    def turn_of_token(self):
+    async def turn_of_token(self):
         """Выключаем возможность получать подписчиков из инсты"""
         query = """
                 update instagram_api_settings
@@ -56,31 +48,4 @@ class InstagramSettingsRepository:
                     is_active = false
                 where id = 1
                 """
-        self.db.execute(query, ())
-        self.db.commit()
-
-    def increment_filled_capacity(self, capacity: int) -> None:
-        """Инкрементит выполненные к инстаграм запрос"""
-        query = """
-                update instagram_api_settings 
-                set 
-                    filled_capacity = %s
-                where id = 1;
-                """
-
-        capacity += 1
-        self.db.execute(query, (capacity,))
-        self.db.commit()
-
-    def clear_filled_capacity(self):
-        """Очищает параметр количества Выполненных запросов"""
-        query = """
-                update instagram_api_settings 
-                set 
-                    filled_capacity = 0,
-                    last_updated_time = now()
-                where id = 1;
-                """
-
-        self.db.execute(query, ())
-        self.db.commit()
+        await self.db.execute(query, ())
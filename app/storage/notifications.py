@@ -0,0 +1,185 @@
+from typing import List, Tuple
+
+from psycopg.types.json import Jsonb
+
+from clients.postgres import Database
+from app.entities.notification import Notification
+
+
+class NotificationsRepository:
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def add_notifications(self, notifications: List[Tuple[str, dict]]):
+        """Кладет пачку уведомлений (метод, аргументы) в outbox одним запросом"""
+        if not notifications:
+            return
+
+        query = """
+                insert into notifications_outbox (kind, payload)
+                select kind, payload
+                from unnest(%s::varchar[], %s::jsonb[]) as n(kind, payload)
+                """
+        kinds = [kind for kind, _ in notifications]
+        payloads = [Jsonb(payload) for _, payload in notifications]
+        await self.db.execute(query, (kinds, payloads))
+
+    async def claim_pending(self, limit: int, lease_seconds: int) -> List[Notification]:
+        """
+        Берет в отправку до limit самых старых неотправленных уведомлений. Как и в очереди обновления
+        подписчиков, взятые строки сдвигаются на время аренды, поэтому параллельные отправители их не берут
+        """
+        query = """
+                with due as (
+                    select id
+                    from notifications_outbox
+                    where sent_at is null
+                      and next_attempt_at <= now()
+                    order by next_attempt_at, id
+                    limit %(limit)s
+                    for update skip locked
+                )
+                update notifications_outbox n
+                set next_attempt_at = now() + %(lease)s * interval '1 second',
+                    attempts        = n.attempts + 1
+                from due
+                where n.id = due.id
+                returning n.id, n.kind, n.payload, n.attempts
+                """
+        # взятие строк - запись, повторять при обрыве соединения нельзя
+        async with self.db.connection() as conn:
+            cursor = await conn.execute(query, {"limit": limit, "lease": lease_seconds})
+            rows = await cursor.fetchall()
+
+        notifications = [
+            Notification(id=row[0], kind=row[1], payload=row[2], attempts=row[3]) for row in rows
+        ]
+        return sorted(notifications, key=lambda notification: notification.id)
+
+    async def mark_sent(self, notification_ids: List[int]):
+        if not notification_ids:
+            return
+
+        query = """
+                update notifications_outbox
+                set sent_at    = now(),
+                    last_error = null
+                where id = any(%s)
+                """
+        await self.db.execute(query, (notification_ids,))
+
+    async def mark_failed(
+            self, notification_id: int, error: str, retry_base_seconds: int, retry_max_seconds: int, max_attempts: int
+    ):
+        """Повтор с экспоненциальной задержкой, после max_attempts попыток уведомление больше не отправляется"""
+        query = """
+                update notifications_outbox
+                set next_attempt_at = case
+                                          when attempts >= %(max_attempts)s then null
+                                          else now() + least(%(base)s * power(2, attempts - 1), %(max)s)
+                                                           * interval '1 second'
+                                      end,
+                    last_error      = %(error)s
+                where id = %(id)s
+                """
+        await self.db.execute(query, {
+            "id": notification_id,
+            "error": error,
+            "base": retry_base_seconds,
+            "max": retry_max_seconds,
+            "max_attempts": max_attempts,
+        })
+
+    async def release(self, notification_ids: List[int]):
+        """Уведомления не отправлялись (кончился лимит) - обратно в очередь, попытка не засчитывается"""
+        if not notification_ids:
+            return
+
+        query = """
+                update notifications_outbox
+                set next_attempt_at = now(),
+                    attempts        = greatest(attempts - 1, 0)
+                where id = any(%s)
+                """
+        await self.db.execute(query, (notification_ids,))
+
+    async def delete_sent(self, older_than_seconds: int) -> int:
+        """Чистит отправленные уведомления старше older_than_seconds"""
+        query = """
+                delete
+                from notifications_outbox
+                where sent_at < now() - %s * interval '1 second'
+                """
+        return await self.db.execute_with_result(query, (older_than_seconds,))
+
+    async def add_not_found_warnings(self, warnings: List[Tuple[int, str, str, str]]):
+        """
+        Сохраняет пачку предупреждений (доктор, соцсеть, причина, канал). Повтор того же предупреждения
+        только сдвигает last_seen_at, поэтому на доктора с причиной в таблице всегда одна строка
+        """
+        if not warnings:
+            return
+
+        query = """
+                insert into not_found_warnings (doctor_id, social_media, reason, channel_name)
+                select doctor_id, social_media, reason, channel_name
+                from unnest(%s::bigint[], %s::varchar[], %s::varchar[], %s::varchar[])
+                         as w(doctor_id, social_media, reason, channel_name)
+                on conflict (doctor_id, social_media, reason) do update
+                    set last_seen_at = now(),
+                        channel_name = excluded.channel_name
+                """
+        await self.db.execute(query, (
+            [warning[0] for warning in warnings],
+            [warning[1] for warning in warnings],
+            [warning[2] for warning in warnings],
+            [warning[3] for warning in warnings],
+        ))
+
+    async def add_not_found_digests(self, suppression_seconds: int) -> int:
+        """
+        Собирает из not_found_warnings по одной сводке на соцсеть и кладет их в outbox. В сводку попадают
+        предупреждения, о которых еще не сообщали или сообщали раньше suppression_seconds и которые с тех пор
+        повторились. Отметка и вставка в outbox - один запрос, поэтому сводка не теряется и не задваивается.
+        Возвращает количество сводок
+        """
+        query = """
+                with due as (
+                    select doctor_id, social_media, reason
+                    from not_found_warnings
+                    where notified_at is null
+                       or (notified_at <= now() - %s * interval '1 second' and last_seen_at > notified_at)
+                    for update skip locked
+                ),
+                notified as (
+                    update not_found_warnings w
+                    set notified_at = now()
+                    from due
+                    where w.doctor_id = due.doctor_id
+                      and w.social_media = due.social_media
+                      and w.reason = due.reason
+                    returning w.doctor_id, w.social_media, w.reason, w.channel_name
+                )
+                insert into notifications_outbox (kind, payload)
+                select 'send_not_found_digest',
+                       jsonb_build_object(
+                           'social_media', social_media,
+                           'doctors', jsonb_agg(
+                               jsonb_build_object('doctor_id', doctor_id, 'channel_name', channel_name, 'reason', reason)
+                               order by doctor_id
+                           )
+                       )
+                from notified
+                group by social_media
+                """
+        return await self.db.execute_with_result(query, (suppression_seconds,))
+
+    async def delete_stale_not_found_warnings(self, older_than_seconds: int) -> int:
+        """Доктор давно не попадал в не найденные - видимо, канал исправили, забываем предупреждение"""
+        query = """
+                delete
+                from not_found_warnings
+                where last_seen_at < now() - %s * interval '1 second'
+                """
+        return await self.db.execute_with_result(query, (older_than_seconds,))
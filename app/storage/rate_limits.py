@@ -0,0 +1,96 @@
+from typing import List, Optional
+
+from clients.postgres import Database
+from app.entities.rate_limit import RateLimitBucket, RateLimitReservation
+
+# сколько токенов в ведре сейчас: остаток плюс пополнение с последнего обновления, не больше емкости
+AVAILABLE_TOKENS = "least(capacity, tokens + extract(epoch from now() - updated_at) * refill_per_second)"
+
+
+class RateLimitsRepository:
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def ensure_bucket(self, bucket: str, capacity: float, refill_per_second: float):
+        """Создает ведро полным или обновляет его емкость и скорость, если поменялся конфиг"""
+        query = """
+                insert into rate_limit_buckets (bucket, capacity, refill_per_second, tokens, updated_at)
+                values (%(bucket)s, %(capacity)s, %(refill)s, %(capacity)s, now())
+                on conflict (bucket) do update set capacity          = excluded.capacity,
+                                                   refill_per_second = excluded.refill_per_second
+                where rate_limit_buckets.capacity != excluded.capacity
+                   or rate_limit_buckets.refill_per_second != excluded.refill_per_second
+                """
+        await self.db.execute(query, {"bucket": bucket, "capacity": capacity, "refill": refill_per_second})
+
+    async def reserve(self, bucket: str, tokens: float) -> RateLimitReservation:
+        """
+        Атомарно забирает tokens из ведра, если их хватает. Строка ведра блокируется на время запроса,
+        поэтому параллельные воркеры и процессы не могут потратить одни и те же токены
+        """
+        query = f"""
+                with current as (
+                    select bucket, {AVAILABLE_TOKENS} as available, refill_per_second
+                    from rate_limit_buckets
+                    where bucket = %(bucket)s
+                    for update
+                ),
+                reserved as (
+                    update rate_limit_buckets b
+                    set tokens     = c.available - %(tokens)s,
+                        updated_at = now()
+                    from current c
+                    where b.bucket = c.bucket
+                      and c.available >= %(tokens)s
+                    returning b.tokens
+                )
+                select c.available, c.refill_per_second, (select tokens from reserved)
+                from current c
+                """
+        # резервация - запись: повтор после обрыва соединения мог бы списать токены второй раз
+        async with self.db.connection() as conn:
+            cursor = await conn.execute(query, {"bucket": bucket, "tokens": tokens})
+            row = await cursor.fetchone()
+        if row is None:
+            raise KeyError(f"Ведро лимитов {bucket} не создано")
+
+        available, refill_per_second, remaining = row
+        if remaining is not None:
+            return RateLimitReservation(granted=True, remaining=remaining)
+
+        wait_seconds = (tokens - available) / refill_per_second if refill_per_second > 0 else float("inf")
+        return RateLimitReservation(granted=False, remaining=available, wait_seconds=wait_seconds)
+
+    async def drain(self, bucket: str, seconds: float):
+        """Уводит ведро в минус на seconds пополнения: внешний API сам попросил подождать (flood wait)"""
+        query = f"""
+                update rate_limit_buckets
+                set tokens     = least({AVAILABLE_TOKENS}, 0) - %(seconds)s * refill_per_second,
+                    updated_at = now()
+                where bucket = %(bucket)s
+                """
+        await self.db.execute(query, {"bucket": bucket, "seconds": seconds})
+
+    async def get_buckets(self, bucket: Optional[str] = None) -> List[RateLimitBucket]:
+        """Текущий остаток токенов во всех ведрах или в одном"""
+        query = f"""
+                select bucket, capacity, refill_per_second, {AVAILABLE_TOKENS}, updated_at
+                from rate_limit_buckets
+                """
+        params = {}
+        if bucket is not None:
+            query += " where bucket = %(bucket)s"
+            params = {"bucket": bucket}
+        query += " order by bucket"
+
+        results = await self.db.select(query, params)
+        return [
+            RateLimitBucket(
+                bucket=row[0],
+                capacity=row[1],
+                refill_per_second=row[2],
+                tokens=row[3],
+                updated_at=row[4],
+            ) for row in results
+        ]
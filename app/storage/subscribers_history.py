@@ -0,0 +1,172 @@
+import datetime
+import re
+from typing import List
+
+from clients.postgres import Database
+from app.entities.subscribers_history import HistoryPoint
+
+# имя месячной партиции истории: subscribers_history_2025_01
+PARTITION_NAME_RE = re.compile(r"^subscribers_history_(\d{4})_(\d{2})$")
+
+
+def add_months(month_start: datetime.date, months: int) -> datetime.date:
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class SubscribersHistoryRepository:
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def ensure_partitions(self, today: datetime.date, months_ahead: int) -> List[str]:
+        """
+        Создает партиции истории на текущий и months_ahead следующих месяцев. Возвращает имена созданных.
+        Ошибка одного месяца не останавливает остальные и свертку
+        """
+        created = []
+        month_start = today.replace(day=1)
+        for i in range(months_ahead + 1):
+            start = add_months(month_start, i)
+            try:
+                if await self._create_partition(start, add_months(start, 1)):
+                    created.append(f"subscribers_history_{start:%Y_%m}")
+            except Exception as ex:
+                print(f"Ошибка создания партиции истории за {start:%Y-%m}: {ex}")
+        return created
+
+    async def _create_partition(self, start: datetime.date, end: datetime.date) -> bool:
+        """
+        Создает партицию месяца одной транзакцией. Строки месяца, попавшие в партицию по умолчанию, пока партиции
+        не было, переносятся в нее перед подключением - иначе postgres не даст подключить партицию
+        """
+        # имя и границы считаются здесь же из дат, поэтому их можно подставить в DDL
+        name = f"subscribers_history_{start:%Y_%m}"
+        async with self.db.connection() as conn:
+            cursor = await conn.execute("select to_regclass(%s)", (name,))
+            if (await cursor.fetchone())[0] is not None:
+                return False
+
+            await conn.execute(f"create table {name} (like subscribers_history including defaults)")
+            await conn.execute(
+                f"""
+                with moved as (
+                    delete from subscribers_history_default
+                    where recorded_at >= %s
+                      and recorded_at < %s
+                    returning doctor_id, network, subscribers, recorded_at
+                )
+                insert into {name} (doctor_id, network, subscribers, recorded_at)
+                select doctor_id, network, subscribers, recorded_at
+                from moved
+                """,
+                (start, end),
+            )
+            await conn.execute(
+                f"alter table subscribers_history attach partition {name} for values from ('{start}') to ('{end}')"
+            )
+        return True
+
+    async def drop_partitions_before(self, cutoff: datetime.date) -> List[str]:
+        """Удаляет месячные партиции, все строки которых старше cutoff. Возвращает имена удаленных"""
+        query = """
+                select c.relname
+                from pg_inherits i
+                         join pg_class c on c.oid = i.inhrelid
+                         join pg_class p on p.oid = i.inhparent
+                where p.relname = 'subscribers_history'
+                """
+        rows = await self.db.select(query)
+
+        dropped = []
+        for row in rows or []:
+            match = PARTITION_NAME_RE.match(row[0])
+            if not match:
+                continue
+            month_end = add_months(datetime.date(int(match.group(1)), int(match.group(2)), 1), 1)
+            if month_end <= cutoff:
+                await self.db.execute(f"drop table if exists {row[0]}")
+                dropped.append(row[0])
+
+        # в партицию по умолчанию строки попадают редко, ее чистим построчно
+        await self.db.execute("delete from subscribers_history_default where recorded_at < %s", (cutoff,))
+        return dropped
+
+    async def rollup_daily(self) -> int:
+        """
+        Сворачивает сырые точки в последнее значение за день. Пересчитываются дни начиная с последнего
+        свернутого, поэтому текущий день досчитывается при каждом запуске, а пропущенные - после простоя
+        """
+        query = """
+                insert into subscribers_history_daily (doctor_id, network, day, subscribers)
+                select distinct on (doctor_id, network, recorded_at::date)
+                    doctor_id, network, recorded_at::date, subscribers
+                from subscribers_history
+                where recorded_at >= coalesce((select max(day) from subscribers_history_daily), '-infinity')
+                order by doctor_id, network, recorded_at::date, recorded_at desc
+                on conflict (doctor_id, network, day) do update
+                    set subscribers = excluded.subscribers
+                """
+        return await self.db.execute_with_result(query)
+
+    async def rollup_weekly(self) -> int:
+        """Сворачивает дневные значения в последнее значение за неделю, так же с последней свернутой недели"""
+        query = """
+                insert into subscribers_history_weekly (doctor_id, network, week, subscribers)
+                select distinct on (doctor_id, network, date_trunc('week', day))
+                    doctor_id, network, date_trunc('week', day)::date, subscribers
+                from subscribers_history_daily
+                where day >= coalesce((select max(week) from subscribers_history_weekly), '-infinity')
+                order by doctor_id, network, date_trunc('week', day), day desc
+                on conflict (doctor_id, network, week) do update
+                    set subscribers = excluded.subscribers
+                """
+        return await self.db.execute_with_result(query)
+
+    async def delete_daily_before(self, cutoff: datetime.date) -> int:
+        """Дневные значения старше cutoff уже есть в недельных"""
+        query = """
+                delete
+                from subscribers_history_daily
+                where day < %s
+                """
+        return await self.db.execute_with_result(query, (cutoff,))
+
+    async def get_daily(self, doctor_id: int, since: datetime.date) -> dict[str, List[HistoryPoint]]:
+        """
+        Дневные значения доктора с since по соцсетям, по возрастанию дня. Для каждой соцсети добавляется
+        последняя точка не позже since - от нее считается прирост за весь период
+        """
+        query = """
+                select network, day, subscribers
+                from (select network,
+                             day,
+                             subscribers,
+                             max(day) filter (where day <= %(since)s) over (partition by network) as base_day
+                      from subscribers_history_daily
+                      where doctor_id = %(doctor_id)s) d
+                where day >= coalesce(base_day, %(since)s)
+                order by network, day
+                """
+        return self._group_points(await self.db.select(query, {"doctor_id": doctor_id, "since": since}))
+
+    async def get_weekly(
+            self, doctor_id: int, since: datetime.date, until: datetime.date
+    ) -> dict[str, List[HistoryPoint]]:
+        """Недельные значения доктора с since до until по соцсетям, по возрастанию недели"""
+        query = """
+                select network, week, subscribers
+                from subscribers_history_weekly
+                where doctor_id = %s
+                  and week >= %s
+                  and week < %s
+                order by network, week
+                """
+        return self._group_points(await self.db.select(query, (doctor_id, since, until)))
+
+    @staticmethod
+    def _group_points(rows) -> dict[str, List[HistoryPoint]]:
+        points = {}
+        for network, day, subscribers in rows or []:
+            points.setdefault(network, []).append(HistoryPoint(day=day, subscribers=subscribers))
+        return points
@@ -0,0 +1,98 @@
+from typing import Dict, List, Optional, Tuple
+
+from clients.postgres import Database
+from app.entities.telegram_peer import TelegramPeer
+
+
+def normalize_username(username: str) -> str:
+    """Username в том виде, в котором его хранит pyrogram"""
+    return username.lower().lstrip("@")
+
+
+class TelegramPeersRepository:
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def update_peers(self, peers: List[Tuple[int, int, str, Optional[str], Optional[str]]]):
+        """
+        Сохраняет пиры в формате pyrogram: (id, access_hash, type, username, phone_number).
+        Username, перешедший к другому пиру, снимается со старого
+        """
+        if not peers:
+            return
+
+        query = """
+                with released as (
+                    update telegram_peers
+                    set username = null
+                    where username = %(username)s
+                      and peer_id != %(peer_id)s
+                )
+                insert into telegram_peers (peer_id, access_hash, type, username, phone_number, updated_at)
+                values (%(peer_id)s, %(access_hash)s, %(type)s, %(username)s, %(phone_number)s, now())
+                on conflict (peer_id) do update set access_hash  = excluded.access_hash,
+                                                    type         = excluded.type,
+                                                    username     = excluded.username,
+                                                    phone_number = excluded.phone_number,
+                                                    updated_at   = now()
+                """
+        # в одной пачке апдейтов пир может встречаться несколько раз, оставляем последний
+        unique_peers = {peer[0]: peer for peer in peers}
+        params = [
+            {
+                "peer_id": peer_id,
+                "access_hash": access_hash,
+                "type": peer_type,
+                "username": username,
+                "phone_number": phone_number,
+            } for peer_id, access_hash, peer_type, username, phone_number in unique_peers.values()
+        ]
+        async with self.db.connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.executemany(query, params)
+
+    async def _get_peer(self, condition: str, value) -> Optional[TelegramPeer]:
+        query = f"""
+                select peer_id, access_hash, type, username
+                from telegram_peers
+                where {condition} = %s
+                order by updated_at desc
+                limit 1
+                """
+        row = await self.db.select(query, (value,), fetch_one=True)
+        if row is None:
+            return None
+        return TelegramPeer(peer_id=row[0], access_hash=row[1], type=row[2], username=row[3])
+
+    async def get_peer_by_id(self, peer_id: int) -> Optional[TelegramPeer]:
+        return await self._get_peer("peer_id", peer_id)
+
+    async def get_peer_by_username(self, username: str) -> Optional[TelegramPeer]:
+        return await self._get_peer("username", normalize_username(username))
+
+    async def get_peers_by_usernames(self, usernames: List[str]) -> Dict[str, TelegramPeer]:
+        """Сохраненные пиры пачки username одним запросом, ключ - нормализованный username"""
+        query = """
+                select distinct on (username) peer_id, access_hash, type, username
+                from telegram_peers
+                where username = any(%s)
+                order by username, updated_at desc
+                """
+        results = await self.db.select(query, ([normalize_username(username) for username in usernames],))
+        return {
+            row[3]: TelegramPeer(peer_id=row[0], access_hash=row[1], type=row[2], username=row[3])
+            for row in results
+        }
+
+    async def get_peer_by_phone_number(self, phone_number: str) -> Optional[TelegramPeer]:
+        return await self._get_peer("phone_number", phone_number)
+
+    async def invalidate_username(self, username: str):
+        """Пир по username больше не валиден (канал удален, приватный или сменил адрес) - резолвим заново"""
+        query = """
+                delete
+                from telegram_peers
+                where username = %s
+                """
+        await self.db.execute(query, (normalize_username(username),))
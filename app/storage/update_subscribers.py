@@ -1,348 +1,283 @@
-from typing import List
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 from clients.postgres import Database
-from app.entities.doctor_subs import DoctorSubs, UpdatedSubsQueue
+from app.entities.doctor_subs import DoctorSubs
+from app.entities.messengers import SocialNetworkType
 
+# колонки doctors и поля DoctorSubs с каналом, подписчиками и временем обновления для каждой соцсети
+REFRESH_COLUMNS = {
+    SocialNetworkType.INSTAGRAM: (
+        ("instagram_channel_name", "inst_subs_count", "inst_last_updated"),
+        ("instagram_channel_name", "inst_subs_count", "inst_last_updated_timestamp"),
+    ),
+    SocialNetworkType.TELEGRAM: (
+        ("telegram_channel_name", "tg_subs_count", "tg_last_updated"),
+        ("telegram_channel_name", "tg_subs_count", "tg_last_updated_timestamp"),
+    ),
+    SocialNetworkType.YOUTUBE: (
+        ("youtube_channel_name", "youtube_subs_count", "youtube_last_updated"),
+        ("youtube_channel_name", "youtube_subs_count", "youtube_last_updated_timestamp"),
+    ),
+    SocialNetworkType.VK: (
+        ("vk_channel_name", "vk_subs_count", "vk_last_updated"),
+        ("vk_channel_name", "vk_subs_count", "vk_last_updated_timestamp"),
+    ),
+}
 
-class UpdateSubscribersRepository:
+# дополнительные колонки doctors и поля DoctorSubs, нужные для запроса подписчиков соцсети
+REFRESH_EXTRA_COLUMNS = {
+    SocialNetworkType.YOUTUBE: (("youtube_channel_id",), ("youtube_channel_id",)),
+}
 
-    def __init__(self):
-        self.db = Database()
 
-    def update_instagram_subscribers(self, doctor_id: int, subscribers: int):
-        """Обновляет количество подписчиков в Instagram"""
-        query = """
-                update doctors
-                set inst_subs_count   = %s,
-                    inst_last_updated = now()
-                where doctor_id = %s
-                """
-        self.db.execute(query, (subscribers, doctor_id))
-        self.db.commit()
+class UpdateSubscribersRepository:
 
-    def get_telegram_channels_with_offset(self, offset: int) -> List[DoctorSubs]:
-        """Получает список всех докторов с их Telegram-каналами с оффсетом и лимитом для обновления батчами"""
-        query = """
-                select id,
-                       doctor_id,
-                       telegram_channel_name,
-                       tg_subs_count,
-                       tg_last_updated,
-                       tg_has_subscribed
-                from doctors
-                where telegram_channel_name is not null
-                  and telegram_channel_name != ''
-                  and id > %s
-                  and tg_last_updated < now() - interval '1 day'
-                order by id
-                limit 2
-                """
+    def __init__(self, db: Database, flush_max_size: int = 500, flush_max_age_seconds: float = 5):
+        self.db = db
+        # вызываются после записи новых счетчиков подписчиков, получают doctor_id
+        self._update_listeners: List[Callable[[int], None]] = []
+        # буфер записи: счетчики и закрытые строки очереди копятся и пишутся пачкой одной транзакцией
+        self.flush_max_size = flush_max_size
+        self.flush_max_age_seconds = flush_max_age_seconds
+        # соцсеть -> doctor_id -> подписчики
+        self._pending_counts: Dict[SocialNetworkType, Dict[int, int]] = {}
+        # (doctor_id, соцсеть) -> (результат, через сколько секунд обновить снова)
+        self._pending_completed: Dict[Tuple[int, str], Tuple[str, int]] = {}
+        self._pending_since: Optional[float] = None
 
-        try:
-            result = self.db.select(query, (offset,))
-            return [
-                DoctorSubs(
-                    internal_id=row[0],
-                    doctor_id=row[1],
-                    telegram_channel_name=row[2],
-                    tg_subs_count=row[3] or 0,
-                    tg_last_updated_timestamp=row[4],
-                    tg_has_subscribed=row[5]
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching telegram channels with offset: {str(e)}")
-            raise
+    def add_update_listener(self, listener: Callable[[int], None]):
+        """Подписка на запись новых счетчиков подписчиков (сброс кэшей)"""
+        self._update_listeners.append(listener)
 
-    def update_telegram_subscribers(self, doctor_id: int, subscribers: int):
-        """Обновляет количество подписчиков в Telegram"""
-        query = """
-                update doctors
-                set tg_subs_count   = %s,
-                    tg_last_updated = now()
-                where doctor_id = %s
-                """
-        self.db.execute(query, (subscribers, doctor_id))
-        self.db.commit()
+    def _notify_updated(self, doctor_id: int):
+        for listener in self._update_listeners:
+            listener(doctor_id)
 
-    def update_tg_has_subscribed(self, doctor_id: int):
-        """Обновляет флаг подписки на Telegram"""
-        query = """
-                update doctors
-                set tg_has_subscribed = true
-                where doctor_id = %s
-                """
-        self.db.execute(query, (doctor_id,))
-        self.db.commit()
+    def _pending_size(self) -> int:
+        return sum(len(counts) for counts in self._pending_counts.values()) + len(self._pending_completed)
 
-    def commit_update_subscribers(self, subscribers_id: int, doctor_id: int):
-        """Коммитит обновление подписчиков в update_subscribers_queue"""
-        query = """
-                insert into update_subscribers_queue (id, last_updated_id, last_updated_at, id_in_subscribers)
-                values (1, %s, now(), %s)
-                on conflict (id) do update set last_updated_id   = excluded.last_updated_id,
-                                               last_updated_at   = now(),
-                                               id_in_subscribers = excluded.id_in_subscribers
-                """
-        self.db.execute(query, (doctor_id, subscribers_id))
-        self.db.commit()
+    def _mark_pending(self):
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
 
-    def get_last_updated_doctor(self) -> List[UpdatedSubsQueue]:
-        """Получение данных об обновлении подписчиков из update_subscribers_queue"""
-        query = """
-                select id, last_updated_id, id_in_subscribers, last_updated_at
-                from update_subscribers_queue;
-                """
+    async def flush_if_needed(self):
+        """Сбрасывает буфер, если он набрал flush_max_size записей или копится дольше flush_max_age_seconds"""
+        if self._pending_since is None:
+            return
+        if self._pending_size() >= self.flush_max_size \
+                or time.monotonic() - self._pending_since >= self.flush_max_age_seconds:
+            await self.flush()
 
-        try:
-            result = self.db.select(query)
-            # если никого нет, значит это первое обновление
-            if len(result) == 0:
-                doctors = self.get_telegram_channels_with_offset(0)
-                self.commit_update_subscribers(doctors[0].internal_id, doctors[0].doctor_id)
-                return []
+    def buffer_subscribers(self, network: SocialNetworkType, doctor_id: int, subscribers: int):
+        """Новое количество подписчиков, запишется в doctors при следующем сбросе буфера"""
+        self._pending_counts.setdefault(network, {})[doctor_id] = subscribers
+        self._mark_pending()
 
-            return [
-                UpdatedSubsQueue(
-                    _id=row[0],
-                    last_updated_id=row[1],
-                    id_in_subscribers=row[2],
-                    last_updated_at=row[3],
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching last_updated_doctor: {str(e)}")
-            raise
+    def buffer_complete_refresh(
+            self, doctor_id: int, network: SocialNetworkType, outcome: str, next_refresh_seconds: int
+    ):
+        """Строка очереди обработана, закроется при следующем сбросе буфера вместе со счетчиками"""
+        self._pending_completed[(doctor_id, network.value)] = (outcome, next_refresh_seconds)
+        self._mark_pending()
 
-    # TODO СДЕЛАТЬ НОРМАЛЬНО В 1 таблицу очередей и не дублировать
-    def commit_update_instagram_subscribers(self, subscribers_id: int, doctor_id: int):
-        """Коммитит обновление подписчиков в update_subscribers_queue"""
-        query = """
-                insert into update_instagram_subscribers_queue (id, last_updated_id, last_updated_at, id_in_subscribers)
-                values (1, %s, now(), %s)
-                on conflict (id) do update set last_updated_id   = excluded.last_updated_id,
-                                               last_updated_at   = now(),
-                                               id_in_subscribers = excluded.id_in_subscribers
-                """
-        self.db.execute(query, (doctor_id, subscribers_id))
-        self.db.commit()
+    def _restore_pending(self, counts, completed, pending_since: float):
+        """Возвращает в буфер записи неудавшегося сброса, не затирая добавленные за это время более новые"""
+        for network, doctor_counts in counts.items():
+            network_counts = self._pending_counts.setdefault(network, {})
+            for doctor_id, subscribers in doctor_counts.items():
+                network_counts.setdefault(doctor_id, subscribers)
+        for key, value in completed.items():
+            self._pending_completed.setdefault(key, value)
+        if self._pending_since is None or pending_since < self._pending_since:
+            self._pending_since = pending_since
 
-    def get_last_updated_instagram_doctor(self) -> List[UpdatedSubsQueue]:
-        """Получение данных об обновлении подписчиков из update_subscribers_queue"""
-        query = """
-                select id, last_updated_id, id_in_subscribers, last_updated_at
-                from update_instagram_subscribers_queue;
-                """
+    async def flush(self):
+        """
+        Сбрасывает буфер одной транзакцией: на каждую соцсеть один update doctors из unnest с точками истории,
+        и одним запросом закрывает строки очереди. Если транзакция упала, записи возвращаются в буфер
+        и пишутся следующим сбросом, а ошибка пробрасывается
+        """
+        counts, self._pending_counts = self._pending_counts, {}
+        completed, self._pending_completed = self._pending_completed, {}
+        pending_since, self._pending_since = self._pending_since, None
+        if not counts and not completed:
+            return
 
         try:
-            result = self.db.select(query)
-            # если никого нет, значит это первое обновление
-            if len(result) == 0:
-                doctors = self.get_instagram_channels_with_offset(0)
-                self.commit_update_instagram_subscribers(doctors[0].internal_id, doctors[0].doctor_id)
-                return []
-
-            return [
-                UpdatedSubsQueue(
-                    _id=row[0],
-                    last_updated_id=row[1],
-                    id_in_subscribers=row[2],
-                    last_updated_at=row[3],
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching last_updated_doctor: {str(e)}")
+            await self._write_pending(counts, completed)
+        except Exception:
+            self._restore_pending(counts, completed, pending_since)
             raise
 
-    def get_instagram_channels_with_offset(self, offset: int) -> List[DoctorSubs]:
-        """Получает список всех докторов с их INSTAGRAM-каналами с оффсетом и лимитом для обновления батчами"""
-        query = """
-                select id,
-                       doctor_id,
-                       instagram_channel_name,
-                       inst_subs_count,
-                       inst_last_updated
-                from doctors
-                where manual_inst_upgrade is false
-                  and instagram_channel_name is not null
-                  and instagram_channel_name != ''
-                  and id > %s
-                order by id
-                limit 2
-                """
+        for doctor_counts in counts.values():
+            for doctor_id in doctor_counts:
+                self._notify_updated(doctor_id)
 
-        try:
-            result = self.db.select(query, (offset,))
-            return [
-                DoctorSubs(
-                    internal_id=row[0],
-                    doctor_id=row[1],
-                    instagram_channel_name=row[2],
-                    inst_subs_count=row[3] or 0,
-                    inst_last_updated_timestamp=row[4]
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching telegram channels with offset: {str(e)}")
-            raise
+    async def _write_pending(
+            self, counts: Dict[SocialNetworkType, Dict[int, int]], completed: Dict[Tuple[int, str], Tuple[str, int]]
+    ):
+        async with self.db.connection() as conn:
+            for network, doctor_counts in counts.items():
+                _, subs_column, updated_column = REFRESH_COLUMNS[network][0]
+                query = f"""
+                        with updated as (
+                            update doctors d
+                            set {subs_column}   = u.subscribers,
+                                {updated_column} = now()
+                            from unnest(%(doctor_ids)s::bigint[], %(subscribers)s::int[]) as u(doctor_id, subscribers)
+                            where d.doctor_id = u.doctor_id
+                            returning d.doctor_id, u.subscribers
+                        )
+                        insert into subscribers_history (doctor_id, network, subscribers)
+                        select doctor_id, %(network)s, subscribers
+                        from updated
+                        """
+                await conn.execute(query, {
+                    "doctor_ids": list(doctor_counts.keys()),
+                    "subscribers": list(doctor_counts.values()),
+                    "network": network.value,
+                })
 
-    def commit_update_youtube_subscribers(self, subscribers_id: int, doctor_id: int):
-        """Коммитит обновление подписчиков в update_youtube_subscribers_queue"""
+            if completed:
+                query = """
+                        update subscribers_refresh_queue q
+                        set next_due_at  = now() + c.next_refresh_seconds * interval '1 second',
+                            attempts     = 0,
+                            last_outcome = c.outcome
+                        from unnest(%s::bigint[], %s::varchar[], %s::varchar[], %s::int[])
+                                 as c(doctor_id, network, outcome, next_refresh_seconds)
+                        where q.doctor_id = c.doctor_id
+                          and q.network = c.network
+                        """
+                await conn.execute(query, (
+                    [doctor_id for doctor_id, _ in completed],
+                    [network for _, network in completed],
+                    [outcome for outcome, _ in completed.values()],
+                    [next_refresh_seconds for _, next_refresh_seconds in completed.values()],
+                ))
+
+    async def update_tg_has_subscribed(self, doctor_id: int):
+        """Обновляет флаг подписки на Telegram"""
         query = """
-                insert into update_youtube_subscribers_queue (id, last_updated_id, last_updated_at, id_in_subscribers)
-                values (1, %s, now(), %s)
-                on conflict (id) do update set last_updated_id   = excluded.last_updated_id,
-                                               last_updated_at   = now(),
-                                               id_in_subscribers = excluded.id_in_subscribers
+                update doctors
+                set tg_has_subscribed = true
+                where doctor_id = %s
                 """
-        self.db.execute(query, (doctor_id, subscribers_id))
-        self.db.commit()
+        await self.db.execute(query, (doctor_id,))
 
-    def get_last_updated_youtube_doctor(self) -> List[UpdatedSubsQueue]:
-        """Получение данных об обновлении подписчиков из update_youtube_subscribers_queue"""
+    async def update_youtube_channel_id(self, doctor_id: int, channel_id: str):
+        """Сохраняет id канала ютуба, в который резолвится handle доктора"""
         query = """
-                select id, last_updated_id, id_in_subscribers, last_updated_at
-                from update_youtube_subscribers_queue;
+                update doctors
+                set youtube_channel_id = %s
+                where doctor_id = %s
                 """
+        await self.db.execute(query, (channel_id, doctor_id))
 
-        try:
-            result = self.db.select(query)
-            # если никого нет, значит это первое обновление
-            if len(result) == 0:
-                doctors = self.get_youtube_channels_with_offset(0)
-                self.commit_update_youtube_subscribers(doctors[0].internal_id, doctors[0].doctor_id)
-                return []
+    async def claim_refresh_batch(self, network: SocialNetworkType, limit: int, lease_seconds: int) -> List[DoctorSubs]:
+        """
+        Берет в работу до limit самых просроченных строк очереди соцсети. next_due_at строки - дедлайн уровня
+        обновления канала, поэтому при нехватке лимитов первыми берутся каналы, которые сильнее всего опоздали.
+        Строки, взятые другими воркерами, пропускаются (skip locked), взятые сдвигаются на время аренды:
+        если воркер упадет, строка снова станет доступна после lease_seconds.
+        Инстаграм докторов с ручным обновлением не берется, их строки убираются из очереди
+        """
+        (channel_column, count_column, updated_column), (channel_field, count_field, updated_field) = \
+            REFRESH_COLUMNS[network]
+        extra_columns, extra_fields = REFRESH_EXTRA_COLUMNS.get(network, ((), ()))
+        extra_select = "".join(f",\n                       d.{column}" for column in extra_columns)
 
-            return [
-                UpdatedSubsQueue(
-                    _id=row[0],
-                    last_updated_id=row[1],
-                    id_in_subscribers=row[2],
-                    last_updated_at=row[3],
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching YOUTUBE last_updated_doctor: {str(e)}")
-            raise
+        manual_filter = ""
+        skipped_query = ""
+        if network == SocialNetworkType.INSTAGRAM:
+            manual_filter = "and d.manual_inst_upgrade is not true"
+            skipped_query = """
+                skipped as (
+                    delete from subscribers_refresh_queue q
+                    using doctors d
+                    where d.doctor_id = q.doctor_id
+                      and q.network = %(network)s
+                      and q.next_due_at <= now()
+                      and d.manual_inst_upgrade is true
+                ),"""
 
-    def get_youtube_channels_with_offset(self, offset: int) -> List[DoctorSubs]:
-        """Получает список всех докторов с их YOUTUBE-каналами с оффсетом и лимитом для обновления батчами"""
-        query = """
-                select id,
-                       doctor_id,
-                       youtube_channel_name,
-                       youtube_subs_count,
-                       youtube_last_updated
-                from doctors
-                where youtube_channel_name is not null
-                  and youtube_channel_name != ''
-                  and id > %s
-                order by id
-                limit 2
+        query = f"""
+                with {skipped_query}
+                due as (
+                    select q.doctor_id
+                    from subscribers_refresh_queue q
+                    join doctors d on d.doctor_id = q.doctor_id
+                    where q.network = %(network)s
+                      and q.next_due_at <= now()
+                      {manual_filter}
+                    order by q.next_due_at
+                    limit %(limit)s
+                    for update of q skip locked
+                ),
+                claimed as (
+                    update subscribers_refresh_queue q
+                    set next_due_at     = now() + %(lease)s * interval '1 second',
+                        attempts        = q.attempts + 1,
+                        last_attempt_at = now()
+                    from due
+                    where q.doctor_id = due.doctor_id
+                      and q.network = %(network)s
+                    returning q.doctor_id, q.next_due_at
+                )
+                select d.id,
+                       d.doctor_id,
+                       d.{channel_column},
+                       d.{count_column},
+                       d.{updated_column},
+                       d.tg_has_subscribed,
+                       d.is_active{extra_select}
+                from claimed
+                join doctors d on d.doctor_id = claimed.doctor_id
+                order by d.{updated_column} nulls first
                 """
 
         try:
-            result = self.db.select(query, (offset,))
+            # взятие строк - запись, поэтому без повтора select при обрыве соединения:
+            # повтор мог бы взять вторую пачку, пока первая висит в аренде
+            async with self.db.connection() as conn:
+                cursor = await conn.execute(
+                    query, {"network": network.value, "limit": limit, "lease": lease_seconds}
+                )
+                result = await cursor.fetchall()
             return [
                 DoctorSubs(
                     internal_id=row[0],
                     doctor_id=row[1],
-                    youtube_channel_name=row[2],
-                    youtube_subs_count=row[3] or 0,
-                    youtube_last_updated_timestamp=row[4]
+                    tg_has_subscribed=row[5],
+                    is_active=bool(row[6]),
+                    **{channel_field: row[2] or "", count_field: row[3] or 0, updated_field: row[4]},
+                    **{field: value or "" for field, value in zip(extra_fields, row[7:])},
                 ) for row in result
             ]
         except Exception as e:
-            print(f"Error fetching YOUTUBE channels with offset: {str(e)}")
+            print(f"Error claiming {network.value} refresh batch: {str(e)}")
             raise
 
-    def update_youtube_subscribers(self, doctor_id: int, subscribers: int):
-        """Обновляет количество подписчиков в Telegram"""
+    async def fail_refresh(
+            self, doctor_id: int, network: SocialNetworkType, outcome: str, retry_base_seconds: int, retry_max_seconds: int
+    ):
+        """Попытка не удалась, повтор с экспоненциальной задержкой по числу попыток подряд"""
         query = """
-                update doctors
-                set youtube_subs_count   = %s,
-                    youtube_last_updated = now()
+                update subscribers_refresh_queue
+                set next_due_at  = now() + least(%s * power(2, greatest(attempts - 1, 0)), %s) * interval '1 second',
+                    last_outcome = %s
                 where doctor_id = %s
+                  and network = %s
                 """
-        self.db.execute(query, (subscribers, doctor_id))
-        self.db.commit()
-        
-    def commit_update_vk_subscribers(self, subscribers_id: int, doctor_id: int):
-        """Коммитит обновление подписчиков в update_vk_subscribers_queue"""
-        query = """
-                insert into update_vk_subscribers_queue (id, last_updated_id, last_updated_at, id_in_subscribers)
-                values (1, %s, now(), %s)
-                on conflict (id) do update set last_updated_id   = excluded.last_updated_id,
-                                               last_updated_at   = now(),
-                                               id_in_subscribers = excluded.id_in_subscribers
-                """
-        self.db.execute(query, (doctor_id, subscribers_id))
-        self.db.commit()
+        await self.db.execute(query, (retry_base_seconds, retry_max_seconds, outcome, doctor_id, network.value))
 
-    def get_last_updated_vk_doctor(self) -> List[UpdatedSubsQueue]:
-        """Получение данных об обновлении подписчиков из update_vk_subscribers_queue"""
+    async def release_refresh(self, doctor_id: int, network: SocialNetworkType):
+        """Возвращает взятую строку в очередь, попытка не засчитывается"""
         query = """
-                select id, last_updated_id, id_in_subscribers, last_updated_at
-                from update_vk_subscribers_queue;
-                """
-
-        try:
-            result = self.db.select(query)
-            # если никого нет, значит это первое обновление
-            if len(result) == 0:
-                doctors = self.get_vk_channels_with_offset(0)
-                self.commit_update_vk_subscribers(doctors[0].internal_id, doctors[0].doctor_id)
-                return []
-
-            return [
-                UpdatedSubsQueue(
-                    _id=row[0],
-                    last_updated_id=row[1],
-                    id_in_subscribers=row[2],
-                    last_updated_at=row[3],
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching vk last_updated_doctor: {str(e)}")
-            raise
-
-    def get_vk_channels_with_offset(self, offset: int) -> List[DoctorSubs]:
-        """Получает список всех докторов с их vk-каналами с оффсетом и лимитом для обновления батчами"""
-        query = """
-                select id,
-                       doctor_id,
-                       vk_channel_name,
-                       vk_subs_count,
-                       vk_last_updated
-                from doctors
-                where vk_channel_name is not null
-                  and vk_channel_name != ''
-                  and id > %s
-                order by id
-                limit 2
-                """
-
-        try:
-            result = self.db.select(query, (offset,))
-            return [
-                DoctorSubs(
-                    internal_id=row[0],
-                    doctor_id=row[1],
-                    vk_channel_name=row[2],
-                    vk_subs_count=row[3] or 0,
-                    vk_last_updated_timestamp=row[4]
-                ) for row in result
-            ]
-        except Exception as e:
-            print(f"Error fetching vk channels with offset: {str(e)}")
-            raise
-
-    def update_vk_subscribers(self, doctor_id: int, subscribers: int):
-        """Обновляет количество подписчиков в VK"""
-        query = """
-                update doctors
-                set vk_subs_count   = %s,
-                    vk_last_updated = now()
+                update subscribers_refresh_queue
+                set next_due_at = now(),
+                    attempts    = greatest(attempts - 1, 0)
                 where doctor_id = %s
+                  and network = %s
                 """
-        self.db.execute(query, (subscribers, doctor_id))
-        self.db.commit()
\ No newline at end of file
+        await self.db.execute(query, (doctor_id, network.value))
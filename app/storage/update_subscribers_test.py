@@ -0,0 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.entities.messengers import SocialNetworkType
+from app.storage.update_subscribers import UpdateSubscribersRepository
+
+
+class FailingDatabase:
+    def __init__(self, repository_holder):
+        self.repository_holder = repository_holder
+
+    @asynccontextmanager
+    async def connection(self):
+        # пока транзакция идет, другой воркер успевает положить в буфер более новое значение
+        self.repository_holder[0].buffer_subscribers(SocialNetworkType.VK, 1, 300)
+        raise ConnectionError("база недоступна")
+        yield
+
+
+def test_failed_flush_keeps_entries_in_buffer():
+    holder = []
+    repository = UpdateSubscribersRepository(FailingDatabase(holder))
+    holder.append(repository)
+    repository.buffer_subscribers(SocialNetworkType.VK, 1, 100)
+    repository.buffer_subscribers(SocialNetworkType.VK, 2, 200)
+    repository.buffer_complete_refresh(2, SocialNetworkType.VK, "updated", 3600)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(repository.flush())
+
+    # записи сброса вернулись, более новое значение не затерто
+    assert repository._pending_counts == {SocialNetworkType.VK: {1: 300, 2: 200}}
+    assert repository._pending_completed == {(2, "vk"): ("updated", 3600)}
+    assert repository._pending_since is not None
@@ -0,0 +1,89 @@
+import asyncio
+import random
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config.config import HttpConfig
+
+# на эти ответы запрос можно повторить: сервис перегружен или просит подождать
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# запрос до сервера не дошел - повторять безопасно даже не идемпотентный
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class HttpClient:
+    """
+    Общий асинхронный HTTP клиент внешних API. На каждый хост свой пул соединений с keep-alive,
+    поэтому запросы к одному API не открывают TCP+TLS заново и не отнимают соединения у других.
+    Запросы не блокируют event loop и отменяются вместе с задачей
+    """
+
+    def __init__(self, config: HttpConfig, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.config = config
+        # подменяется в тестах
+        self.transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _client(self, url: str) -> httpx.AsyncClient:
+        host = urlsplit(url).netloc
+        client = self._clients.get(host)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    self.config.read_timeout_seconds, connect=self.config.connect_timeout_seconds
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections_per_host,
+                    max_keepalive_connections=self.config.max_keepalive_connections_per_host,
+                    keepalive_expiry=self.config.keepalive_expiry_seconds,
+                ),
+                transport=self.transport,
+            )
+            self._clients[host] = client
+        return client
+
+    def _backoff(self, attempt: int) -> float:
+        """Экспоненциальная задержка с полным случайным разбросом, чтобы повторы воркеров не совпадали"""
+        return random.uniform(0, self.config.retry_backoff_seconds * 2 ** attempt)
+
+    async def request(
+            self, method: str, url: str, idempotent: Optional[bool] = None, **kwargs
+    ) -> httpx.Response:
+        """
+        Запрос с повторами. Неотправленный запрос повторяется всегда, после таймаута чтения и 5xx/429 -
+        только идемпотентный (по умолчанию GET). Ответ с ошибкой возвращается как есть, статус проверяет вызывающий
+        """
+        if idempotent is None:
+            idempotent = method.upper() == "GET"
+
+        client = self._client(url)
+        attempt = 0
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+            except NOT_SENT_ERRORS:
+                if attempt >= self.config.retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.config.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or not idempotent \
+                        or attempt >= self.config.retries:
+                    return response
+
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
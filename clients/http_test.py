@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+import pytest
+
+from clients.http import HttpClient
+from config.config import HttpConfig
+
+
+def _client(monkeypatch, handler):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr("clients.http.asyncio.sleep", no_sleep)
+    return HttpClient(HttpConfig(retries=2), transport=httpx.MockTransport(handler))
+
+
+def test_idempotent_request_is_retried(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) < 3 else 200)
+
+    client = _client(monkeypatch, handler)
+    response = asyncio.run(client.get("https://api.vk.com/method/groups.getById"))
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_post_is_retried_only_when_not_sent(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(503)
+
+    client = _client(monkeypatch, handler)
+    response = asyncio.run(client.post("https://chatter.salebot.pro/api/key/callback", data={"a": "1"}))
+
+    # после отказа в соединении повтор, ответ 503 на отправленный POST уже не повторяется
+    assert response.status_code == 503
+    assert len(calls) == 2
+
+
+def test_gives_up_after_retries(monkeypatch):
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    client = _client(monkeypatch, handler)
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client.get("https://graph.facebook.com/v23.0"))
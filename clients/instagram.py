@@ -1,11 +1,15 @@
-import requests
+import json
+from typing import List, Optional
 
 import instagrapi
 import instaloader
 
 from instagrapi import Client
 from instagrapi.exceptions import UserNotFound
+from app.exception.update_error import InvalidTokenError, RateLimitExceededError
 from config.config import app_config
+from clients.http import HttpClient
+from clients.rate_limiter import RateLimiter
 
 
 class AnonymousClient(object):
@@ -56,15 +60,82 @@ class WithLoginClient(object):
             raise e
 
 
+# Graph API принимает не больше 50 запросов в одном batch
+GRAPH_BATCH_MAX_SIZE = 50
+# код ошибки Graph API для невалидного или протухшего токена
+GRAPH_INVALID_TOKEN_CODE = 190
+# коды ошибок Graph API "слишком много запросов" - профиль есть, просто сейчас не ответили
+GRAPH_RATE_LIMIT_CODES = {4, 17, 32, 613, 80002}
+# количество подписчиков для профиля, на который Graph API ответил лимитом: запрос надо повторить позже
+GRAPH_RATE_LIMITED = -2
+# на сколько уводим ведро инстаграма в минус, когда Graph API сам ответил лимитом, секунды
+GRAPH_RATE_LIMIT_PENALTY_SECONDS = 600
+
+
+def _graph_error_code(body: dict) -> Optional[int]:
+    error = body.get("error") if isinstance(body, dict) else None
+    return error.get("code") if isinstance(error, dict) else None
+
+
+def parse_business_discovery_batch(items: List[Optional[dict]], size: int) -> List[int]:
+    """
+    Разбирает ответ batch запроса business_discovery в количества подписчиков в порядке запросов.
+    0 - профиль не найден, GRAPH_RATE_LIMITED - Graph API ответил лимитом,
+    -1 - элемент null (Graph API не успел его выполнить) или другая ошибка.
+    Протухший токен в любом элементе - InvalidTokenError: он общий на весь batch
+    """
+    counts = []
+    for index in range(size):
+        item = items[index] if index < len(items) else None
+        if not item:
+            counts.append(-1)
+            continue
+
+        try:
+            body = json.loads(item.get("body") or "{}")
+        except (ValueError, TypeError):
+            counts.append(-1)
+            continue
+
+        error_code = _graph_error_code(body)
+        if error_code == GRAPH_INVALID_TOKEN_CODE:
+            raise InvalidTokenError("instagram")
+        if error_code in GRAPH_RATE_LIMIT_CODES:
+            counts.append(GRAPH_RATE_LIMITED)
+            continue
+
+        try:
+            if item.get("code") == 200:
+                counts.append(int(body["business_discovery"]["followers_count"]))
+            elif item.get("code") == 400:
+                counts.append(0)
+            else:
+                counts.append(-1)
+        except (ValueError, KeyError, TypeError):
+            counts.append(-1)
+    return counts
+
+
 class InstagramGraphApiClient:
-    def __init__(self):
+    network = "inst"
+
+    def __init__(self, rate_limiter: RateLimiter, http_client: HttpClient):
         self.base_url = "https://graph.facebook.com/v23.0"
         self.app_id = app_config.instagramGraphApi.app_id
         self.app_secret = app_config.instagramGraphApi.app_secret
         self.fb_business_account_id = app_config.instagramGraphApi.fb_business_account_id
+        self.rate_limiter = rate_limiter
+        self.http_client = http_client
+        # лимит Graph API считается на бизнес аккаунт
+        self.credential = str(self.fb_business_account_id)
+
+    async def remaining_requests(self) -> float:
+        """Сколько запросов к Graph API можно сделать прямо сейчас"""
+        return await self.rate_limiter.remaining(self.network, self.credential)
 
-    def authenticate(self, short_lived_token: str) -> str:
+    async def authenticate(self, short_lived_token: str) -> str:
         """Получаем long lived access token"""
+        await self.rate_limiter.acquire(self.network, self.credential)
 
         url = f"{self.base_url}/oauth/access_token"
         params = {
@@ -74,38 +145,68 @@ class InstagramGraphApiClient:
             "fb_exchange_token": short_lived_token
         }
 
-        response = requests.get(url, params=params)
+        response = await self.http_client.get(url, params=params)
         if response.status_code == 200:
             return response.json()["access_token"]
         return ""
 
-    def _get_subscribers_count(self, username: str, token: str) -> int:
-        """Получаем количество подписчиков"""
-
-        params = {
-            "fields": f"business_discovery.username({username}){{followers_count}}",
-            "access_token": token
+    def _business_discovery_request(self, username: str) -> dict:
+        return {
+            "method": "GET",
+            "relative_url": (
+                f"{self.fb_business_account_id}"
+                f"?fields=business_discovery.username({username}){{followers_count}}"
+            ),
         }
 
-        url = f"{self.base_url}/{self.fb_business_account_id}"
-
-        response = requests.get(
-            url,
-            params=params,
-            timeout=10
-        )
-
-        if response.status_code == 400:
-            return 0
-        if response.status_code == 200:
-            data = response.json()
-            return int(data['business_discovery']['followers_count'])
-        return -1
+    async def get_profiles_subscribers(self, usernames: List[str], token: str) -> List[int]:
+        """
+        Количество подписчиков профилей в порядке usernames: 0 - профиль не найден, -1 - ошибка,
+        GRAPH_RATE_LIMITED - Graph API ответил лимитом. Протухший токен - InvalidTokenError,
+        лимит на весь batch - RateLimitExceededError.
+        Все профили уходят одним batch запросом к Graph API, но каждый его элемент Graph API считает
+        как отдельный запрос, поэтому и токенов берем столько же
+        """
+        if not usernames:
+            return []
+        if len(usernames) > GRAPH_BATCH_MAX_SIZE:
+            raise ValueError(f"в batch запросе Graph API не больше {GRAPH_BATCH_MAX_SIZE} запросов")
+
+        await self.rate_limiter.acquire(self.network, self.credential, len(usernames))
+
+        data = {
+            "batch": json.dumps([self._business_discovery_request(username) for username in usernames]),
+            "include_headers": "false",
+            "access_token": token,
+        }
 
-    def get_profile_subscribers(self, username: str, token: str) -> int:
+        # batch из одних GET запросов только читает, повторять безопасно
+        response = await self.http_client.post(self.base_url, data=data, idempotent=True)
+
+        # весь batch отклонен - смотрим, токен протух, лимит или другая ошибка запроса
+        if response.status_code != 200:
+            try:
+                error_code = _graph_error_code(response.json())
+            except ValueError:
+                error_code = None
+            if error_code == GRAPH_INVALID_TOKEN_CODE:
+                raise InvalidTokenError(self.network)
+            if error_code in GRAPH_RATE_LIMIT_CODES:
+                await self.rate_limiter.penalize(self.network, self.credential, GRAPH_RATE_LIMIT_PENALTY_SECONDS)
+                raise RateLimitExceededError(
+                    self.rate_limiter.bucket_name(self.network, self.credential), GRAPH_RATE_LIMIT_PENALTY_SECONDS
+                )
+            return [-1] * len(usernames)
+
+        subs_counts = parse_business_discovery_batch(response.json(), len(usernames))
+        if GRAPH_RATE_LIMITED in subs_counts:
+            # дальше Graph API будет отвечать так же, пусть все воркеры подождут
+            await self.rate_limiter.penalize(self.network, self.credential, GRAPH_RATE_LIMIT_PENALTY_SECONDS)
+        return subs_counts
+
+    async def get_profile_subscribers(self, username: str, token: str) -> int:
         """Получение количества подписчиков профиля"""
-
-        return self._get_subscribers_count(username, token)
+        return (await self.get_profiles_subscribers([username], token))[0]
 
     # def _get_accounts(self) -> Dict:
     #     """Шаг 1️⃣: Получаем список страниц и их токены"""
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from app.exception.update_error import InvalidTokenError
+from clients.instagram import parse_business_discovery_batch, GRAPH_RATE_LIMITED
+
+
+def _item(code, body):
+    return {"code": code, "body": json.dumps(body)}
+
+
+def test_parse_business_discovery_batch():
+    items = [
+        _item(200, {"business_discovery": {"followers_count": 1500, "id": "1"}}),
+        _item(400, {"error": {"code": 110, "message": "Invalid user id"}}),
+        _item(400, {"error": {"code": 4, "message": "Application request limit reached"}}),
+        None,
+        _item(500, {"error": {"code": 2}}),
+        _item(200, {"id": "1"}),
+        {"code": 200, "body": "not json"},
+    ]
+
+    # лимит - не "не найден", null, 500 и битый ответ - ошибки, последний запрос Graph API не вернул вовсе
+    assert parse_business_discovery_batch(items, 8) == [1500, 0, GRAPH_RATE_LIMITED, -1, -1, -1, -1, -1]
+
+
+def test_parse_business_discovery_batch_reports_invalid_token():
+    items = [
+        _item(200, {"business_discovery": {"followers_count": 1500, "id": "1"}}),
+        _item(400, {"error": {"code": 190, "message": "Error validating access token"}}),
+    ]
+
+    with pytest.raises(InvalidTokenError):
+        parse_business_discovery_batch(items, 2)
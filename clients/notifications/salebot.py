@@ -1,21 +1,44 @@
-import requests
+from typing import List
+
+import httpx
 
 from config.config import app_config
+from clients.http import HttpClient
+
+# сколько докторов перечисляем в сводке, остальные только считаем
+NOT_FOUND_DIGEST_MAX_LINES = 100
+NOT_FOUND_REASON_TITLES = {
+    "invalid_link": "ссылка вместо имени канала",
+    "zero_subscribers": "0 подписчиков",
+    "username_not_occupied": "канал не существует",
+}
+
+
+def format_not_found_digest(social_media: str, doctors: List[dict]) -> str:
+    """Текст сводки не найденных докторов одной соцсети"""
+    lines = [f"Не удалось получить подписчиков {social_media}: {len(doctors)}"]
+    for doctor in doctors[:NOT_FOUND_DIGEST_MAX_LINES]:
+        reason = NOT_FOUND_REASON_TITLES.get(doctor["reason"], doctor["reason"])
+        lines.append(f"doctorID: {doctor['doctor_id']}, username: {doctor['channel_name']} - {reason}")
+    if len(doctors) > NOT_FOUND_DIGEST_MAX_LINES:
+        lines.append(f"и еще {len(doctors) - NOT_FOUND_DIGEST_MAX_LINES}")
+    return "\n".join(lines)
 
 
 class SaleBotClient:
-    def __init__(self):
+    def __init__(self, http_client: HttpClient):
         self.SALEBOT_API_URL = f"https://chatter.salebot.pro/api/{app_config.salebot.api_key}/callback"
+        self.http_client = http_client
 
-    def send_message(self, data):
+    async def send_message(self, data):
         """Отправка сообщения ОБЯЗАТЕЛЬНО в data должны быть "message" и "client_id" """
         try:
-            response = requests.post(self.SALEBOT_API_URL, data=data)
+            response = await self.http_client.post(self.SALEBOT_API_URL, data=data)
             response.raise_for_status()
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             raise Exception(e)
 
-    def send_error_message(self, error_text: str, error_place: str):
+    async def send_error_message(self, error_text: str, error_place: str):
         """Отправка сообщения об ошибке"""
         data = {
             "error_place": error_place,
@@ -24,13 +47,9 @@ class SaleBotClient:
             "client_id": app_config.salebot.admin_chat_id
         }
 
-        try:
-            response = requests.post(self.SALEBOT_API_URL, data=data)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            raise Exception(e)
+        await self.send_message(data)
 
-    def send_warning_not_found_doctor(self, doctor_id: int, social_media: str, channel_name: str):
+    async def send_warning_not_found_doctor(self, doctor_id: int, social_media: str, channel_name: str):
         """Отправка уведомления о том, что не удалось получить количество подписчиков доктора"""
         data = {
             "doctor_id": doctor_id,
@@ -40,8 +59,13 @@ class SaleBotClient:
             "client_id": app_config.salebot.admin_chat_id
         }
 
-        try:
-            response = requests.post(self.SALEBOT_API_URL, data=data)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            raise Exception(e)
+        await self.send_message(data)
+
+    async def send_not_found_digest(self, social_media: str, doctors: List[dict]):
+        """
+        Сводка не найденных докторов одной соцсети. Уходит тем же сообщением, что и ошибки,
+        поэтому отдельный сценарий в salebot не нужен
+        """
+        await self.send_error_message(
+            format_not_found_digest(social_media, doctors), f"not_found_digest_{social_media}"
+        )
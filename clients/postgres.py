@@ -1,43 +1,97 @@
-import psycopg2
+import asyncio
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool
 from config.config import app_config
 
 
+class _ConnectionLost(Exception):
+    """Соединение оборвалось во время запроса, причина - в __cause__"""
+
+
 class Database:
+    """Асинхронный клиент к postgres поверх пула соединений"""
+
     def __init__(self):
-        self.conn = psycopg2.connect(
-            host=app_config.db.host,
-            port=app_config.db.port,
-            user=app_config.db.user,
-            password=app_config.db.password,
-            database=app_config.db.name
+        self.pool = AsyncConnectionPool(
+            kwargs={
+                "host": app_config.db.host,
+                "port": app_config.db.port,
+                "user": app_config.db.user,
+                "password": app_config.db.password,
+                "dbname": app_config.db.name,
+                "options": f"-c statement_timeout={app_config.db.statement_timeout_ms}",
+            },
+            min_size=app_config.db.pool_min_size,
+            max_size=app_config.db.pool_max_size,
+            timeout=app_config.db.pool_timeout,
+            reconnect_timeout=app_config.db.reconnect_timeout,
+            # перед выдачей соединения проверяем, что оно живое, мертвые пул пересоздает сам
+            check=AsyncConnectionPool.check_connection,
+            configure=self._configure_connection,
+            open=False,
         )
+        self._open_lock = asyncio.Lock()
+        self._is_opened = False
+
+    @staticmethod
+    async def _configure_connection(conn):
+        # подготовленные запросы живут на соединении, шаблонов фильтра больше дефолтных 100
+        conn.prepared_max = app_config.db.prepared_max
+
+    async def open(self):
+        if self._is_opened:
+            return
+        async with self._open_lock:
+            if not self._is_opened:
+                await self.pool.open()
+                self._is_opened = True
 
-    def execute(self, query: str, params=None):
-        with self.conn.cursor() as cursor:
+    async def close(self):
+        if self._is_opened:
+            await self.pool.close()
+            self._is_opened = False
+
+    @asynccontextmanager
+    async def connection(self):
+        """Соединение из пула. Транзакция коммитится при выходе и откатывается при ошибке"""
+        await self.open()
+        async with self.pool.connection() as conn:
+            yield conn
+
+    async def execute(self, query: str, params=None):
+        async with self.connection() as conn:
+            await conn.execute(query, params)
+
+    async def execute_with_result(self, query: str, params=None):
+        async with self.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return cursor.rowcount
+
+    async def select(self, query: str, params=None, fetch_one=False, prepare=None):
+        """
+        prepare=True - сразу готовить запрос на соединении (для запросов со стабильным текстом),
+        None - psycopg готовит сам после нескольких выполнений
+        """
+        try:
+            return await self._select(query, params, fetch_one, prepare)
+        except _ConnectionLost:
+            # соединение отвалилось между проверкой и запросом, читающий запрос можно повторить.
+            # Таймаут запроса и пустой пул не повторяем: повтор только добавил бы нагрузки перегруженной базе
             try:
-                cursor.execute(query, params)
-                self.conn.commit()
-            except Exception as e:
-                self.conn.rollback()
-                raise e
-
-    def execute_with_result(self, query: str, params=None):
-        with self.conn.cursor() as cursor:
+                return await self._select(query, params, fetch_one, prepare)
+            except _ConnectionLost as ex:
+                raise ex.__cause__
+
+    async def _select(self, query: str, params=None, fetch_one=False, prepare=None):
+        async with self.connection() as conn:
             try:
-                cursor.execute(query, params)
-                self.conn.commit()
-                affected_rows = cursor.rowcount
-                return affected_rows
-            except Exception as e:
-                self.conn.rollback()
-                raise e
-
-    def select(self, query: str, params=None, fetch_one=False):
-        with self.conn.cursor() as cursor:
-            cursor.execute(query, params)
-            if fetch_one:
-                return cursor.fetchone()
-            return cursor.fetchall()
-
-    def commit(self):
-        self.conn.commit()
+                cursor = await conn.execute(query, params, prepare=prepare)
+                if fetch_one:
+                    return await cursor.fetchone()
+                return await cursor.fetchall()
+            except psycopg.OperationalError as ex:
+                if conn.broken:
+                    raise _ConnectionLost() from ex
+                raise
@@ -0,0 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import psycopg
+import pytest
+
+from clients.postgres import Database
+
+
+class FakeCursor:
+    async def fetchall(self):
+        return [(1,)]
+
+
+class FakeConnection:
+    def __init__(self, error=None, broken=False):
+        self.error = error
+        self.broken = broken
+
+    async def execute(self, query, params=None, prepare=None):
+        if self.error:
+            raise self.error
+        return FakeCursor()
+
+
+def _database(connections):
+    database = Database()
+    calls = []
+
+    @asynccontextmanager
+    async def connection():
+        calls.append(1)
+        yield connections[len(calls) - 1]
+
+    database.connection = connection
+    return database, calls
+
+
+def test_select_is_retried_when_connection_is_lost():
+    database, calls = _database([
+        FakeConnection(psycopg.OperationalError("server closed the connection"), broken=True),
+        FakeConnection(),
+    ])
+
+    assert asyncio.run(database.select("select 1")) == [(1,)]
+    assert len(calls) == 2
+
+
+def test_select_timeout_is_not_retried():
+    database, calls = _database([
+        FakeConnection(psycopg.errors.QueryCanceled("canceling statement due to statement timeout")),
+        FakeConnection(),
+    ])
+
+    # таймаут запроса не повторяем, соединение живое
+    with pytest.raises(psycopg.errors.QueryCanceled):
+        asyncio.run(database.select("select 1"))
+    assert len(calls) == 1
+
+
+def test_select_reraises_original_error_when_retry_also_loses_connection():
+    error = psycopg.OperationalError("server closed the connection")
+    database, calls = _database([FakeConnection(error, broken=True), FakeConnection(error, broken=True)])
+
+    with pytest.raises(psycopg.OperationalError):
+        asyncio.run(database.select("select 1"))
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Dict, List
+
+from app.entities.rate_limit import RateLimitBucket
+from app.exception.update_error import RateLimitExceededError
+from config.config import RateLimitConfig
+
+# меньше не спим: иначе из-за округления можно крутиться в цикле с микроскопическими ожиданиями
+MIN_WAIT_SECONDS = 0.05
+
+
+class RateLimiter:
+    """
+    Общий для всех внешних клиентов token bucket лимитер. Состояние ведер хранится в postgres,
+    поэтому переживает рестарты и делится между процессами. Ведро - пара (соцсеть, учетные данные)
+    """
+
+    def __init__(self, repository, limits: Dict[str, RateLimitConfig], max_wait_seconds: float):
+        self.repository = repository
+        # соцсеть -> емкость и скорость пополнения ее ведер
+        self.limits = limits
+        # дольше не ждем токены, а отказываем - пусть очередь вернет канал позже
+        self.max_wait_seconds = max_wait_seconds
+        self._ensured: set[str] = set()
+        self._ensure_lock = asyncio.Lock()
+
+    @staticmethod
+    def bucket_name(network: str, credential: str) -> str:
+        return f"{network}:{credential}"
+
+    async def _ensure(self, network: str, credential: str) -> str:
+        bucket = self.bucket_name(network, credential)
+        if bucket in self._ensured:
+            return bucket
+        async with self._ensure_lock:
+            if bucket not in self._ensured:
+                limit = self.limits[network]
+                await self.repository.ensure_bucket(bucket, limit.capacity, limit.refill_per_second)
+                self._ensured.add(bucket)
+        return bucket
+
+    async def acquire(self, network: str, credential: str, tokens: float = 1):
+        """
+        Берет tokens из ведра, при нехватке ждет пополнения.
+        Если ждать дольше max_wait_seconds - RateLimitExceededError
+        """
+        bucket = await self._ensure(network, credential)
+        waited = 0.0
+        while True:
+            reservation = await self.repository.reserve(bucket, tokens)
+            if reservation.granted:
+                return
+            if waited + reservation.wait_seconds > self.max_wait_seconds:
+                raise RateLimitExceededError(bucket=bucket, wait_seconds=reservation.wait_seconds)
+            wait_seconds = max(reservation.wait_seconds, MIN_WAIT_SECONDS)
+            await asyncio.sleep(wait_seconds)
+            waited += wait_seconds
+
+    async def penalize(self, network: str, credential: str, seconds: float):
+        """API попросил подождать seconds - ведро уходит в минус, ждут все воркеры и процессы"""
+        bucket = await self._ensure(network, credential)
+        await self.repository.drain(bucket, seconds)
+
+    async def remaining(self, network: str, credential: str) -> float:
+        """Сколько токенов можно потратить прямо сейчас"""
+        bucket = await self._ensure(network, credential)
+        buckets = await self.repository.get_buckets(bucket)
+        return buckets[0].tokens if buckets else 0
+
+    async def get_buckets(self) -> List[RateLimitBucket]:
+        return await self.repository.get_buckets()
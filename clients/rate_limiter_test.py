@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from app.entities.rate_limit import RateLimitReservation
+from app.exception.update_error import RateLimitExceededError
+from clients.rate_limiter import RateLimiter
+from config.config import RateLimitConfig
+
+
+class Repository:
+    """Ведро в памяти с ручным временем вместо rate_limit_buckets"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.now = 0.0
+        self.ensure_calls = 0
+
+    async def ensure_bucket(self, bucket, capacity, refill_per_second):
+        self.ensure_calls += 1
+        self.buckets.setdefault(bucket, [capacity, refill_per_second, capacity, self.now])
+
+    def _available(self, bucket):
+        capacity, refill, tokens, updated_at = self.buckets[bucket]
+        return min(capacity, tokens + (self.now - updated_at) * refill)
+
+    async def reserve(self, bucket, tokens):
+        available = self._available(bucket)
+        if available >= tokens:
+            self.buckets[bucket][2:] = [available - tokens, self.now]
+            return RateLimitReservation(granted=True, remaining=available - tokens)
+        return RateLimitReservation(granted=False, remaining=available,
+                                    wait_seconds=(tokens - available) / self.buckets[bucket][1])
+
+    async def drain(self, bucket, seconds):
+        self.buckets[bucket][2:] = [min(self._available(bucket), 0) - seconds * self.buckets[bucket][1], self.now]
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    repository = Repository()
+
+    async def fake_sleep(seconds):
+        repository.now += seconds
+
+    monkeypatch.setattr("clients.rate_limiter.asyncio.sleep", fake_sleep)
+    return RateLimiter(repository, {"vk": RateLimitConfig(capacity=3, refill_per_second=3)}, max_wait_seconds=5)
+
+
+def test_acquire_waits_for_refill(limiter):
+    async def scenario():
+        for _ in range(9):
+            await limiter.acquire("vk", "default")
+
+    asyncio.run(scenario())
+    # 3 токена сразу, остальные 6 по 3 в секунду
+    assert limiter.repository.now == pytest.approx(2, abs=0.2)
+    assert limiter.repository.ensure_calls == 1
+
+
+def test_acquire_fails_when_wait_is_too_long(limiter):
+    async def scenario():
+        await limiter.penalize("vk", "default", 60)
+        await limiter.acquire("vk", "default")
+
+    with pytest.raises(RateLimitExceededError):
+        asyncio.run(scenario())
@@ -1,27 +1,51 @@
+import asyncio
+from typing import Dict, List, Optional
+
 import pyrogram
+from pyrogram import raw, utils
 from pyrogram.errors.exceptions import FloodWait, UserAlreadyParticipant, UsernameNotOccupied
+from pyrogram.errors import ChannelInvalid, ChannelPrivate, PeerIdInvalid, UsernameInvalid
 from app.exception.update_error import FloodWaitError, UsernameNotOccupiedError
 from app.exception.domain_error import IsNotTelegramChannel
 from config.config import app_config
+from clients.rate_limiter import RateLimiter
+from clients.telegram_storage import PostgresPeerStorage
+from app.storage.telegram_peers import normalize_username
 
 CLIENT_NAME = "medblogers_base"
+# сохраненный пир канала больше не подходит (сменился access_hash, канал стал приватным или удален)
+PEER_INVALID_ERRORS = (ChannelInvalid, ChannelPrivate, PeerIdInvalid)
+# типы пиров pyrogram, у которых есть количество участников
+CHANNEL_PEER_TYPES = ("channel", "supergroup")
 
 
 class TelegramClient(object):
     client: pyrogram.Client
+    network = "tg"
 
-    def __init__(self):
+    def __init__(self, rate_limiter: RateLimiter, peers_repository):
         self.client = pyrogram.Client(
             name=CLIENT_NAME,
             api_id=app_config.telegram.app_id,
             api_hash=app_config.telegram.app_hash,
         )
+        # пиры каналов храним в postgres: username не резолвится на каждом обновлении и после рестарта
+        self.peers_repository = peers_repository
+        self.client.storage = PostgresPeerStorage(CLIENT_NAME, self.client.workdir, peers_repository)
         self._is_connected = False
+        # воркеры обновления работают параллельно, клиент должен стартовать один раз
+        self._start_lock = asyncio.Lock()
+        self.rate_limiter = rate_limiter
+        # flood control телеграма считается на аккаунт, аккаунт один на приложение
+        self.credential = str(app_config.telegram.app_id)
 
     async def start(self):
-        if not self._is_connected:
-            await self.client.start()
-            self._is_connected = True
+        if self._is_connected:
+            return
+        async with self._start_lock:
+            if not self._is_connected:
+                await self.client.start()
+                self._is_connected = True
 
     # async def _get_subs_from_closed_channel(self, chat_id):
     #     """Получение подписчиков из закрытого канала"""
@@ -38,19 +62,94 @@ class TelegramClient(object):
             await self.start()
 
         try:
+            await self.rate_limiter.acquire(self.network, self.credential)
             channel = await self.client.join_chat(chat_id)
             return True
+        except FloodWait as e:
+            await self.rate_limiter.penalize(self.network, self.credential, e.value)
+            return False
         except Exception as ex:
             return False
 
     async def _get_subs_from_open_channel(self, chat_id):
         """Получение подписчиков из открытого канала"""
+        await self.rate_limiter.acquire(self.network, self.credential)
         channel = await self.client.get_chat(chat_id)
         if not channel.members_count:
             raise IsNotTelegramChannel(channel_name=chat_id)
 
         return channel.members_count
 
+    async def _resolve_input_channel(self, username: str) -> Optional[raw.types.InputChannel]:
+        """Резолв username, которого еще нет в кэше пиров. None - username занят не каналом"""
+        await self.rate_limiter.acquire(self.network, self.credential)
+        input_peer = await self.client.resolve_peer(username)
+        if not isinstance(input_peer, raw.types.InputPeerChannel):
+            return None
+        return raw.types.InputChannel(channel_id=input_peer.channel_id, access_hash=input_peer.access_hash)
+
+    async def get_chats_subscribers(self, usernames: List[str]) -> Dict[str, Optional[int]]:
+        """
+        Подписчики пачки каналов одним запросом channels.getChannels по сохраненным пирам.
+        0 - username никем не занят, None - количества участников в ответе нет,
+        такой канал надо запросить отдельно через get_chat_subscribers
+        """
+        await self.start()
+
+        subs_counts: Dict[str, Optional[int]] = {username: None for username in usernames}
+        try:
+            peers = await self.peers_repository.get_peers_by_usernames(usernames)
+
+            # raw id канала -> usernames докторов, которые на него ссылаются
+            channel_usernames: Dict[int, List[str]] = {}
+            input_channels = {}
+            for username in usernames:
+                peer = peers.get(normalize_username(username))
+                if peer is not None:
+                    if peer.type not in CHANNEL_PEER_TYPES:
+                        continue
+                    input_channel = raw.types.InputChannel(
+                        channel_id=utils.get_channel_id(peer.peer_id), access_hash=peer.access_hash
+                    )
+                else:
+                    try:
+                        # пира еще нет - единственный резолв username, дальше канал адресуется по пиру
+                        input_channel = await self._resolve_input_channel(username)
+                    except (UsernameNotOccupied, UsernameInvalid):
+                        await self.peers_repository.invalidate_username(username)
+                        subs_counts[username] = 0
+                        continue
+                    except PEER_INVALID_ERRORS:
+                        continue
+                    if input_channel is None:
+                        continue
+
+                channel_usernames.setdefault(input_channel.channel_id, []).append(username)
+                input_channels[input_channel.channel_id] = input_channel
+
+            if not input_channels:
+                return subs_counts
+
+            await self.rate_limiter.acquire(self.network, self.credential)
+            result = await self.client.invoke(raw.functions.channels.GetChannels(id=list(input_channels.values())))
+        except PEER_INVALID_ERRORS:
+            # один протухший пир валит весь запрос - каналы пачки уходят в полный запрос по одному,
+            # там пир переразрешится
+            return subs_counts
+        except FloodWait as e:
+            # телеграм сам сказал, сколько ждать - не даем делать запросы никому до конца ожидания
+            await self.rate_limiter.penalize(self.network, self.credential, e.value)
+            raise FloodWaitError(duration_in_seconds=e.value)
+
+        for chat in result.chats:
+            # ChannelForbidden и каналы без participants_count остаются None и уходят в полный запрос
+            participants_count = getattr(chat, "participants_count", None)
+            if not participants_count:
+                continue
+            for username in channel_usernames.get(chat.id, []):
+                subs_counts[username] = participants_count
+        return subs_counts
+
     async def get_chat_subscribers(self, chat_id: str, has_subscribed: bool) -> int:
         """Получение количества подписчиков канала"""
 
@@ -60,10 +159,18 @@ class TelegramClient(object):
         try:
             if not has_subscribed:
                 await self.subscribe_to_channel(chat_id)
-            return await self._get_subs_from_open_channel(chat_id)
+            try:
+                return await self._get_subs_from_open_channel(chat_id)
+            except PEER_INVALID_ERRORS:
+                # канал адресуется по сохраненному пиру, если он протух - один раз резолвим username заново
+                await self.peers_repository.invalidate_username(chat_id)
+                return await self._get_subs_from_open_channel(chat_id)
         except FloodWait as e:
+            # телеграм сам сказал, сколько ждать - не даем делать запросы никому до конца ожидания
+            await self.rate_limiter.penalize(self.network, self.credential, e.value)
             raise FloodWaitError(duration_in_seconds=e.value)
-        except UsernameNotOccupied:
+        except (UsernameNotOccupied, UsernameInvalid):
+            await self.peers_repository.invalidate_username(chat_id)
             raise UsernameNotOccupiedError(username=chat_id)
         except Exception as e:
             print(f"Error getting subscribers in TelegramClient.get_chat_subscribers: {e}")
@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from pyrogram.storage import FileStorage
+from pyrogram.storage.sqlite_storage import get_input_peer
+
+
+class PostgresPeerStorage(FileStorage):
+    """
+    Сессия pyrogram, у которой пиры лежат в postgres (telegram_peers), а не в sqlite файле сессии.
+    Ключ авторизации по-прежнему в файле. В отличие от sqlite, пир по username не протухает через 8 часов:
+    его сбрасывает TelegramClient, когда телеграм говорит, что пир невалиден
+    """
+
+    def __init__(self, name: str, workdir: Path, peers_repository):
+        super().__init__(name, workdir)
+        self.peers_repository = peers_repository
+
+    async def update_peers(self, peers: List[Tuple[int, int, str, Optional[str], Optional[str]]]):
+        await self.peers_repository.update_peers(peers)
+
+    async def get_peer_by_id(self, peer_id: int):
+        # resolve_peer сначала пробует строку как id
+        if not isinstance(peer_id, int):
+            raise KeyError(f"ID not found: {peer_id}")
+
+        peer = await self.peers_repository.get_peer_by_id(peer_id)
+        if peer is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return get_input_peer(peer.peer_id, peer.access_hash, peer.type)
+
+    async def get_peer_by_username(self, username: str):
+        peer = await self.peers_repository.get_peer_by_username(username)
+        if peer is None:
+            raise KeyError(f"Username not found: {username}")
+        return get_input_peer(peer.peer_id, peer.access_hash, peer.type)
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        peer = await self.peers_repository.get_peer_by_phone_number(phone_number)
+        if peer is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return get_input_peer(peer.peer_id, peer.access_hash, peer.type)
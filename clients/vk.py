@@ -1,34 +1,88 @@
-import requests
+from typing import List
 
-from urllib.parse import urlencode
+import httpx
 
 from config.config import app_config
+from clients.http import HttpClient
+from clients.rate_limiter import RateLimiter
+
+# сколько сообществ принимает один groups.getById
+GROUPS_GET_BY_ID_MAX_IDS = 500
+# код ошибки VK API "параметр не передан или неверен" - сообщества с таким адресом нет
+VK_INVALID_PARAM_CODE = 100
+
+
+def _group_aliases(group: dict) -> set:
+    """Все варианты адреса, по которым могли сохранить сообщество: короткое имя, id, club<id>, public<id>"""
+    group_id = group.get("id")
+    aliases = {str(group_id), f"club{group_id}", f"public{group_id}", f"event{group_id}"}
+    if group.get("screen_name"):
+        aliases.add(group["screen_name"].lower())
+    return aliases
+
+
+def parse_groups_members_counts(data: dict, usernames: List[str]) -> List[int]:
+    """
+    Разбирает ответ groups.getById в подписчиков сообществ в порядке usernames.
+    0 - сообщество не найдено или количество участников скрыто, -1 - ошибка запроса
+    """
+    if "error" in data:
+        if data["error"].get("error_code") == VK_INVALID_PARAM_CODE:
+            return [0] * len(usernames)
+        return [-1] * len(usernames)
+
+    response = data.get("response") or []
+    # с версии 5.194 сообщества лежат в response.groups, раньше response был списком
+    groups = response.get("groups", []) if isinstance(response, dict) else response
+
+    members_counts = {}
+    for group in groups:
+        for alias in _group_aliases(group):
+            members_counts[alias] = group.get("members_count") or 0
+
+    return [members_counts.get(username.lower().lstrip("@"), 0) for username in usernames]
 
 
 class VkClient:
-    api_url = "https://api.vk.com/method/groups.getMembers"
+    api_url = "https://api.vk.com/method/groups.getById"
     app_version = 5.199
+    network = "vk"
+    credential = "default"
+
+    def __init__(self, rate_limiter: RateLimiter, http_client: HttpClient):
+        self.rate_limiter = rate_limiter
+        self.http_client = http_client
 
-    def get_subscribers_count(self, username: str) -> int:
-        """Получение подписчиков паблика в вк"""
+    async def get_subscribers_counts(self, usernames: List[str]) -> List[int]:
+        """
+        Подписчики пачки пабликов в вк одним запросом groups.getById, в порядке usernames.
+        Запрос один, поэтому и токен из лимита запросов в секунду берется один
+        """
+        if not usernames:
+            return []
+        if len(usernames) > GROUPS_GET_BY_ID_MAX_IDS:
+            raise ValueError(f"в groups.getById не больше {GROUPS_GET_BY_ID_MAX_IDS} сообществ")
 
-        params = {
+        await self.rate_limiter.acquire(self.network, self.credential)
+
+        # список сообществ может быть длинным, поэтому параметры уходят в теле запроса
+        data = {
             'access_token': app_config.vk.api_key,
-            'group_id': username,
+            'group_ids': ",".join(username.lstrip("@") for username in usernames),
+            'fields': 'members_count',
             'v': self.app_version
         }
 
-        url = f"{self.api_url}?{urlencode(params)}"
-
         try:
-            response = requests.get(url)
+            # groups.getById только читает, повторять безопасно
+            response = await self.http_client.post(self.api_url, data=data, idempotent=True)
             response.raise_for_status()
-            data = response.json()
-
-            if 'error' in data:
-                return 0
+            return parse_groups_members_counts(response.json(), usernames)
 
-            return data['response']['count']
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Error getting subscribers in VkClient.get_subscribers_counts: {e}")
+            return [-1] * len(usernames)
 
-        except Exception as e:
-            return -1
+    async def get_subscribers_count(self, username: str) -> int:
+        """Получение подписчиков паблика в вк с учетом лимита запросов к API"""
+        return (await self.get_subscribers_counts([username]))[0]
@@ -0,0 +1,25 @@
+from clients.vk import parse_groups_members_counts
+
+
+def test_parse_groups_members_counts():
+    data = {
+        "response": {
+            "groups": [
+                {"id": 1, "screen_name": "ReadyDoctor", "members_count": 1200},
+                {"id": 22, "screen_name": "club22", "members_count": 50},
+                {"id": 333, "screen_name": "closed_group"},
+            ],
+            "profiles": [],
+        }
+    }
+
+    usernames = ["readydoctor", "@ReadyDoctor", "public22", "closed_group", "missing"]
+    assert parse_groups_members_counts(data, usernames) == [1200, 1200, 50, 0, 0]
+
+
+def test_parse_groups_members_counts_errors():
+    invalid = {"error": {"error_code": 100, "error_msg": "group_ids is undefined"}}
+    expired = {"error": {"error_code": 5, "error_msg": "User authorization failed"}}
+
+    assert parse_groups_members_counts(invalid, ["a", "b"]) == [0, 0]
+    assert parse_groups_members_counts(expired, ["a", "b"]) == [-1, -1]
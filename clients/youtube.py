@@ -1,32 +1,121 @@
+import asyncio
+import threading
+from typing import Dict, List
+
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from config.config import app_config
+from clients.rate_limiter import RateLimiter
+from app.exception.update_error import RateLimitExceededError
+
+# стоимость channels.list в единицах квоты YouTube Data API
+CHANNELS_LIST_COST = 1
+# сколько id каналов принимает один channels.list
+CHANNELS_LIST_MAX_IDS = 50
+# причины 403, при которых запросы бесполезны до пополнения квоты
+QUOTA_EXCEEDED_REASONS = {"quotaExceeded", "dailyLimitExceeded", "rateLimitExceeded", "userRateLimitExceeded"}
+# на сколько остановить запросы после ответа о превышении квоты
+QUOTA_EXCEEDED_PENALTY_SECONDS = 3600
+
+
+def is_quota_exceeded(error: HttpError) -> bool:
+    """403 из-за квоты или лимита запросов, а не из-за запрета доступа"""
+    if error.status_code != 403 or not isinstance(error.error_details, list):
+        return False
+    return any(
+        isinstance(detail, dict) and detail.get("reason") in QUOTA_EXCEEDED_REASONS
+        for detail in error.error_details
+    )
 
 
 class YouTubeClient:
-    def __init__(self):
+    network = "youtube"
+    credential = "default"
+
+    def __init__(self, rate_limiter: RateLimiter):
         """
         Инициализация с API ключом
         """
-        self.youtube = build('youtube', 'v3', developerKey=app_config.youtube.api_key)
+        self.rate_limiter = rate_limiter
+        # httplib2.Http внутри сервиса не потокобезопасен, а запросы идут из нескольких потоков -
+        # у каждого потока свой сервис
+        self._local = threading.local()
+
+    @property
+    def youtube(self):
+        service = getattr(self._local, "youtube", None)
+        if service is None:
+            service = build('youtube', 'v3', developerKey=app_config.youtube.api_key)
+            self._local.youtube = service
+        return service
 
-    def get_subscribers_count(self, username: str) -> int:
+    async def resolve_channel_id(self, username: str) -> str:
         """
-        Получить информацию о канале по username
+        id канала по username (handle), пустая строка - канал не найден. Расходует квоту API,
+        поэтому результат сохраняется и резолв делается один раз на канал.
+        Ошибки API пробрасываются, превышение квоты - как RateLimitExceededError
         """
+        await self.rate_limiter.acquire(self.network, self.credential, CHANNELS_LIST_COST)
         try:
-            # Ищем канал по username
+            return await asyncio.to_thread(self._resolve_channel_id, username)
+        except HttpError as e:
+            await self._raise_if_quota_exceeded(e)
+            raise
+
+    def _resolve_channel_id(self, username: str) -> str:
+        try:
+            # Ищем канал по username, нужен только id
             search_response = self.youtube.channels().list(
-                part="snippet,contentDetails,statistics",
+                part="id",
                 forHandle=username
             ).execute()
+        except HttpError as e:
+            print(f"Ошибка при получении канала {username}: {e}")
+            raise
 
-            if not search_response.get('items'):
-                return 0
+        if not search_response.get('items'):
+            return ""
+        return search_response['items'][0]['id']
 
-            channel_data = search_response['items'][0]
+    async def get_subscribers_counts(self, channel_ids: List[str]) -> Dict[str, int]:
+        """
+        Количество подписчиков каналов по id, до CHANNELS_LIST_MAX_IDS каналов за один запрос.
+        Каналов, которых нет или у которых скрыты подписчики, в ответе нет
+        """
+        if not channel_ids:
+            return {}
+        if len(channel_ids) > CHANNELS_LIST_MAX_IDS:
+            raise ValueError(f"в channels.list не больше {CHANNELS_LIST_MAX_IDS} id")
 
-            return int(channel_data['statistics'].get('subscriberCount', 0))
+        await self.rate_limiter.acquire(self.network, self.credential, CHANNELS_LIST_COST)
+        try:
+            return await asyncio.to_thread(self._get_subscribers_counts, channel_ids)
         except HttpError as e:
-            print(f"Ошибка при получении канала {username}: {e}")
-            return 0
+            await self._raise_if_quota_exceeded(e)
+            raise
+
+    async def _raise_if_quota_exceeded(self, error: HttpError):
+        """Квота кончилась - дальше API будет отвечать так же, пусть все воркеры подождут"""
+        if not is_quota_exceeded(error):
+            return
+        await self.rate_limiter.penalize(self.network, self.credential, QUOTA_EXCEEDED_PENALTY_SECONDS)
+        raise RateLimitExceededError(
+            self.rate_limiter.bucket_name(self.network, self.credential), QUOTA_EXCEEDED_PENALTY_SECONDS
+        ) from error
+
+    def _get_subscribers_counts(self, channel_ids: List[str]) -> Dict[str, int]:
+        try:
+            response = self.youtube.channels().list(
+                part="statistics",
+                id=",".join(channel_ids),
+                maxResults=CHANNELS_LIST_MAX_IDS
+            ).execute()
+        except HttpError as e:
+            print(f"Ошибка при получении подписчиков каналов {channel_ids}: {e}")
+            raise
+
+        return {
+            item['id']: int(item['statistics']['subscriberCount'])
+            for item in response.get('items', [])
+            if not item['statistics'].get('hiddenSubscriberCount') and 'subscriberCount' in item['statistics']
+        }
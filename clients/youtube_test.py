@@ -0,0 +1,18 @@
+import json
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+from clients.youtube import is_quota_exceeded
+
+
+def _http_error(status, reason):
+    content = json.dumps({"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}})
+    return HttpError(Response({"status": status}), content.encode())
+
+
+def test_is_quota_exceeded():
+    assert is_quota_exceeded(_http_error(403, "quotaExceeded"))
+    # запрет доступа и 5xx - обычные ошибки, а не квота
+    assert not is_quota_exceeded(_http_error(403, "forbidden"))
+    assert not is_quota_exceeded(_http_error(500, "backendError"))
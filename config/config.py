@@ -11,6 +11,17 @@ class DbConfig(BaseModel):
     user: str
     password: str
     name: str
+    # размеры пула соединений
+    pool_min_size: int = 2
+    pool_max_size: int = 10
+    # сколько ждем свободное соединение из пула, секунды
+    pool_timeout: float = 10.0
+    # сколько пытаемся переподключиться к базе после обрыва, секунды
+    reconnect_timeout: float = 300.0
+    # таймаут на выполнение одного запроса, миллисекунды
+    statement_timeout_ms: int = 10_000
+    # сколько подготовленных запросов держать на одном соединении
+    prepared_max: int = 256
 
 
 class TelegramConfig(BaseModel):
@@ -42,6 +53,182 @@ class VKConfig(BaseModel):
     api_key: str
 
 
+class HttpConfig(BaseModel):
+    # таймауты внешних HTTP запросов: соединение и чтение ответа, секунды
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 30.0
+    # соединений с одним хостом, из них держим открытыми между запросами (keep-alive)
+    max_connections_per_host: int = 10
+    max_keepalive_connections_per_host: int = 5
+    # сколько простаивающее соединение живет в пуле, секунды
+    keepalive_expiry_seconds: float = 60.0
+    # повторов после сетевой ошибки или 5xx/429, задержка удваивается от retry_backoff_seconds со случайным разбросом
+    retries: int = 2
+    retry_backoff_seconds: float = 0.5
+
+
+class ReadModelConfig(BaseModel):
+    # как часто подтягиваем изменения счетчиков в колоночную модель фильтрации, секунды
+    refresh_interval_seconds: int = 30
+    # как часто перечитываем doctors целиком, секунды
+    full_reload_interval_seconds: int = 600
+    # как часто перечитываем черный список телеграм каналов в индекс, секунды
+    blacklist_refresh_interval_seconds: int = 60
+
+
+class NetworkWorkersConfig(BaseModel):
+    # сколько запросов к соцсети выполняем одновременно
+    concurrency: int = 1
+    # сколько каналов берем из очереди за раз
+    batch_size: int = 10
+    # сколько каналов уходит в один запрос к API соцсети
+    chunk_size: int = 1
+
+
+class ChangePolicyConfig(BaseModel):
+    # изменение подписчиков меньше этого количества не записываем
+    min_absolute: int = 1
+    # и меньше этой доли от записанного значения, 0.001 - 0.1%
+    min_relative: float = 0
+    # но записываем не реже, чем раз в столько секунд, даже если ничего не поменялось
+    max_age_seconds: int = 7 * 86400
+
+
+class RefreshTiersConfig(BaseModel):
+    # канал от стольких подписчиков считается крупным
+    large_min_subscribers: int = 10_000
+    # как часто обновляем каналы активных докторов с крупными каналами, секунды
+    active_large_seconds: int = 86400
+    # как часто обновляем остальные каналы активных докторов, секунды
+    active_small_seconds: int = 3 * 86400
+    # как часто обновляем каналы неактивных докторов, их не показывает сайт, секунды
+    inactive_seconds: int = 14 * 86400
+
+
+class RefreshQueueConfig(BaseModel):
+    # максимальная задержка повтора после ошибок, секунды
+    refresh_interval_seconds: int = 86400
+    # как часто обновляем канал в зависимости от активности доктора и размера канала
+    tiers: RefreshTiersConfig = RefreshTiersConfig()
+    # воркеры обновления по соцсетям
+    instagram: NetworkWorkersConfig = NetworkWorkersConfig(concurrency=1, batch_size=50, chunk_size=50)
+    telegram: NetworkWorkersConfig = NetworkWorkersConfig(concurrency=1, batch_size=100, chunk_size=100)
+    youtube: NetworkWorkersConfig = NetworkWorkersConfig(concurrency=2, batch_size=100, chunk_size=50)
+    vk: NetworkWorkersConfig = NetworkWorkersConfig(concurrency=2, batch_size=200, chunk_size=100)
+    # когда новое количество подписчиков стоит записывать, по соцсетям
+    instagram_change: ChangePolicyConfig = ChangePolicyConfig(min_relative=0.001)
+    telegram_change: ChangePolicyConfig = ChangePolicyConfig(min_relative=0.001)
+    youtube_change: ChangePolicyConfig = ChangePolicyConfig(min_relative=0.001)
+    vk_change: ChangePolicyConfig = ChangePolicyConfig(min_relative=0.001)
+    # на сколько взятая строка пропадает из очереди, если воркер не отчитался, секунды
+    lease_seconds: int = 600
+    # первая задержка повтора после ошибки, дальше удваивается до refresh_interval_seconds
+    retry_base_seconds: int = 900
+    # flood wait телеграма дольше этого не пережидаем в цикле, а оставляем каналы следующему циклу, секунды
+    flood_wait_max_sleep_seconds: int = 300
+    # счетчики и закрытые строки очереди пишутся в базу пачкой, когда их накопилось столько
+    write_buffer_max_size: int = 500
+    # или когда самой старой записи в буфере столько секунд, а также в конце каждой пачки
+    write_buffer_max_age_seconds: float = 5
+
+    def workers(self, network: str) -> NetworkWorkersConfig:
+        return {
+            "inst": self.instagram,
+            "tg": self.telegram,
+            "youtube": self.youtube,
+            "vk": self.vk,
+        }[network]
+
+    def change_policy(self, network: str) -> ChangePolicyConfig:
+        return {
+            "inst": self.instagram_change,
+            "tg": self.telegram_change,
+            "youtube": self.youtube_change,
+            "vk": self.vk_change,
+        }[network]
+
+
+class RateLimitConfig(BaseModel):
+    # максимум токенов в ведре (размер всплеска)
+    capacity: float
+    # сколько токенов добавляется в секунду
+    refill_per_second: float
+
+
+class RateLimitsConfig(BaseModel):
+    # Graph API: 200 запросов в час на токен
+    instagram: RateLimitConfig = RateLimitConfig(capacity=200, refill_per_second=200 / 3600)
+    # flood control телеграма не документирован, держимся около 20 запросов в минуту
+    telegram: RateLimitConfig = RateLimitConfig(capacity=20, refill_per_second=20 / 60)
+    # YouTube Data API: 10 000 единиц квоты в сутки, channels.list стоит 1 единицу
+    youtube: RateLimitConfig = RateLimitConfig(capacity=10_000, refill_per_second=10_000 / 86400)
+    # VK API: 3 запроса в секунду на ключ
+    vk: RateLimitConfig = RateLimitConfig(capacity=3, refill_per_second=3)
+    # уведомления в salebot, отправляются фоновой задачей
+    salebot: RateLimitConfig = RateLimitConfig(capacity=5, refill_per_second=1)
+    # сколько максимум ждем токены, дольше - отказ, секунды
+    max_wait_seconds: float = 60
+
+    def by_network(self) -> dict[str, RateLimitConfig]:
+        return {
+            "inst": self.instagram,
+            "tg": self.telegram,
+            "youtube": self.youtube,
+            "vk": self.vk,
+            "salebot": self.salebot,
+        }
+
+
+class NotificationsConfig(BaseModel):
+    # как часто фоновая задача переносит уведомления из памяти в outbox и отправляет их, секунды
+    send_interval_seconds: int = 5
+    # сколько уведомлений берем из outbox за раз
+    batch_size: int = 50
+    # на сколько взятое уведомление пропадает из outbox, если отправитель не отчитался, секунды
+    lease_seconds: int = 300
+    # первая задержка повтора после ошибки отправки, дальше удваивается до retry_max_seconds
+    retry_base_seconds: int = 60
+    retry_max_seconds: int = 3600
+    # после стольких неудачных попыток уведомление больше не отправляем
+    max_attempts: int = 10
+    # сколько уведомлений может ждать в памяти до переноса в outbox, лишние отбрасываются
+    queue_max_size: int = 10_000
+    # сколько храним отправленные уведомления, секунды
+    keep_sent_seconds: int = 7 * 86400
+    # как часто собираем сводку не найденных докторов по каждой соцсети, секунды
+    not_found_digest_interval_seconds: int = 3600
+    # повторно про того же доктора с той же причиной напоминаем не чаще, секунды
+    not_found_suppression_seconds: int = 86400
+    # если доктор столько не попадал в не найденные, забываем про него, секунды
+    not_found_forget_seconds: int = 7 * 86400
+
+
+class HistoryConfig(BaseModel):
+    # как часто сворачиваем историю подписчиков в дневные и недельные значения, секунды
+    rollup_interval_seconds: int = 3600
+    # на сколько месяцев вперед заранее создаем партиции истории
+    partitions_ahead_months: int = 2
+    # сколько дней храним сырые точки, месяц удаляется целиком, когда весь старше срока
+    raw_retention_days: int = 35
+    # сколько дней храним дневные значения, дальше остаются только недельные
+    daily_retention_days: int = 400
+    # максимальная глубина истории в ответе API, дни
+    max_series_days: int = 5 * 365
+
+
+class CacheConfig(BaseModel):
+    # время жизни кэша общего количества подписчиков, секунды
+    subscribers_count_ttl_seconds: int = 300
+    # время жизни кэша доступных фильтров по соцсетям, секунды
+    filter_info_ttl_seconds: int = 3600
+    # размер LRU кэша строк докторов по doctor_id
+    doctor_rows_max_size: int = 10000
+    # время жизни строки доктора в кэше, секунды
+    doctor_rows_ttl_seconds: int = 3600
+    # время жизни записи "доктор не найден", секунды
+    doctor_not_found_ttl_seconds: int = 60
+
+
 class Config(BaseModel):
     db: DbConfig
     telegram: TelegramConfig
@@ -50,6 +237,13 @@ class Config(BaseModel):
     instagramGraphApi: InstagramGraphApiConfig
     youtube: YouTubeConfig
     vk: VKConfig
+    read_model: ReadModelConfig = ReadModelConfig()
+    cache: CacheConfig = CacheConfig()
+    refresh_queue: RefreshQueueConfig = RefreshQueueConfig()
+    rate_limits: RateLimitsConfig = RateLimitsConfig()
+    http: HttpConfig = HttpConfig()
+    notifications: NotificationsConfig = NotificationsConfig()
+    history: HistoryConfig = HistoryConfig()
 
     @classmethod
     def load(cls, path: str = "config/values.yaml") -> "Config":
@@ -5,18 +5,36 @@ import os
 from dotenv import load_dotenv
 from fastapi import FastAPI
 import app.api.v1.doctors as apiV1
-from app.init_logic import update_subs_service, telegram_client
+from app.init_logic import (
+    update_subs_service, telegram_client, database, http_client, doctors_read_model, blacklist_index,
+    notification_client, subscribers_history_service, update_subs_repo,
+)
+from config.config import app_config
 from random import randint
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task = asyncio.create_task(run_periodic_updates())
+    await database.open()
+    tasks = [
+        asyncio.create_task(run_periodic_updates()),
+        asyncio.create_task(run_periodic_read_model_refresh()),
+        asyncio.create_task(run_periodic_blacklist_refresh()),
+        asyncio.create_task(run_periodic_notifications()),
+        asyncio.create_task(run_periodic_history_rollup()),
+    ]
     yield
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    # обновленные, но еще не записанные счетчики
+    await update_subs_repo.flush()
+    # накопленные в памяти уведомления сохраняем в outbox, отправит следующий запуск
+    await notification_client.flush()
+    await http_client.close()
+    await database.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -37,6 +55,58 @@ async def run_periodic_updates():
             await asyncio.sleep(30)
 
 
+async def run_periodic_read_model_refresh():
+    """Фоновое обновление колоночной модели для фильтрации докторов"""
+    while True:
+        try:
+            await doctors_read_model.refresh()
+            await asyncio.sleep(app_config.read_model.refresh_interval_seconds)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"Read model refresh error: {e}")
+            await asyncio.sleep(30)
+
+
+async def run_periodic_blacklist_refresh():
+    """Фоновое обновление индекса черного списка телеграм каналов"""
+    while True:
+        try:
+            await blacklist_index.refresh()
+            await asyncio.sleep(app_config.read_model.blacklist_refresh_interval_seconds)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"Blacklist refresh error: {e}")
+            await asyncio.sleep(30)
+
+
+async def run_periodic_notifications():
+    """Фоновая отправка уведомлений из outbox в salebot"""
+    while True:
+        try:
+            await notification_client.send_pending()
+            await asyncio.sleep(app_config.notifications.send_interval_seconds)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"Notifications send error: {e}")
+            await asyncio.sleep(30)
+
+
+async def run_periodic_history_rollup():
+    """Фоновая свертка истории подписчиков в дневные и недельные значения"""
+    while True:
+        try:
+            await subscribers_history_service.rollup()
+            await asyncio.sleep(app_config.history.rollup_interval_seconds)
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            print(f"History rollup error: {e}")
+            await asyncio.sleep(60)
+
+
 # # todo это для создания сессии телеграм на серваке
 # async def main():
 #     tg_cl = telegram_client
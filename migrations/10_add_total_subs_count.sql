@@ -0,0 +1,18 @@
+-- Общий охват доктора, postgres пересчитывает его сам при любом обновлении счетчиков
+alter table doctors
+    add column total_subs_count bigint generated always as (
+        coalesce(inst_subs_count, 0) + coalesce(tg_subs_count, 0) +
+        coalesce(youtube_subs_count, 0) + coalesce(vk_subs_count, 0)
+    ) stored;
+
+-- Индексы под фильтр по диапазону подписчиков и сортировку среди активных докторов
+create index if not exists doctors_active_total_subs_idx
+    on doctors (total_subs_count, doctor_id) where is_active is true;
+create index if not exists doctors_active_inst_subs_idx
+    on doctors (inst_subs_count, doctor_id) where is_active is true;
+create index if not exists doctors_active_tg_subs_idx
+    on doctors (tg_subs_count, doctor_id) where is_active is true;
+create index if not exists doctors_active_youtube_subs_idx
+    on doctors (youtube_subs_count, doctor_id) where is_active is true;
+create index if not exists doctors_active_vk_subs_idx
+    on doctors (vk_subs_count, doctor_id) where is_active is true;
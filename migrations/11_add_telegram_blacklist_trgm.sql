@@ -0,0 +1,8 @@
+-- триграммные индексы для поиска по подстроке в черном списке телеграм каналов (ilike '%...%')
+create extension if not exists pg_trgm;
+
+create index if not exists telegram_blacklist_username_trgm_idx
+    on telegram_blacklist using gin (telegram_username gin_trgm_ops) where is_active is true;
+
+create index if not exists telegram_blacklist_name_trgm_idx
+    on telegram_blacklist using gin (telegram_name gin_trgm_ops) where is_active is true;
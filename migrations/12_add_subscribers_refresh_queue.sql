@@ -0,0 +1,55 @@
+-- Единая очередь обновления подписчиков: строка на пару (доктор, соцсеть), порядок обхода - по next_due_at.
+-- Взятая в работу строка сдвигает next_due_at на время аренды, упавший воркер не держит ее дольше
+create table if not exists subscribers_refresh_queue
+(
+    doctor_id       bigint      not null references doctors (doctor_id) on delete cascade,
+    -- slug соцсети: inst, tg, youtube, vk
+    network         varchar(16) not null,
+    -- когда строку пора обновить
+    next_due_at     timestamp   not null default now(),
+    -- неудачных попыток подряд, сбрасывается после успешного обновления
+    attempts        int         not null default 0,
+    -- результат последней попытки: updated, not_found, invalid, no_channel, error, flood_wait
+    last_outcome    varchar(32),
+    last_attempt_at timestamp,
+    primary key (doctor_id, network)
+);
+
+create index if not exists subscribers_refresh_queue_due_idx
+    on subscribers_refresh_queue (network, next_due_at);
+
+-- Переносим всех докторов с каналами, уже обновленные встают в очередь через сутки после обновления
+insert into subscribers_refresh_queue (doctor_id, network, next_due_at)
+select doctor_id, 'inst', coalesce(inst_last_updated + interval '1 day', now())
+from doctors
+where manual_inst_upgrade is false
+  and instagram_channel_name is not null
+  and instagram_channel_name != ''
+on conflict (doctor_id, network) do nothing;
+
+insert into subscribers_refresh_queue (doctor_id, network, next_due_at)
+select doctor_id, 'tg', coalesce(tg_last_updated + interval '1 day', now())
+from doctors
+where telegram_channel_name is not null
+  and telegram_channel_name != ''
+on conflict (doctor_id, network) do nothing;
+
+insert into subscribers_refresh_queue (doctor_id, network, next_due_at)
+select doctor_id, 'youtube', coalesce(youtube_last_updated + interval '1 day', now())
+from doctors
+where youtube_channel_name is not null
+  and youtube_channel_name != ''
+on conflict (doctor_id, network) do nothing;
+
+insert into subscribers_refresh_queue (doctor_id, network, next_due_at)
+select doctor_id, 'vk', coalesce(vk_last_updated + interval '1 day', now())
+from doctors
+where vk_channel_name is not null
+  and vk_channel_name != ''
+on conflict (doctor_id, network) do nothing;
+
+-- Старые очереди с одним курсором по id больше не нужны
+drop table if exists update_subscribers_queue;
+drop table if exists update_instagram_subscribers_queue;
+drop table if exists update_youtube_subscribers_queue;
+drop table if exists update_vk_subscribers_queue;
@@ -0,0 +1,21 @@
+-- Token bucket лимитов внешних API: строка на пару (соцсеть, учетные данные).
+-- Токены досчитываются по времени при каждой резервации, поэтому отдельного сброса счетчика нет.
+-- Ведра создает приложение при первом обращении с емкостью и скоростью из конфига
+create table if not exists rate_limit_buckets
+(
+    -- "<соцсеть>:<учетные данные>", например inst:17841400000000000
+    bucket            varchar(128) primary key,
+    -- максимум токенов в ведре
+    capacity          double precision not null,
+    -- сколько токенов добавляется в секунду
+    refill_per_second double precision not null,
+    -- токенов на момент updated_at, после flood wait может быть отрицательным
+    tokens            double precision not null,
+    updated_at        timestamp        not null default now()
+);
+
+-- Часовой счетчик запросов инстаграма заменен ведром inst:<fb_business_account_id>
+alter table instagram_api_settings
+    drop column if exists req_capacity,
+    drop column if exists filled_capacity,
+    drop column if exists last_updated_time;
@@ -0,0 +1,23 @@
+-- Канал, под который строка стоит в очереди. Синхронизация при изменении доктора
+-- сбрасывает строку вне очереди, только если канал действительно сменился
+alter table subscribers_refresh_queue
+    add column if not exists channel_name varchar(255);
+
+update subscribers_refresh_queue q
+set channel_name = case q.network
+                       when 'inst' then d.instagram_channel_name
+                       when 'tg' then d.telegram_channel_name
+                       when 'youtube' then d.youtube_channel_name
+                       when 'vk' then d.vk_channel_name
+                   end
+from doctors d
+where d.doctor_id = q.doctor_id
+  and q.channel_name is null;
+
+-- Инстаграм с ручным обновлением в очереди не нужен, раньше такие строки оставались при включении флага
+delete
+from subscribers_refresh_queue q
+    using doctors d
+where d.doctor_id = q.doctor_id
+  and q.network = 'inst'
+  and d.manual_inst_upgrade is true;
@@ -0,0 +1,4 @@
+-- id канала ютуба, в который один раз резолвится youtube_channel_name (handle).
+-- Подписчики дальше запрашиваются по id пачками, без поиска по handle
+alter table doctors
+    add column if not exists youtube_channel_id varchar(64);
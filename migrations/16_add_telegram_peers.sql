@@ -0,0 +1,21 @@
+-- Кэш пиров телеграма (id и access_hash), он же хранилище пиров сессии pyrogram.
+-- Канал адресуется по сохраненному пиру, username резолвится заново, только если пир стал невалидным.
+-- Лежит в базе, поэтому переживает пересоздание контейнера и общий для всех реплик
+create table if not exists telegram_peers
+(
+    -- id в формате pyrogram: у каналов -100..., у групп отрицательный
+    peer_id      bigint primary key,
+    access_hash  bigint,
+    -- user, bot, group, channel, supergroup
+    type         varchar(16) not null,
+    -- в нижнем регистре, как и telegram_channel_name при поиске
+    username     varchar(255),
+    phone_number varchar(32),
+    updated_at   timestamp   not null default now()
+);
+
+create index if not exists telegram_peers_username_idx
+    on telegram_peers (username) where username is not null;
+
+create index if not exists telegram_peers_phone_number_idx
+    on telegram_peers (phone_number) where phone_number is not null;
@@ -0,0 +1,22 @@
+-- Исходящие уведомления в salebot. Сервисы кладут уведомление в очередь в памяти,
+-- фоновая задача пачками переносит их сюда и доставляет с повторами и ограничением скорости
+create table if not exists notifications_outbox
+(
+    id              bigserial primary key,
+    -- метод SaleBotClient, которым отправляется уведомление: send_error_message, send_warning_not_found_doctor
+    kind            varchar(64) not null,
+    -- аргументы метода
+    payload         jsonb       not null,
+    created_at      timestamp   not null default now(),
+    -- когда пробовать отправить, null - попытки кончились
+    next_attempt_at timestamp            default now(),
+    attempts        int         not null default 0,
+    last_error      text,
+    sent_at         timestamp
+);
+
+create index if not exists notifications_outbox_pending_idx
+    on notifications_outbox (next_attempt_at) where sent_at is null and next_attempt_at is not null;
+
+create index if not exists notifications_outbox_sent_at_idx
+    on notifications_outbox (sent_at) where sent_at is not null;
@@ -0,0 +1,19 @@
+-- Доктора, подписчиков которых не удалось получить. Вместо уведомления на каждый канал в каждом цикле
+-- сюда копятся предупреждения, а раз в интервал по каждой соцсети уходит одна сводка
+create table if not exists not_found_warnings
+(
+    doctor_id     bigint      not null,
+    -- соцсеть в том виде, в котором она попадает в уведомления
+    social_media  varchar(32) not null,
+    -- причина: invalid_link, zero_subscribers, username_not_occupied
+    reason        varchar(32) not null,
+    channel_name  varchar(255),
+    first_seen_at timestamp   not null default now(),
+    last_seen_at  timestamp   not null default now(),
+    -- когда доктор последний раз попал в сводку, null - еще не попадал
+    notified_at   timestamp,
+    primary key (doctor_id, social_media, reason)
+);
+
+create index if not exists not_found_warnings_last_seen_at_idx
+    on not_found_warnings (last_seen_at);
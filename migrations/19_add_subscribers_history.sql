@@ -0,0 +1,72 @@
+-- История подписчиков: каждая записанная цифра дописывается сюда, таблица только растет.
+-- Партиции помесячные, старые месяцы сворачиваются в дневные и недельные значения и удаляются целиком
+create table if not exists subscribers_history
+(
+    doctor_id   bigint      not null,
+    -- slug соцсети: inst, tg, youtube, vk
+    network     varchar(16) not null,
+    subscribers int         not null,
+    recorded_at timestamp   not null default now()
+) partition by range (recorded_at);
+
+-- строки пишутся по времени, поэтому BRIN по времени почти ничего не весит и отсекает лишние блоки
+create index if not exists subscribers_history_recorded_at_brin
+    on subscribers_history using brin (recorded_at);
+
+-- сюда попадут строки, если фоновая задача не успела создать партицию месяца
+create table if not exists subscribers_history_default partition of subscribers_history default;
+
+-- текущий и два следующих месяца, дальше партиции заранее создает фоновая задача свертки
+do
+$$
+    declare
+        month_start date;
+    begin
+        for i in 0..2
+            loop
+                month_start := date_trunc('month', now())::date + make_interval(months => i);
+                execute format(
+                        'create table if not exists %I partition of subscribers_history for values from (%L) to (%L)',
+                        'subscribers_history_' || to_char(month_start, 'YYYY_MM'),
+                        month_start,
+                        (month_start + interval '1 month')::date
+                        );
+            end loop;
+    end
+$$;
+
+-- последнее значение за день, по нему строятся графики за последние месяцы
+create table if not exists subscribers_history_daily
+(
+    doctor_id   bigint      not null,
+    network     varchar(16) not null,
+    day         date        not null,
+    subscribers int         not null,
+    primary key (doctor_id, network, day)
+);
+
+-- последнее значение за неделю (day - понедельник), хранится без срока
+create table if not exists subscribers_history_weekly
+(
+    doctor_id   bigint      not null,
+    network     varchar(16) not null,
+    week        date        not null,
+    subscribers int         not null,
+    primary key (doctor_id, network, week)
+);
+
+-- текущие значения - первая точка истории, более старые обновления считаем сделанными в начале месяца
+insert into subscribers_history (doctor_id, network, subscribers, recorded_at)
+select doctor_id, network, subscribers, greatest(coalesce(recorded_at, now()), date_trunc('month', now()))
+from (select doctor_id, 'inst' as network, inst_subs_count as subscribers, inst_last_updated as recorded_at
+      from doctors
+      union all
+      select doctor_id, 'tg', tg_subs_count, tg_last_updated
+      from doctors
+      union all
+      select doctor_id, 'youtube', youtube_subs_count, youtube_last_updated
+      from doctors
+      union all
+      select doctor_id, 'vk', vk_subs_count, vk_last_updated
+      from doctors) current_counts
+where subscribers > 0;